@@ -0,0 +1,238 @@
+"""
+Admission control for the chat model.
+• Per-session and per-client token buckets cap how fast any one caller can submit.
+• Admitted requests wait in a weighted-fair queue (start-time fair queueing over
+  sessions) for one of CHAT_CONCURRENCY model slots, so a session with many queued
+  requests cannot starve a session that just arrived.
+• The queue is bounded overall, per session, and in waiting time; rejected requests
+  raise AdmissionRejected with a Retry-After estimate (HTTP 429 in server.py).
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Tuple
+
+from metrics import metrics
+
+CHAT_CONCURRENCY = int(os.environ.get("CHAT_CONCURRENCY", "1"))
+CHAT_MAX_QUEUE = int(os.environ.get("CHAT_MAX_QUEUE", "64"))
+CHAT_MAX_QUEUE_PER_SESSION = int(os.environ.get("CHAT_MAX_QUEUE_PER_SESSION", "4"))
+CHAT_MAX_WAIT = float(os.environ.get("CHAT_MAX_WAIT", "30"))  # seconds
+CHAT_SESSION_RATE = float(os.environ.get("CHAT_SESSION_RATE", "0.5"))  # requests/second
+CHAT_SESSION_BURST = float(os.environ.get("CHAT_SESSION_BURST", "5"))
+CHAT_CLIENT_RATE = float(os.environ.get("CHAT_CLIENT_RATE", "2"))
+CHAT_CLIENT_BURST = float(os.environ.get("CHAT_CLIENT_BURST", "20"))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is refused; `retry_after` is in seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, now: float) -> float:
+        """Take one token; return 0 on success or the seconds until one is available."""
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+    def refund(self) -> None:
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class RateLimiter:
+    """Token buckets keyed by an ID, pruning idle (full) buckets as keys accumulate."""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def bucket(self, key: str, now: float) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_keys:
+                self._prune(now)
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst, now)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket
+
+    def _prune(self, now: float) -> None:
+        for key in [k for k, b in self.buckets.items() if b.is_full(now)]:
+            del self.buckets[key]
+        while len(self.buckets) >= self.max_keys:
+            self.buckets.popitem(last=False)
+
+
+class FairAdmission:
+    """Rate limiting plus a weighted-fair queue in front of a fixed number of slots."""
+
+    def __init__(
+        self,
+        concurrency: int = CHAT_CONCURRENCY,
+        max_queue: int = CHAT_MAX_QUEUE,
+        max_queue_per_session: int = CHAT_MAX_QUEUE_PER_SESSION,
+        max_wait: float = CHAT_MAX_WAIT,
+        session_rate: float = CHAT_SESSION_RATE,
+        session_burst: float = CHAT_SESSION_BURST,
+        client_rate: float = CHAT_CLIENT_RATE,
+        client_burst: float = CHAT_CLIENT_BURST,
+        name: str = "chat",
+    ):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_session = max_queue_per_session
+        self.max_wait = max_wait
+        self.session_limiter = RateLimiter(session_rate, session_burst)
+        self.client_limiter = RateLimiter(client_rate, client_burst)
+        self.name = name
+
+        self.active = 0
+        self.virtual_time = 0.0
+        self._heap: List[Tuple[float, int, float, str, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._last_finish: Dict[str, float] = {}
+        self._queued_per_session: Dict[str, int] = defaultdict(int)
+        self._queued = 0
+        self.service_time = 1.0  # EWMA of seconds per request, for Retry-After / wait estimates
+
+        metrics.gauge(f"{name}.admission.active", lambda: self.active)
+        metrics.gauge(f"{name}.admission.queued", lambda: self._queued)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def predicted_wait(self) -> float:
+        """Expected seconds a newly queued request would wait for a slot."""
+        if self.active < self.concurrency and self._queued == 0:
+            return 0.0
+        return (self._queued + 1) * self.service_time / self.concurrency
+
+    def check_rate(self, session_id: str, client_id: str) -> None:
+        """Charge the session and client token buckets, or raise AdmissionRejected.
+
+        For callers that may answer without a model slot (degraded replies) but must
+        still be rate limited; they then take the slot with `rate_limited=False`.
+        """
+        now = time.monotonic()
+        session_bucket = self.session_limiter.bucket(session_id, now)
+        wait = session_bucket.try_acquire(now)
+        if wait:
+            metrics.inc(f"{self.name}.admission.rejected.session_rate")
+            raise AdmissionRejected("Too many requests for this session.", wait)
+        wait = self.client_limiter.bucket(client_id, now).try_acquire(now)
+        if wait:
+            session_bucket.refund()
+            metrics.inc(f"{self.name}.admission.rejected.client_rate")
+            raise AdmissionRejected("Too many requests from this client.", wait)
+
+    async def acquire(self, session_id: str, client_id: str, weight: float = 1.0, rate_limited: bool = True) -> None:
+        """Wait for a model slot, or raise AdmissionRejected.
+
+        `rate_limited=False` skips the token buckets (for internally paced work such as jobs.py).
+        """
+        if rate_limited:
+            self.check_rate(session_id, client_id)
+
+        if self.active < self.concurrency and self._queued == 0:
+            self.active += 1
+            metrics.inc(f"{self.name}.admission.admitted")
+            return
+
+        if self._queued >= self.max_queue:
+            metrics.inc(f"{self.name}.admission.rejected.queue_full")
+            raise AdmissionRejected("Server is busy; the chat queue is full.", self.predicted_wait())
+        if self._queued_per_session[session_id] >= self.max_queue_per_session:
+            metrics.inc(f"{self.name}.admission.rejected.session_queue_full")
+            raise AdmissionRejected("Too many queued requests for this session.", self.predicted_wait())
+
+        # Start-time fair queueing: each session's requests are spaced 1/weight apart in
+        # virtual time, so sessions are interleaved regardless of how much they submit.
+        start = max(self.virtual_time, self._last_finish.get(session_id, 0.0))
+        finish = start + 1.0 / weight
+        self._last_finish[session_id] = finish
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (finish, next(self._seq), start, session_id, future))
+        self._queued += 1
+        self._queued_per_session[session_id] += 1
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                self._dequeued(session_id)
+                metrics.inc(f"{self.name}.admission.rejected.timeout")
+                raise AdmissionRejected("Timed out waiting for the chat model.", self.predicted_wait())
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # slot was granted just as we were cancelled
+            else:
+                future.cancel()
+                self._dequeued(session_id)
+            raise
+        metrics.inc(f"{self.name}.admission.admitted")
+
+    def _dequeued(self, session_id: str) -> None:
+        self._queued -= 1
+        self._queued_per_session[session_id] -= 1
+        if self._queued_per_session[session_id] <= 0:
+            del self._queued_per_session[session_id]
+        if session_id not in self._queued_per_session and self._last_finish.get(session_id, 0.0) <= self.virtual_time:
+            self._last_finish.pop(session_id, None)
+
+    def release(self) -> None:
+        """Free a slot and hand it to the queued request with the earliest virtual finish."""
+        self.active -= 1
+        while self._heap and self.active < self.concurrency:
+            finish, _, start, session_id, future = heapq.heappop(self._heap)
+            if future.cancelled():
+                continue  # already accounted for by the waiter
+            self._dequeued(session_id)
+            self.virtual_time = max(self.virtual_time, start)
+            self.active += 1
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, session_id: str, client_id: str, weight: float = 1.0, rate_limited: bool = True):
+        """`async with admission.slot(...)`: hold a model slot for the body of the block."""
+        await self.acquire(session_id, client_id, weight, rate_limited)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.service_time = 0.8 * self.service_time + 0.2 * (time.monotonic() - started)
+            self.release()
@@ -0,0 +1,506 @@
+"""
+Micro-benchmark suite for the request hot paths in server.py.
+• Heavy models are replaced with stubs (random-weight ResNet-18, canned pipelines),
+  so the whole suite runs in seconds and never touches the network.
+• Every run is compared against a stored baseline; a case that is slower than its
+  baseline by more than --threshold percent fails the run (exit code 1).
+• A missing baseline fails the run (exit code 2) instead of silently comparing
+  nothing; record one with --save-baseline. With --ci (or CI=true in the
+  environment) a case missing from the baseline fails it too.
+Run:
+    python benchmarks.py                      # compare against benchmark_baseline.json
+    python benchmarks.py --save-baseline      # record a new baseline on this machine
+    python benchmarks.py --only preprocess    # run only cases whose name contains "preprocess"
+    python benchmarks.py --ci                 # as above, and every case must have a baseline entry
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+from typing import Callable, Dict, List, Optional
+from unittest import mock
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+DEFAULT_THRESHOLD = 20.0  # percent
+
+
+# ---------- 1. Model stubs ----------
+class StubPipeline:
+    """Stands in for a transformers pipeline and returns canned outputs instantly."""
+
+    def __init__(self, task: str):
+        self.task = task
+
+    def __call__(self, inputs=None, **kwargs):
+        if self.task == "sentiment-analysis":
+            texts = inputs if isinstance(inputs, list) else [inputs]
+            return [{"label": "POSITIVE", "score": 0.99} for _ in texts]
+        return [{"generated_text": "This is a stubbed assistant reply."}]
+
+
+def stub_pipeline(task: str, *args, **kwargs) -> StubPipeline:
+    return StubPipeline(task)
+
+
+def load_server_with_stubs():
+    """Import server.py with stubbed models and placeholder ImageNet labels."""
+    if "server" in sys.modules:
+        return sys.modules["server"]
+
+    import torchvision
+
+    real_resnet18 = torchvision.models.resnet18
+    labels_file = os.path.join(tempfile.mkdtemp(prefix="bench_"), "imagenet_classes.txt")
+    with open(labels_file, "w") as f:
+        f.write("\n".join(f"class_{i}" for i in range(1000)))
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    cwd = os.getcwd()
+    os.chdir(here)  # server.py loads ./static relative to the working directory
+    try:
+        with mock.patch.dict(os.environ, {"LABELS_PATH": labels_file}), mock.patch(
+            "transformers.pipeline", stub_pipeline
+        ), mock.patch(
+            "torchvision.models.resnet18",
+            lambda *args, **kwargs: real_resnet18(weights=None),
+        ):
+            import server
+    finally:
+        os.chdir(cwd)
+    return server
+
+
+# ---------- 2. Benchmark cases ----------
+# Each case factory receives the stubbed server module and returns a zero-argument callable.
+CASES: Dict[str, Callable[..., Callable[[], object]]] = {}
+
+
+def benchmark(name: str):
+    """Register a benchmark case factory under `name`."""
+
+    def decorator(factory):
+        CASES[name] = factory
+        return factory
+
+    return decorator
+
+
+def make_image(width: int, height: int):
+    from PIL import Image
+
+    return Image.new("RGB", (width, height), color=(120, 60, 200))
+
+
+def make_history(length: int, image_every: int = 4) -> List[Dict[str, object]]:
+    history = []
+    for i in range(length):
+        role = "user" if i % 2 == 0 else "assistant"
+        content = [{"type": "text", "text": f"message number {i} " * 8}]
+        if role == "user" and i % image_every == 0:
+            content.insert(0, {"type": "image"})
+        history.append({"role": role, "content": content, "timestamp": "2025-01-01T12:00:00"})
+    return history
+
+
+def run_async(coro_factory: Callable[[], object]) -> Callable[[], object]:
+    loop = asyncio.new_event_loop()
+    return lambda: loop.run_until_complete(coro_factory())
+
+
+for _w, _h in [(64, 64), (640, 480), (1920, 1080), (4032, 3024)]:
+
+    @benchmark(f"preprocess[{_w}x{_h}]")
+    def _preprocess_case(server, w=_w, h=_h):
+        image = make_image(w, h)
+        return lambda: server.preprocess(image)
+
+
+@benchmark("predict_input[rgb24]")
+def _rgb24_case(server):
+    payload = bytes(server.TENSOR_BYTES)
+    return lambda: server.tensor_from_uint8_hwc(payload)
+
+
+@benchmark("predict_dedup_lookup[10k]")
+def _dedup_case(server):
+    """Thumbnail + nearest-neighbour lookup that replaces a forward pass on a cache hit."""
+    import numpy as np
+
+    from vector_index import VectorIndex
+
+    index = VectorIndex(server.THUMBNAIL_SIZE * server.THUMBNAIL_SIZE * 3)
+    for vector in np.random.default_rng(0).normal(size=(10_000, index.dim)):
+        index.add(vector, {"predicted_class": "class_0", "confidence": 0.5})
+    image = make_image(640, 480)
+    return lambda: index.nearest(server.thumbnail_vector(image))
+
+
+for _mode in ["flat", "ivf", "ivfpq"]:
+
+    @benchmark(f"vector_search[{_mode},50k]")
+    def _vector_search_case(server, mode=_mode):
+        import numpy as np
+
+        from vector_index import VectorIndex
+
+        vectors = np.random.default_rng(0).normal(size=(50_000, server.EMBEDDING_DIM)).astype(np.float32)
+        index = VectorIndex(server.EMBEDDING_DIM, mode=mode, nlist=128, nprobe=8, train_size=10_000)
+        for i, vector in enumerate(vectors):
+            index.add(vector, i)
+        index.build()
+        query = vectors[123]
+        return lambda: index.search(query, k=10)
+
+
+for _n in [2, 10, 20]:
+
+    @benchmark(f"clean_conversation_history[{_n}]")
+    def _clean_case(server, n=_n):
+        session_id = f"bench-clean-{n}"
+        server.conversation_histories[session_id] = make_history(n)
+        return lambda: server.clean_conversation_history(session_id)
+
+
+for _n in [0, 10, 20]:
+
+    @benchmark(f"add_to_conversation_history[{_n}]")
+    def _add_case(server, n=_n):
+        session_id = f"bench-add-{n}"
+        seed = make_history(n)
+        content = [{"type": "text", "text": "hello there"}]
+
+        def run():
+            server.conversation_histories[session_id] = list(seed)
+            server.add_to_conversation_history(session_id, "user", content)
+
+        return run
+
+
+for _b in [1, 8, 32]:
+
+    @benchmark(f"resnet_forward[batch={_b}]")
+    def _forward_case(server, b=_b):
+        import torch
+
+        batch = torch.randn(b, 3, 224, 224, device=server.device)
+
+        def run():
+            with torch.no_grad():
+                out = server.model(batch)
+            if server.device.type == "cuda":
+                torch.cuda.synchronize()
+            return out
+
+        return run
+
+
+def make_request():
+    from starlette.requests import Request
+
+    return Request({"type": "http", "method": "POST", "path": "/chat", "headers": [], "client": ("127.0.0.1", 0)})
+
+
+def unlimited_admission(server):
+    """Replace the chat admission controller so rate limits never trip during timing."""
+    from admission import FairAdmission
+
+    unlimited = 1e12
+    server.chat_admission = FairAdmission(
+        session_rate=unlimited, session_burst=unlimited, client_rate=unlimited, client_burst=unlimited
+    )
+
+
+@benchmark("chat_response[text]")
+def _chat_text_case(server):
+    unlimited_admission(server)
+    session_id = "bench-chat-text"
+    server.conversation_histories[session_id] = make_history(18)
+    request = make_request()
+    return run_async(
+        lambda: server.chat(request, message="What is in this picture?", image=None, session_id=session_id)
+    )
+
+
+@benchmark("chat_response[image]")
+def _chat_image_case(server):
+    from fastapi import UploadFile
+    from starlette.datastructures import Headers
+
+    unlimited_admission(server)
+    session_id = "bench-chat-image"
+    server.conversation_histories[session_id] = make_history(18)
+    request = make_request()
+    buf = io.BytesIO()
+    make_image(640, 480).save(buf, format="JPEG")
+    payload = buf.getvalue()
+
+    def coro():
+        upload = UploadFile(
+            file=io.BytesIO(payload),
+            filename="bench.jpg",
+            headers=Headers({"content-type": "image/jpeg"}),
+        )
+        return server.chat(request, message="Describe this image.", image=upload, session_id=session_id)
+
+    return run_async(coro)
+
+
+def smolvlm_image_processor():
+    """SmolVLM's image processor (built from its config, no download), or None."""
+    try:
+        from transformers import Idefics3ImageProcessor
+    except ImportError:
+        return None
+    return Idefics3ImageProcessor(size={"longest_edge": 1536}, max_image_size={"longest_edge": 384})
+
+
+for _tier in ["fast", "balanced", "detailed"]:
+    for _w, _h in [(1280, 960), (4032, 3024)]:
+
+        @benchmark(f"chat_image_tier[{_tier},{_w}x{_h}]")
+        def _chat_image_tier_case(server, tier_name=_tier, w=_w, h=_h):
+            """Downscale plus SmolVLM image processing; vision-encoder time grows with the same tile count."""
+            from chat_images import fit_image, get_tier
+
+            tier = get_tier(tier_name)
+            image = make_image(w, h)
+            processor = smolvlm_image_processor()
+
+            def run():
+                fitted = fit_image(image, tier)
+                if processor is None:
+                    return fitted
+                return processor(fitted, return_tensors="np", **tier.processor_kwargs())
+
+            return run
+
+
+CHAT_LOG_FIELDS = {
+    "session": "bench-lo",
+    "user": "Describe this image in as much detail as you can. " * 20,
+    "assistant": "The image shows a purple square on a plain background. " * 40,
+    "model": "SmolVLM-Instruct",
+}
+
+
+class SlowStream:
+    """A log destination that takes 200 µs per write, like a backed-up terminal or pipe."""
+
+    def write(self, text):
+        import time
+
+        time.sleep(0.0002)
+
+    def flush(self):
+        pass
+
+
+LOG_STREAMS = {"devnull": lambda: open(os.devnull, "w"), "slow": SlowStream}
+
+
+def log_stream_handler(stream: str):
+    import logging
+
+    from logging_setup import StructuredFormatter
+
+    handler = logging.StreamHandler(LOG_STREAMS[stream]())
+    handler.setFormatter(StructuredFormatter())
+    return handler
+
+
+for _stream in LOG_STREAMS:
+
+    @benchmark(f"log_request[sync_fstring,{_stream}]")
+    def _log_sync_case(server, stream=_stream):
+        """The previous hot-path logging: f-string built and written on the calling thread."""
+        import logging
+
+        logger = logging.Logger(f"bench.sync.{stream}")
+        logger.addHandler(log_stream_handler(stream))
+        f = CHAT_LOG_FIELDS
+        return lambda: logger.info(
+            f"Session {f['session']}... | User: {f['user']} | Assistant: {f['assistant']} | Model: {f['model']}"
+        )
+
+    for _rate in [1.0, 0.1]:
+
+        @benchmark(f"log_request[queue,{_stream},sample={_rate}]")
+        def _log_queue_case(server, stream=_stream, rate=_rate):
+            """Caller-side cost of log_request(): sampling plus a non-blocking enqueue."""
+            import logging
+            import queue
+            from logging.handlers import QueueListener
+
+            import logging_setup
+
+            records = queue.Queue(logging_setup.LOG_QUEUE_SIZE)
+            logger = logging.Logger(f"bench.queue.{stream}.{rate}")
+            logger.addHandler(logging_setup.LazyQueueHandler(records))
+            QueueListener(records, log_stream_handler(stream)).start()
+            endpoint = f"bench_{stream}_{rate}"
+            logging_setup.LOG_SAMPLE[endpoint] = rate
+            return lambda: logging_setup.log_request(logger, endpoint, "Chat turn", **CHAT_LOG_FIELDS)
+
+
+def make_sessions_payload(count: int) -> Dict[str, object]:
+    sessions = [
+        {"session_id": f"session_{i:08d}", "message_count": i % 20, "last_updated": "2025-01-01T12:00:00"}
+        for i in range(count)
+    ]
+    return {"active_sessions": sessions, "total_sessions": count}
+
+
+ENCODING_PAYLOADS = {
+    "history[20]": lambda: {"session_id": "bench", "history": make_history(20), "length": 20},
+    "sessions[10000]": lambda: make_sessions_payload(10000),
+}
+
+for _payload_name, _payload_factory in ENCODING_PAYLOADS.items():
+
+    @benchmark(f"json_encode_stdlib[{_payload_name}]")
+    def _stdlib_encode_case(server, factory=_payload_factory):
+        from starlette.responses import JSONResponse as StdlibJSONResponse
+
+        payload = factory()
+        return lambda: StdlibJSONResponse(payload)
+
+    @benchmark(f"json_encode[{_payload_name}]")
+    def _encode_case(server, factory=_payload_factory):
+        from http_encoding import JSONResponse
+
+        payload = factory()
+        return lambda: JSONResponse(payload)
+
+    for _encoding in ["gzip", "br"]:
+
+        @benchmark(f"compress_{_encoding}[{_payload_name}]")
+        def _compress_case(server, factory=_payload_factory, encoding=_encoding):
+            import http_encoding
+
+            if encoding == "br" and http_encoding.brotli is None:
+                encoding = "gzip"
+            body = http_encoding.dumps(factory())
+            return lambda: http_encoding.compress(body, encoding)
+
+
+# ---------- 3. Runner ----------
+def measure(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Time `fn` like timeit: auto-range the loop count, then take `repeat` samples."""
+    fn()  # warm-up (lazy init, allocator, caches)
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    samples = sorted(t / number for t in timer.repeat(repeat=repeat, number=number))
+    return {
+        "best_us": samples[0] * 1e6,
+        "median_us": samples[len(samples) // 2] * 1e6,
+        "loops": number,
+    }
+
+
+def environment() -> Dict[str, str]:
+    import torch
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "torch": torch.__version__,
+        "device": "cuda" if torch.cuda.is_available() else "cpu",
+        "threads": str(torch.get_num_threads()),
+    }
+
+
+def run_suite(only: Optional[str], repeat: int) -> Dict[str, Dict[str, float]]:
+    server = load_server_with_stubs()
+    results = {}
+    for name, factory in CASES.items():
+        if only and only not in name:
+            continue
+        results[name] = measure(factory(server), repeat)
+        r = results[name]
+        print(f"{name:<40} best {r['best_us']:>12.1f} µs   median {r['median_us']:>12.1f} µs   ({r['loops']} loops)")
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, float]], baseline: Dict[str, object], threshold: float, strict: bool = False
+) -> List[str]:
+    """Return a description of every case that regressed by more than `threshold` percent.
+
+    With `strict`, cases that have no baseline entry are reported as well.
+    """
+    regressions = []
+    base_results = baseline.get("results", {})
+    print(f"\nComparison against baseline (threshold +{threshold:.0f}%):")
+    for name, r in results.items():
+        if name not in base_results:
+            print(f"  {'✗' if strict else ' '} {name:<38} (no baseline)")
+            if strict:
+                regressions.append(f"{name}: no baseline")
+            continue
+        base = base_results[name]["best_us"]
+        change = (r["best_us"] - base) / base * 100
+        marker = "✗" if change > threshold else "✓"
+        print(f"  {marker} {name:<38} {base:>12.1f} → {r['best_us']:>12.1f} µs  ({change:+.1f}%)")
+        if change > threshold:
+            regressions.append(f"{name}: {change:+.1f}%")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for server.py hot paths")
+    parser.add_argument("--only", help="run only cases whose name contains this substring")
+    parser.add_argument("--repeat", type=int, default=5, help="timing samples per case")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed regression in percent")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="write results as the new baseline")
+    parser.add_argument(
+        "--ci", action="store_true", default=os.environ.get("CI", "").lower() in ("1", "true"),
+        help="also fail when a case has no baseline entry (default on when CI=true)",
+    )
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.only, args.repeat)
+
+    if args.save_baseline:
+        baseline = {"environment": environment(), "results": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline["results"] = json.load(f).get("results", {})
+        baseline["results"].update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\n✓ Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\n❌ No baseline at {args.baseline}: nothing was compared. Record one with --save-baseline.")
+        return 2
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("environment") != environment():
+        print("\n⚠ Baseline was recorded in a different environment; comparisons may be noisy.")
+
+    regressions = compare(results, baseline, args.threshold, strict=args.ci)
+    if args.ci and any(line.endswith("no baseline") for line in regressions):
+        print("\n❌ Cases without a baseline entry (re-record with --save-baseline):")
+        for line in regressions:
+            print(f"  - {line}")
+        return 2
+    if regressions:
+        print("\n❌ Performance regressions detected:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    print("\n✅ No regressions above threshold")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
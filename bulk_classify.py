@@ -0,0 +1,277 @@
+"""
+Offline bulk classification of an image directory, without going through HTTP.
+• Uses the same `open_image` decoding, `preprocess` and ResNet-18 scoring as /predict
+  (see classifier.py); confidences are rounded to 4 places like the API's.
+• Every image is scored by the model: the near-duplicate cache /predict can be configured
+  with (PREDICT_DEDUP_THRESHOLD, off by default) is not consulted, so with it enabled a
+  server may answer a near-duplicate with another image's label where this script doesn't.
+• An image that can't be decoded (unreadable, truncated, corrupt, too large) becomes a row
+  with an `error` instead of stopping the run.
+• A process pool decodes and pre-processes batches of images while the main process
+  runs batched inference on the previous ones, with a bounded number of batches in flight.
+• Results stream to CSV (one file) or Parquet (a directory of part files, needs pyarrow).
+• A checkpoint next to the output records how many images are safely written; running
+  the same command again resumes there, with no duplicated or missing rows.
+• Throughput is reported in images/sec while running and at the end.
+Run:
+    python bulk_classify.py images/ --output predictions.csv [--batch-size 64] [--workers 8]
+    python bulk_classify.py images/ --output predictions --format parquet
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+COLUMNS = ["path", "predicted_class", "confidence", "error"]
+
+
+def list_images(root: str) -> List[str]:
+    """Image paths under `root`, relative to it, in a stable order (needed for resuming)."""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.relpath(os.path.join(dirpath, filename), root))
+    return paths
+
+
+# ---------- Decode stage (worker processes) ----------
+def _init_worker() -> None:
+    import torch
+
+    torch.set_num_threads(1)  # one process per core already
+
+
+def decode_batch(root: str, paths: List[str]) -> Tuple[Any, List[Optional[str]]]:
+    """Decode and pre-process images; return (float32 array of the good ones, error per path)."""
+    import numpy as np
+    from fastapi import HTTPException
+    from PIL import Image, UnidentifiedImageError
+
+    from classifier import preprocess
+    from uploads import open_image
+
+    tensors, errors = [], []
+    for path in paths:
+        try:
+            with open(os.path.join(root, path), "rb") as f:
+                tensors.append(preprocess(open_image(f)).numpy())
+            errors.append(None)
+        except HTTPException as e:
+            errors.append(str(e.detail))
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError) as e:
+            errors.append(f"Could not decode image: {e}")
+    return (np.stack(tensors) if tensors else None), errors
+
+
+# ---------- Output sinks ----------
+class CsvSink:
+    """Appends rows to one CSV file; the checkpoint records its committed byte length."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def open(self, state: Optional[Dict[str, Any]]) -> None:
+        self.file = open(self.path, "a+", newline="", encoding="utf-8")
+        self.file.truncate(state["bytes"] if state else 0)  # drop rows written after the last checkpoint
+        self.file.seek(0, os.SEEK_END)
+        self.rows = state["rows"] if state else 0
+        self.writer = csv.writer(self.file)
+        if not state:
+            self.writer.writerow(COLUMNS)
+
+    def write(self, rows: List[List[Any]]) -> None:
+        self.writer.writerows(rows)
+        self.rows += len(rows)
+
+    def commit(self) -> Dict[str, Any]:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return {"rows": self.rows, "bytes": self.file.tell()}
+
+    def close(self) -> Dict[str, Any]:
+        state = self.commit()
+        self.file.close()
+        return state
+
+
+class ParquetSink:
+    """Writes part-NNNNN.parquet files of `rows_per_part` rows into a directory."""
+
+    def __init__(self, path: str, rows_per_part: int):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ImportError("Parquet output needs pyarrow: pip install pyarrow") from e
+        self.path = path
+        self.rows_per_part = rows_per_part
+
+    def open(self, state: Optional[Dict[str, Any]]) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        self.parts = state["parts"] if state else 0
+        self.rows = state["rows"] if state else 0
+        for stale in glob.glob(os.path.join(self.path, "part-*.parquet")):
+            if int(os.path.basename(stale)[5:10]) >= self.parts:
+                os.remove(stale)  # written after the last checkpoint
+        self.buffer: List[List[Any]] = []
+
+    def write(self, rows: List[List[Any]]) -> None:
+        self.buffer.extend(rows)
+        while len(self.buffer) >= self.rows_per_part:
+            self._flush(self.buffer[: self.rows_per_part])
+            self.buffer = self.buffer[self.rows_per_part :]
+
+    def _flush(self, rows: List[List[Any]]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table({name: [row[i] for row in rows] for i, name in enumerate(COLUMNS)})
+        tmp = os.path.join(self.path, f".part-{self.parts:05d}.tmp")
+        pq.write_table(table, tmp)
+        os.replace(tmp, os.path.join(self.path, f"part-{self.parts:05d}.parquet"))
+        self.parts += 1
+        self.rows += len(rows)
+
+    def commit(self) -> Dict[str, Any]:
+        return {"rows": self.rows, "parts": self.parts}  # buffered rows are not durable yet
+
+    def close(self) -> Dict[str, Any]:
+        if self.buffer:
+            self._flush(self.buffer)
+            self.buffer = []
+        return self.commit()
+
+
+# ---------- Checkpoints ----------
+def load_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+
+class Progress:
+    """Prints images/sec (overall and since the last report) every `interval` seconds."""
+
+    def __init__(self, total: int, done: int, interval: float):
+        self.total = total
+        self.start_done = self.last_done = done
+        self.started = self.last_report = time.perf_counter()
+        self.interval = interval
+
+    def update(self, done: int, force: bool = False) -> None:
+        now = time.perf_counter()
+        if not force and now - self.last_report < self.interval:
+            return
+        overall = (done - self.start_done) / max(now - self.started, 1e-9)
+        recent = (done - self.last_done) / max(now - self.last_report, 1e-9)
+        eta = (self.total - done) / overall if overall > 0 else float("inf")
+        print(f"{done}/{self.total} images | {overall:.1f} images/s (recent {recent:.1f}) | ETA {eta:.0f} s", flush=True)
+        self.last_done, self.last_report = done, now
+
+    def rate(self, done: int) -> float:
+        return (done - self.start_done) / max(time.perf_counter() - self.started, 1e-9)
+
+
+def run(args) -> int:
+    import torch
+
+    from bundle import ModelBundle
+    from classifier import classify_tensors, load_labels, load_resnet18
+
+    root = os.path.abspath(args.input)
+    files = list_images(root)
+    checkpoint_path = args.output.rstrip(os.sep) + ".checkpoint.json"
+    checkpoint = None if args.restart else load_checkpoint(checkpoint_path)
+    if checkpoint and (checkpoint["input"] != root or checkpoint["total"] != len(files) or checkpoint["format"] != args.format):
+        sys.exit(f"{checkpoint_path} belongs to a different run (input, file count or format changed); use --restart")
+    done = checkpoint["done"] if checkpoint else 0
+    if done:
+        print(f"Resuming after {done} of {len(files)} images")
+
+    device = torch.device(args.device or ("cuda" if torch.cuda.is_available() else "cpu"))
+    bundle = ModelBundle(args.bundle) if args.bundle else None
+    labels = load_labels(args.labels or (bundle.labels_path if bundle is not None else "imagenet_classes.txt"))
+    model = load_resnet18(device, bundle)
+    print(f"Classifying {len(files) - done} images on {device} with {args.workers} decode workers")
+
+    sink = CsvSink(args.output) if args.format == "csv" else ParquetSink(args.output, args.rows_per_part)
+    sink.open(checkpoint["sink"] if checkpoint else None)
+    progress = Progress(len(files), done, args.report_every)
+    base = {"input": root, "total": len(files), "format": args.format}
+
+    batches = (files[i : i + args.batch_size] for i in range(done, len(files), args.batch_size))
+    inflight: deque = deque()
+    with ProcessPoolExecutor(args.workers, initializer=_init_worker) as pool:
+        while True:
+            # Keep the decode stage ahead of inference
+            while len(inflight) < args.workers * 2:
+                paths = next(batches, None)
+                if paths is None:
+                    break
+                inflight.append((paths, pool.submit(decode_batch, root, paths)))
+            if not inflight:
+                break
+
+            paths, future = inflight.popleft()
+            array, errors = future.result()
+            predictions = iter(
+                classify_tensors(model, list(torch.from_numpy(array)), labels, device) if array is not None else []
+            )
+            rows = []
+            for path, error in zip(paths, errors):
+                if error is None:
+                    label, confidence = next(predictions)
+                    rows.append([path, label, round(confidence, 4), None])
+                else:
+                    rows.append([path, None, None, error])
+            sink.write(rows)
+            state = sink.commit()
+            save_checkpoint(checkpoint_path, {**base, "done": state["rows"], "sink": state})
+            progress.update(state["rows"] + len(getattr(sink, "buffer", ())))
+
+    state = sink.close()
+    save_checkpoint(checkpoint_path, {**base, "done": state["rows"], "sink": state})
+    progress.update(state["rows"], force=True)
+    print(f"✓ {state['rows']} images classified into {args.output} ({progress.rate(state['rows']):.1f} images/s)")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Classify a directory of images with ResNet-18")
+    parser.add_argument("input", help="directory to scan recursively for .jpg/.jpeg/.png files")
+    parser.add_argument("--output", required=True, help="CSV file, or directory for --format parquet")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--batch-size", type=int, default=64, help="images per forward pass")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="decode processes")
+    parser.add_argument("--rows-per-part", type=int, default=100_000, help="rows per Parquet part file")
+    parser.add_argument("--report-every", type=float, default=10.0, help="seconds between progress lines")
+    parser.add_argument("--device", help="torch device (default: cuda if available)")
+    parser.add_argument("--bundle", default=os.environ.get("MODEL_BUNDLE"), help="offline model bundle (bundle.py)")
+    parser.add_argument("--labels", default=os.environ.get("LABELS_PATH"), help="ImageNet labels file")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and start over")
+    args = parser.parse_args(argv)
+    try:
+        return run(args)
+    except ImportError as e:
+        sys.exit(str(e))  # e.g. pyarrow missing for --format parquet
+
+
+if __name__ == "__main__":
+    sys.exit(main())
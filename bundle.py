@@ -0,0 +1,210 @@
+"""
+Offline model bundle: everything server.py needs to boot without network access.
+• `prepare` downloads the models once and writes a versioned bundle directory:
+    model_bundle/
+      CURRENT                      ← name of the active version
+      v20250101-120000/
+        manifest.json              ← versions, sources and sha256 of every file
+        imagenet_classes.txt
+        resnet18.safetensors       ← mmap-able weights, loaded with zero copies
+        resnet18.torchscript.pt    ← optional traced graph (--torchscript)
+        sentiment/                 ← save_pretrained() model + tokenizer
+        chat/                      ← save_pretrained() SmolVLM + processor
+• Start the server from it with MODEL_BUNDLE=model_bundle python server.py
+Run:
+    python bundle.py prepare --output model_bundle [--torchscript] [--skip-chat]
+    python bundle.py verify model_bundle
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import urllib.request
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+LABELS_URL = "https://raw.githubusercontent.com/pytorch/hub/master/imagenet_classes.txt"
+DEFAULT_SENTIMENT_MODEL = "distilbert/distilbert-base-uncased-finetuned-sst-2-english"
+DEFAULT_CHAT_MODEL = "HuggingFaceTB/SmolVLM-Instruct"
+MANIFEST = "manifest.json"
+CURRENT = "CURRENT"
+BUNDLE_FORMAT = 1
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_hashes(root: str) -> Dict[str, str]:
+    hashes = {}
+    for dirpath, _, files in os.walk(root):
+        for filename in sorted(files):
+            path = os.path.join(dirpath, filename)
+            rel = os.path.relpath(path, root).replace(os.sep, "/")
+            if rel != MANIFEST:
+                hashes[rel] = _sha256(path)
+    return dict(sorted(hashes.items()))
+
+
+class ModelBundle:
+    """A prepared bundle version on disk."""
+
+    def __init__(self, path: str):
+        current = os.path.join(path, CURRENT)
+        if os.path.exists(current):
+            with open(current) as f:
+                path = os.path.join(path, f.read().strip())
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest: Dict[str, Any] = json.load(f)
+        if self.manifest.get("format") != BUNDLE_FORMAT:
+            raise ValueError(f"Unsupported bundle format {self.manifest.get('format')} in {path}")
+        self.path = path
+        self.version = self.manifest["version"]
+
+    def file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def has(self, name: str) -> bool:
+        return os.path.exists(self.file(name))
+
+    @property
+    def labels_path(self) -> str:
+        return self.file("imagenet_classes.txt")
+
+    @property
+    def sentiment_dir(self) -> str:
+        return self.file("sentiment")
+
+    @property
+    def chat_dir(self) -> Optional[str]:
+        return self.file("chat") if self.has("chat") else None
+
+    def load_resnet18(self, device, prefer_torchscript: bool = False):
+        """Build ResNet-18 on the meta device and assign mmap'd safetensors weights to it."""
+        import torch
+        from torchvision import models
+
+        if prefer_torchscript and self.has("resnet18.torchscript.pt"):
+            return torch.jit.load(self.file("resnet18.torchscript.pt"), map_location=device).eval()
+
+        from safetensors.torch import load_file
+
+        state = load_file(self.file("resnet18.safetensors"), device=str(device))
+        with torch.device("meta"):
+            model = models.resnet18(weights=None)
+        model.load_state_dict(state, assign=True)
+        return model.eval()
+
+    def verify(self) -> Dict[str, str]:
+        """Return {file: problem} for every file whose hash no longer matches the manifest."""
+        expected = self.manifest["files"]
+        actual = _file_hashes(self.path)
+        problems = {name: "missing" for name in expected if name not in actual}
+        problems.update({name: "modified" for name in expected if name in actual and actual[name] != expected[name]})
+        return problems
+
+
+def prepare(output: str, sentiment_model: str, chat_model: str, torchscript: bool, skip_chat: bool) -> str:
+    """Download every artifact into a new bundle version and point CURRENT at it."""
+    import torch
+    import torchvision
+    import transformers
+    from safetensors.torch import save_file
+    from torchvision import models
+    from transformers import pipeline
+
+    version = datetime.now().strftime("v%Y%m%d-%H%M%S")
+    path = os.path.join(output, version)
+    os.makedirs(path)
+    timings = {}
+
+    started = time.perf_counter()
+    urllib.request.urlretrieve(LABELS_URL, os.path.join(path, "imagenet_classes.txt"))
+    resnet = models.resnet18(weights=models.ResNet18_Weights.IMAGENET1K_V1).eval()
+    save_file({k: v.contiguous() for k, v in resnet.state_dict().items()}, os.path.join(path, "resnet18.safetensors"))
+    if torchscript:
+        traced = torch.jit.trace(resnet, torch.randn(1, 3, 224, 224))
+        torch.jit.save(torch.jit.freeze(traced), os.path.join(path, "resnet18.torchscript.pt"))
+    timings["resnet18"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    pipeline("sentiment-analysis", model=sentiment_model).save_pretrained(os.path.join(path, "sentiment"))
+    timings["sentiment"] = time.perf_counter() - started
+
+    if not skip_chat:
+        started = time.perf_counter()
+        chat = pipeline("image-text-to-text", model=chat_model, torch_dtype=torch.float16)
+        chat.save_pretrained(os.path.join(path, "chat"), safe_serialization=True)
+        if getattr(chat, "processor", None) is not None:
+            chat.processor.save_pretrained(os.path.join(path, "chat"))  # keeps the chat template
+        timings["chat"] = time.perf_counter() - started
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": version,
+        "created": datetime.now().isoformat(),
+        "sources": {
+            "resnet18": "torchvision ResNet18_Weights.IMAGENET1K_V1",
+            "labels": LABELS_URL,
+            "sentiment": sentiment_model,
+            "chat": None if skip_chat else chat_model,
+        },
+        "libraries": {
+            "torch": torch.__version__,
+            "torchvision": torchvision.__version__,
+            "transformers": transformers.__version__,
+        },
+        "prepare_seconds": {k: round(v, 2) for k, v in timings.items()},
+        "files": _file_hashes(path),
+    }
+    with open(os.path.join(path, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Switch CURRENT atomically so a running deployment never sees a half-written pointer
+    tmp = os.path.join(output, CURRENT + ".tmp")
+    with open(tmp, "w") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(output, CURRENT))
+    return path
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Prepare or verify an offline model bundle")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("prepare", help="download models and write a new bundle version")
+    p.add_argument("--output", default="model_bundle")
+    p.add_argument("--sentiment-model", default=DEFAULT_SENTIMENT_MODEL)
+    p.add_argument("--chat-model", default=DEFAULT_CHAT_MODEL)
+    p.add_argument("--torchscript", action="store_true", help="also save a traced, frozen ResNet-18 graph")
+    p.add_argument("--skip-chat", action="store_true", help="leave SmolVLM out of the bundle")
+
+    v = sub.add_parser("verify", help="check bundle files against the manifest")
+    v.add_argument("path")
+
+    args = parser.parse_args(argv)
+    if args.command == "prepare":
+        path = prepare(args.output, args.sentiment_model, args.chat_model, args.torchscript, args.skip_chat)
+        print(f"✓ Bundle written to {path}")
+        print(f"  Start the server with: MODEL_BUNDLE={args.output} python server.py")
+        return 0
+
+    bundle = ModelBundle(args.path)
+    problems = bundle.verify()
+    if problems:
+        for name, problem in problems.items():
+            print(f"✗ {name}: {problem}")
+        return 1
+    print(f"✓ Bundle {bundle.version} verified ({len(bundle.manifest['files'])} files)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""
+Resolution tiers that bound the vision-token cost of chat images.
+SmolVLM's processor resizes an image to `size["longest_edge"]` and, with image splitting
+on, cuts it into 384 px tiles plus one downscaled global view; every tile costs the
+same number of vision tokens, so latency and memory grow with the upload's size.
+A tier fixes both knobs, and `fit_image` downscales before the processor runs so it
+never resizes more pixels than the tier keeps.
+    fast      one 384 px view, no tiles
+    balanced  longest edge 768: at most 2x2 tiles + global view
+    detailed  longest edge 1536 (SmolVLM's default): at most 4x4 tiles + global view
+CHAT_IMAGE_TIER picks the default; CHAT_IMAGE_MAX_EDGE caps every tier server-side.
+"""
+
+import math
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image
+
+TILE_SIZE = 384  # SmolVLM's max_image_size["longest_edge"]
+CHAT_IMAGE_TIER = os.environ.get("CHAT_IMAGE_TIER", "balanced")
+CHAT_IMAGE_MAX_EDGE = int(os.environ.get("CHAT_IMAGE_MAX_EDGE", "1536"))
+
+
+@dataclass(frozen=True)
+class ImageTier:
+    name: str
+    longest_edge: int
+    split: bool  # cut into TILE_SIZE tiles (plus a global view) instead of one view
+
+    def processor_kwargs(self) -> Dict[str, Any]:
+        """Keyword arguments for the SmolVLM (Idefics3) processor call."""
+        return {"do_image_splitting": self.split, "size": {"longest_edge": self.longest_edge}}
+
+    def tiles(self, size: Tuple[int, int]) -> int:
+        """Image views the processor produces for an image of `size` (width, height)."""
+        if not self.split:
+            return 1
+        scale = self.longest_edge / max(size)
+        columns = math.ceil(size[0] * scale / TILE_SIZE)
+        rows = math.ceil(size[1] * scale / TILE_SIZE)
+        return columns * rows + 1 if columns * rows > 1 else 1
+
+
+def _tier(name: str, longest_edge: int, split: bool) -> ImageTier:
+    return ImageTier(name, max(TILE_SIZE, min(longest_edge, CHAT_IMAGE_MAX_EDGE)), split)
+
+
+TIERS: Dict[str, ImageTier] = {
+    "fast": _tier("fast", TILE_SIZE, False),
+    "balanced": _tier("balanced", 2 * TILE_SIZE, True),
+    "detailed": _tier("detailed", 4 * TILE_SIZE, True),
+}
+
+
+def get_tier(name: Optional[str] = None) -> ImageTier:
+    """The named tier, or the default one; raises ValueError for unknown names."""
+    tier = TIERS.get(name or CHAT_IMAGE_TIER)
+    if tier is None:
+        raise ValueError(f"Unknown image quality {name!r}; use one of: {', '.join(TIERS)}.")
+    return tier
+
+
+def fit_image(image: Image.Image, tier: ImageTier) -> Image.Image:
+    """Downscale (never upscale) so the longest edge is at most the tier's."""
+    scale = tier.longest_edge / max(image.size)
+    if scale >= 1:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.Resampling.BICUBIC, reducing_gap=2.0)
@@ -0,0 +1,59 @@
+"""
+ResNet-18 image classification shared by server.py (/predict, /jobs) and bulk_classify.py,
+so every entry point decodes, pre-processes and scores images the same way.
+"""
+
+import os
+import urllib.request
+from typing import List, Tuple
+
+import torch
+from torchvision import models, transforms
+
+from bundle import LABELS_URL
+
+INPUT_SIZE = 224
+normalize = transforms.Normalize(
+    mean=[0.485, 0.456, 0.406],  # ImageNet means
+    std=[0.229, 0.224, 0.225],  # ImageNet stds
+)
+preprocess = transforms.Compose(
+    [
+        transforms.Resize(256),
+        transforms.CenterCrop(INPUT_SIZE),
+        transforms.ToTensor(),
+        normalize,
+    ]
+)
+
+
+def load_labels(path: str) -> List[str]:
+    """ImageNet class names, downloaded to `path` on first use."""
+    if not os.path.exists(path):
+        urllib.request.urlretrieve(LABELS_URL, path)
+    with open(path) as f:
+        return [line.strip() for line in f.readlines()]
+
+
+def load_resnet18(device: torch.device, bundle=None, prefer_torchscript: bool = False) -> torch.nn.Module:
+    """Pretrained ResNet-18 in eval mode, from an offline bundle (bundle.py) when given."""
+    if bundle is not None:
+        model = bundle.load_resnet18(device, prefer_torchscript=prefer_torchscript)
+    else:
+        model = models.resnet18(weights=models.ResNet18_Weights.IMAGENET1K_V1)
+    return model.eval().to(device)
+
+
+def top1(logits: torch.Tensor, labels: List[str]) -> List[Tuple[str, float]]:
+    """(label, softmax confidence) of the best class for each row of a (N, 1000) batch."""
+    confidences, indices = torch.nn.functional.softmax(logits, dim=1).max(dim=1)
+    return [(labels[i], c) for i, c in zip(indices.tolist(), confidences.tolist())]
+
+
+def classify_tensors(
+    model: torch.nn.Module, tensors: List[torch.Tensor], labels: List[str], device: torch.device
+) -> List[Tuple[str, float]]:
+    """Run one forward pass over normalized 3x224x224 tensors; return top-1 per tensor."""
+    with torch.no_grad():
+        logits = model(torch.stack(tensors).to(device))
+    return top1(logits, labels)
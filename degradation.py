@@ -0,0 +1,101 @@
+"""
+Graceful degradation under overload.
+• When the chat queue is deep or its predicted wait is long, /chat and /ws/chat answer
+  with the rule-based responder instead of queueing for SmolVLM (and timing out).
+• When too many distinct sentiment analyses are already running, /sentiment_analysis
+  answers with a keyword classifier instead of the transformer.
+• Degraded responses say so in `model_used`; every decision is counted in metrics.py.
+The responders are the same cheap ones simple_server.py serves.
+Configure with DEGRADE_MODE=auto|off|always and the DEGRADE_* thresholds below.
+"""
+
+import os
+import re
+from typing import Dict, Optional
+
+from metrics import metrics
+
+DEGRADE_MODE = os.environ.get("DEGRADE_MODE", "auto")  # auto | off | always
+DEGRADE_QUEUE_DEPTH = int(os.environ.get("DEGRADE_QUEUE_DEPTH", "16"))  # queued chat requests
+DEGRADE_PREDICTED_WAIT = float(os.environ.get("DEGRADE_PREDICTED_WAIT", "10"))  # seconds
+DEGRADE_SENTIMENT_INFLIGHT = int(os.environ.get("DEGRADE_SENTIMENT_INFLIGHT", "32"))
+
+RULE_BASED_CHAT_MODEL = "Simple Rule-based Chat"
+KEYWORD_SENTIMENT_MODEL = "Keyword sentiment"
+
+POSITIVE_WORDS = ["good", "great", "excellent", "amazing", "wonderful", "fantastic", "love", "like", "happy", "joy"]
+NEGATIVE_WORDS = ["bad", "terrible", "awful", "horrible", "hate", "dislike", "sad", "angry", "disappointed"]
+
+
+class DegradationPolicy:
+    """Decides per request whether to serve the cheap tier instead of the model."""
+
+    def __init__(
+        self,
+        name: str,
+        mode: str = DEGRADE_MODE,
+        max_queue_depth: Optional[int] = None,
+        max_predicted_wait: Optional[float] = None,
+        max_inflight: Optional[int] = None,
+    ):
+        if mode not in ("auto", "off", "always"):
+            raise ValueError(f"DEGRADE_MODE must be auto, off or always, not {mode!r}")
+        self.name = name
+        self.mode = mode
+        self.max_queue_depth = max_queue_depth
+        self.max_predicted_wait = max_predicted_wait
+        self.max_inflight = max_inflight
+
+    def reason(self, queue_depth: int = 0, predicted_wait: float = 0.0, inflight: int = 0) -> Optional[str]:
+        """Why this request should be degraded, or None to use the model."""
+        if self.mode == "off":
+            return None
+        if self.mode == "always":
+            return "forced"
+        if self.max_queue_depth is not None and queue_depth >= self.max_queue_depth:
+            return "queue_depth"
+        if self.max_predicted_wait is not None and predicted_wait >= self.max_predicted_wait:
+            return "predicted_wait"
+        if self.max_inflight is not None and inflight >= self.max_inflight:
+            return "inflight"
+        return None
+
+    def check(self, **load) -> Optional[str]:
+        """`reason()`, counted as {name}.degraded.<reason> or {name}.full_model."""
+        reason = self.reason(**load)
+        if reason is None:
+            metrics.inc(f"{self.name}.full_model")
+        else:
+            metrics.inc(f"{self.name}.degraded.{reason}")
+        return reason
+
+
+def rule_based_chat_response(message: str, has_image: bool) -> str:
+    """Keyword-matched reply, as served by simple_server.py."""
+    text = message.strip().lower()
+    words = set(re.findall(r"[a-z']+", text))
+    if has_image:
+        return "I can see you sent an image! While I can't analyze it yet, I'm here to help with your message."
+    if not text:
+        return "I'm here to help! What would you like to talk about?"
+    if "how are you" in text:
+        return "I'm doing great, thank you for asking! I'm here and ready to help."
+    if words & {"hello", "hi", "hey"}:
+        return "Hello! It's nice to meet you. How are you doing today?"
+    if "thank" in text:
+        return "You're very welcome! I'm glad I could help."
+    if "?" in text:
+        return f"That's a great question about '{message}'. Could you tell me a bit more?"
+    return f"I understand you said: '{message}'. I'm a simple AI assistant here to help!"
+
+
+def keyword_sentiment(text: str) -> Dict[str, object]:
+    """Count positive and negative keywords; same output shape as the transformers pipeline."""
+    text_lower = text.lower()
+    positive_count = sum(1 for word in POSITIVE_WORDS if word in text_lower)
+    negative_count = sum(1 for word in NEGATIVE_WORDS if word in text_lower)
+    if positive_count > negative_count:
+        return {"label": "POSITIVE", "score": 0.8}
+    if negative_count > positive_count:
+        return {"label": "NEGATIVE", "score": 0.8}
+    return {"label": "NEUTRAL", "score": 0.5}
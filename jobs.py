@@ -0,0 +1,320 @@
+"""
+Asynchronous jobs backed by a local SQLite queue.
+• `JobStore` persists jobs (queued → running → done | failed) so they survive restarts;
+  jobs that were running when the process died are re-queued on startup.
+• `JobWorkerPool` runs asyncio workers that claim the oldest queued jobs in batches of
+  one type, hand each batch to that type's handler, and record results and progress.
+  Batch sizes can be set per type: jobs that run one after another in their handler
+  (chat generations) are claimed one at a time, so idle workers can take the next one
+  and each result is visible as soon as it is ready.
+  SQLite writes go through one writer thread, in order, never on the event loop.
+Handlers are registered by server.py (chat generations, image classification).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB = os.environ.get("JOBS_DB", "jobs.sqlite3")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_BATCH_SIZE = int(os.environ.get("JOB_BATCH_SIZE", "8"))  # jobs of one type claimed together
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "1.0"))  # seconds
+JOB_MAX_BYTES = int(os.environ.get("JOB_MAX_BYTES", str(200 * 1024 * 1024)))  # POST /jobs body limit
+JOB_RETENTION = float(os.environ.get("JOB_RETENTION", str(24 * 3600)))  # seconds to keep finished jobs
+
+TERMINAL = ("done", "failed")
+
+
+@dataclass
+class Job:
+    id: str
+    type: str
+    status: str
+    payload: Any
+    result: Any
+    error: Optional[str]
+    progress: float
+    created: float
+    started: Optional[float]
+    finished: Optional[float]
+
+    def public(self) -> Dict[str, Any]:
+        """JSON view returned by GET /jobs/{id} (without the input payload)."""
+        iso = lambda ts: datetime.fromtimestamp(ts).isoformat() if ts else None
+        return {
+            "id": self.id,
+            "type": self.type,
+            "status": self.status,
+            "progress": round(self.progress, 4),
+            "created": iso(self.created),
+            "started": iso(self.started),
+            "finished": iso(self.finished),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class RetryLater(Exception):
+    """Raised by a handler to put a job back in the queue for `delay` seconds."""
+
+    def __init__(self, reason: str, delay: float):
+        super().__init__(reason)
+        self.delay = delay
+
+
+class JobStore:
+    """SQLite-backed job table; safe to share between threads."""
+
+    def __init__(self, path: str = JOBS_DB):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    type TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT,
+                    result TEXT,
+                    error TEXT,
+                    progress REAL NOT NULL DEFAULT 0,
+                    created REAL NOT NULL,
+                    started REAL,
+                    finished REAL,
+                    not_before REAL NOT NULL DEFAULT 0
+                )"""
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, created)")
+
+    @staticmethod
+    def _job(row: sqlite3.Row) -> Job:
+        return Job(
+            id=row["id"],
+            type=row["type"],
+            status=row["status"],
+            payload=json.loads(row["payload"]) if row["payload"] is not None else None,
+            result=json.loads(row["result"]) if row["result"] is not None else None,
+            error=row["error"],
+            progress=row["progress"],
+            created=row["created"],
+            started=row["started"],
+            finished=row["finished"],
+        )
+
+    def submit(self, job_type: str, payload: Any) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, type, status, payload, created) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, job_type, json.dumps(payload), time.time()),
+            )
+        metrics.inc(f"jobs.{job_type}.submitted")
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row is not None else None
+
+    def claim(self, types: Iterable[str], limit: int, limits: Optional[Dict[str, int]] = None) -> List[Job]:
+        """Mark up to `limit` of the oldest runnable queued jobs of a single type as running.
+
+        `limits` overrides `limit` for the types it names.
+        """
+        types = list(types)
+        marks = ",".join("?" * len(types))
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                oldest = self._db.execute(
+                    f"SELECT type FROM jobs WHERE status = 'queued' AND not_before <= ? AND type IN ({marks}) "
+                    "ORDER BY created LIMIT 1",
+                    (now, *types),
+                ).fetchone()
+                if oldest is None:
+                    self._db.execute("COMMIT")
+                    return []
+                rows = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' AND not_before <= ? AND type = ? "
+                    "ORDER BY created LIMIT ?",
+                    (now, oldest["type"], (limits or {}).get(oldest["type"], limit)),
+                ).fetchall()
+                self._db.executemany(
+                    "UPDATE jobs SET status = 'running', started = ? WHERE id = ?",
+                    [(now, row["id"]) for row in rows],
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        jobs = [self._job(row) for row in rows]
+        for job in jobs:
+            job.status, job.started = "running", now
+        return jobs
+
+    def progress(self, job_id: str, progress: float, partial: Any = None) -> None:
+        """Record progress in [0, 1], plus an optional partial result."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET progress = ?, result = COALESCE(?, result) WHERE id = ? AND status = 'running'",
+                (progress, json.dumps(partial) if partial is not None else None, job_id),
+            )
+
+    def complete(self, job_id: str, result: Any) -> None:
+        # The input payload (possibly large images) is no longer needed once a job finishes
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'done', result = ?, progress = 1, payload = NULL, finished = ? WHERE id = ?",
+                (json.dumps(result), time.time(), job_id),
+            )
+
+    def fail(self, job_id: str, error: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, payload = NULL, finished = ? WHERE id = ?",
+                (error, time.time(), job_id),
+            )
+
+    def requeue(self, job_id: str, delay: float = 0.0) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'queued', started = NULL, not_before = ? WHERE id = ?",
+                (time.time() + delay, job_id),
+            )
+
+    def recover(self) -> int:
+        """Re-queue jobs left running by a previous process; returns how many."""
+        with self._lock:
+            return self._db.execute(
+                "UPDATE jobs SET status = 'queued', started = NULL, progress = 0 WHERE status = 'running'"
+            ).rowcount
+
+    def purge(self, older_than: float = JOB_RETENTION) -> int:
+        """Delete finished jobs older than `older_than` seconds; returns how many."""
+        with self._lock:
+            return self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished < ?",
+                (time.time() - older_than,),
+            ).rowcount
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+
+# A handler receives a batch of claimed jobs of its type plus a non-blocking progress
+# callback (job_id, fraction, partial_result=None) and returns one result per job, in order;
+# an Exception in place of a result fails that job, RetryLater re-queues it.
+Handler = Callable[[List[Job], Callable[..., None]], Awaitable[List[Any]]]
+
+
+class JobWorkerPool:
+    """Asyncio workers that drain a JobStore in same-type batches."""
+
+    def __init__(
+        self,
+        store: JobStore,
+        handlers: Dict[str, Handler],
+        workers: int = JOB_WORKERS,
+        batch_size: int = JOB_BATCH_SIZE,
+        poll_interval: float = JOB_POLL_INTERVAL,
+        batch_sizes: Optional[Dict[str, int]] = None,
+    ):
+        self.store = store
+        self.handlers = handlers
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_sizes = batch_sizes or {}  # per-type overrides of batch_size
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._writer: Optional[ThreadPoolExecutor] = None
+        metrics.gauge("jobs.queued", lambda: self.store.count("queued"))
+        metrics.gauge("jobs.running", lambda: self.store.count("running"))
+
+    def start(self) -> None:
+        recovered = self.store.recover()
+        if recovered:
+            logger.info("Re-queued %s interrupted job(s)", recovered)
+        self.store.purge()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-writer")
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._writer is not None:
+            await asyncio.to_thread(self._writer.shutdown)  # flush queued writes
+            self._writer = None
+
+    def notify(self) -> None:
+        """Wake idle workers after a submit instead of waiting for the next poll."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _worker(self) -> None:
+        while True:
+            jobs = await asyncio.to_thread(self.store.claim, self.handlers, self.batch_size, self.batch_sizes)
+            if not jobs:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run_batch(jobs)
+
+    def _progress(self, job_id: str, progress: float, partial: Any = None) -> None:
+        # Queued, not awaited: handlers report progress from async code
+        self._writer.submit(self.store.progress, job_id, progress, partial)
+
+    async def _write(self, method, *args) -> None:
+        # Same thread as _progress, so a job's last progress write lands before its result.
+        # Shielded: a shutdown must not drop a finished job's result and replay it on restart.
+        await asyncio.shield(asyncio.get_running_loop().run_in_executor(self._writer, method, *args))
+
+    async def _run_batch(self, jobs: List[Job]) -> None:
+        job_type = jobs[0].type
+        metrics.inc(f"jobs.{job_type}.batches")
+        metrics.inc(f"jobs.{job_type}.batched_jobs", len(jobs))
+        try:
+            results = await self.handlers[job_type](jobs, self._progress)
+        except asyncio.CancelledError:
+            for job in jobs:
+                self.store.requeue(job.id)  # shutting down; pick up again on restart
+            raise
+        except Exception as e:
+            logger.error("Job batch (%s, %s jobs) failed: %s", job_type, len(jobs), e)
+            results = [e] * len(jobs)
+
+        for job, result in zip(jobs, results):
+            if isinstance(result, RetryLater):
+                await self._write(self.store.requeue, job.id, result.delay)
+                metrics.inc(f"jobs.{job_type}.retried")
+            elif isinstance(result, Exception):
+                await self._write(self.store.fail, job.id, str(result) or type(result).__name__)
+                metrics.inc(f"jobs.{job_type}.failed")
+            else:
+                await self._write(self.store.complete, job.id, result)
+                metrics.inc(f"jobs.{job_type}.done")
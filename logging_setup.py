@@ -0,0 +1,119 @@
+"""
+Non-blocking, structured logging for server.py.
+• `setup_logging()` sends every record through a QueueHandler; a QueueListener thread
+  formats and writes it, so a slow terminal or log pipe never stalls the event loop.
+  When the queue is full, records are dropped and counted, never waited for.
+• Formatting is lazy: the record itself is queued, and its %-style arguments and
+  `fields` are only rendered in the listener thread. Field values are truncated to
+  LOG_MAX_FIELD_CHARS. LOG_FORMAT=json writes one JSON object per line instead of text.
+• `log_request()` samples the per-request info lines of each endpoint
+  (LOG_SAMPLE="predict=0.01,chat=0.1,*=1"); warnings and errors are always kept.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from metrics import metrics
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")  # text | json
+LOG_MAX_FIELD_CHARS = int(os.environ.get("LOG_MAX_FIELD_CHARS", "200"))
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """"predict=0.01,chat=0.1" → {"predict": 0.01, "chat": 0.1}; "*" sets the default."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        endpoint, _, rate = item.partition("=")
+        rates[endpoint.strip()] = float(rate)
+    return rates
+
+
+LOG_SAMPLE = parse_sample_rates(os.environ.get("LOG_SAMPLE", ""))
+
+
+def truncate(value: Any, max_chars: int = LOG_MAX_FIELD_CHARS) -> Any:
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    text = str(value)
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}…(+{len(text) - max_chars} chars)"
+
+
+class StructuredFormatter(logging.Formatter):
+    """`LEVEL:logger:message | key=value ...` or a JSON line, with truncated fields."""
+
+    def __init__(self, json_lines: bool = False, max_chars: int = LOG_MAX_FIELD_CHARS):
+        super().__init__()
+        self.json_lines = json_lines
+        self.max_chars = max_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = truncate(record.getMessage(), self.max_chars * 4)
+        fields = {k: truncate(v, self.max_chars) for k, v in (getattr(record, "fields", None) or {}).items()}
+        if self.json_lines:
+            line = {"time": self.formatTime(record), "level": record.levelname, "logger": record.name, "message": message}
+            line.update(fields)
+            if record.exc_info:
+                line["exception"] = self.formatException(record.exc_info)
+            return json.dumps(line, default=str)
+        text = f"{record.levelname}:{record.name}:{message}"
+        if fields:
+            text += " | " + " ".join(f"{k}={v!r}" if isinstance(v, str) else f"{k}={v}" for k, v in fields.items())
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+class LazyQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread and never blocks."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record  # the stock prepare() formats here, on the caller's thread
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("logging.dropped")
+
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging(level: str = LOG_LEVEL, json_lines: bool = LOG_FORMAT == "json", stream=None) -> QueueListener:
+    """Route the root logger through a bounded queue to a background writer thread."""
+    global _listener
+    if _listener is not None:
+        return _listener
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(StructuredFormatter(json_lines))
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(LazyQueueHandler(log_queue))
+    root.setLevel(level)
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)  # flush what is still queued
+    metrics.gauge("logging.queued", log_queue.qsize)
+    return _listener
+
+
+def log_request(logger: logging.Logger, endpoint: str, message: str, *args, **fields) -> None:
+    """Per-request info line for `endpoint`, kept with probability LOG_SAMPLE[endpoint]."""
+    rate = LOG_SAMPLE.get(endpoint, LOG_SAMPLE.get("*", 1.0))
+    if rate < 1.0 and random.random() >= rate:
+        return
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(message, *args, extra={"endpoint": endpoint, "fields": fields})
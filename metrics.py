@@ -0,0 +1,41 @@
+"""
+Process-wide counters and gauges, exposed as JSON by GET /metrics in server.py.
+"""
+
+import threading
+from collections import defaultdict
+from typing import Callable, Dict
+
+
+class Metrics:
+    """Thread-safe named counters plus gauges computed on read."""
+
+    def __init__(self):
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def set(self, name: str, value: float) -> None:
+        with self._lock:
+            self._counters[name] = value
+
+    def get(self, name: str) -> float:
+        return self._counters.get(name, 0)
+
+    def gauge(self, name: str, fn: Callable[[], float]) -> None:
+        """Register `fn` to be evaluated for `name` on every snapshot."""
+        self._gauges[name] = fn
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            values = dict(self._counters)
+        for name, fn in self._gauges.items():
+            values[name] = fn()
+        return dict(sorted(values.items()))
+
+
+metrics = Metrics()
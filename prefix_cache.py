@@ -0,0 +1,125 @@
+"""
+Process-wide cache of prompt-prefix KV states shared by all chat sessions.
+• Entries are keyed by a hash of the token IDs they cover, so any prompt that starts
+  with the same tokens (a system prompt, the chat-template header, an identical
+  conversation so far) reuses the entry, whichever session created it.
+• `lease()` finds the longest cached prefix of a prompt and pins it (reference count)
+  for the duration of a generation; pinned entries are never evicted.
+• Unpinned entries are evicted least-recently-used first once the cached prefixes
+  exceed `max_tokens` in total.
+• Hits, misses and prefill tokens saved are published via metrics.py.
+The cache stores KV objects opaquely; server.py builds and copies them.
+"""
+
+import hashlib
+import os
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional, Sequence
+
+from metrics import metrics
+
+PREFIX_CACHE_MAX_TOKENS = int(os.environ.get("PREFIX_CACHE_MAX_TOKENS", "8192"))  # summed over entries
+PREFIX_CACHE_MIN_TOKENS = int(os.environ.get("PREFIX_CACHE_MIN_TOKENS", "16"))  # shorter prefixes aren't worth it
+
+
+def prefix_key(token_ids: Sequence[int]) -> bytes:
+    return hashlib.blake2b(array("q", token_ids).tobytes(), digest_size=16).digest()
+
+
+@dataclass
+class PrefixEntry:
+    key: bytes
+    length: int  # tokens covered
+    kv: Any
+    refs: int = 0
+
+
+class PrefixCache:
+    """LRU cache of token-prefix → KV state with reference-counted leases."""
+
+    def __init__(self, max_tokens: int = PREFIX_CACHE_MAX_TOKENS, min_tokens: int = PREFIX_CACHE_MIN_TOKENS, name: str = "chat"):
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+        self.name = name
+        self.tokens = 0
+        self._entries: "OrderedDict[bytes, PrefixEntry]" = OrderedDict()
+        self._lengths: Counter = Counter()  # cached prefix lengths, to know which prefixes to hash
+        self._lock = threading.Lock()
+        metrics.gauge(f"{name}.prefix_cache.entries", lambda: len(self._entries))
+        metrics.gauge(f"{name}.prefix_cache.tokens", lambda: self.tokens)
+        metrics.gauge(f"{name}.prefix_cache.hit_rate", self.hit_rate)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, token_ids: Sequence[int]) -> bool:
+        return prefix_key(token_ids) in self._entries
+
+    def hit_rate(self) -> float:
+        hits = metrics.get(f"{self.name}.prefix_cache.hits")
+        total = hits + metrics.get(f"{self.name}.prefix_cache.misses")
+        return round(hits / total, 4) if total else 0.0
+
+    def _longest(self, token_ids: Sequence[int]) -> Optional[PrefixEntry]:
+        # A prefix must leave at least one token for the model to process
+        for length in sorted((n for n in self._lengths if n < len(token_ids)), reverse=True):
+            entry = self._entries.get(prefix_key(token_ids[:length]))
+            if entry is not None:
+                return entry
+        return None
+
+    @contextmanager
+    def lease(self, token_ids: Sequence[int]) -> Iterator[Optional[PrefixEntry]]:
+        """Pin and yield the longest cached strict prefix of `token_ids`, or None."""
+        with self._lock:
+            entry = self._longest(token_ids)
+            if entry is not None:
+                entry.refs += 1
+                self._entries.move_to_end(entry.key)
+        if entry is None:
+            metrics.inc(f"{self.name}.prefix_cache.misses")
+        else:
+            metrics.inc(f"{self.name}.prefix_cache.hits")
+            metrics.inc(f"{self.name}.prefix_cache.prefill_tokens_saved", entry.length)
+        try:
+            yield entry
+        finally:
+            if entry is not None:
+                with self._lock:
+                    entry.refs -= 1
+                    self._evict()
+
+    def insert(self, token_ids: Sequence[int], kv: Any) -> bool:
+        """Cache `kv` as the state after `token_ids`; returns whether it was stored."""
+        length = len(token_ids)
+        if length < self.min_tokens or length > self.max_tokens:
+            return False
+        key = prefix_key(token_ids)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return False
+            self._entries[key] = PrefixEntry(key, length, kv)
+            self._lengths[length] += 1
+            self.tokens += length
+            self._evict()
+        metrics.inc(f"{self.name}.prefix_cache.inserted")
+        return True
+
+    def _evict(self) -> None:
+        # Least recently used first, skipping entries pinned by a running generation
+        for entry in list(self._entries.values()):
+            if self.tokens <= self.max_tokens:
+                break
+            if entry.refs:
+                continue
+            del self._entries[entry.key]
+            self._lengths[entry.length] -= 1
+            if not self._lengths[entry.length]:
+                del self._lengths[entry.length]
+            self.tokens -= entry.length
+            metrics.inc(f"{self.name}.prefix_cache.evicted")
@@ -0,0 +1,198 @@
+"""
+On-demand per-request profiling for server.py.
+• A request is profiled when it carries a matching `X-Profile-Token` header, or when
+  it is picked by the PROFILE_SAMPLE_RATE lottery.
+• Profiled requests run under torch.profiler (Chrome trace) plus a stdlib stack
+  sampler (speedscope JSON); the files are written to PROFILE_DIR and the profile ID
+  is returned in the `X-Profile-Id` response header.
+• Only one request is profiled at a time (torch allows a single active profiler per
+  process); requests picked while a profile is running are served normally and
+  counted as `profiling.skipped`.
+• The middleware is only installed when a token or sample rate is configured, so an
+  unconfigured server pays nothing. Requests that are not profiled only pay for one
+  header lookup.
+Open the results:
+    chrome://tracing or https://ui.perfetto.dev   ← <id>.torch.json
+    https://www.speedscope.app                   ← <id>.speedscope.json
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_PATHS = tuple(os.environ.get("PROFILE_PATHS", "/chat,/predict").split(","))
+SAMPLE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+TOKEN_HEADER = b"x-profile-token"
+ID_HEADER = b"x-profile-id"
+
+# Held while a torch profiler is active; a second one would raise
+_profiling = threading.Lock()
+
+
+def profiling_enabled() -> bool:
+    """Return True if any way of triggering a profile is configured."""
+    return bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+
+class StackSampler:
+    """Periodically samples the Python stacks of every other thread.
+
+    A minimal stand-in for py-spy that only needs the standard library. Samples from
+    all threads are kept, so concurrent requests show up as well; each thread gets
+    its own profile in the speedscope output.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.frames: List[Dict[str, object]] = []
+        self.frame_index: Dict[Tuple[str, str, int], int] = {}
+        self.samples: Dict[int, List[List[int]]] = {}
+        self.started_at = 0.0
+        self.stopped_at = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.stopped_at = time.perf_counter()
+
+    def _frame_id(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        if key not in self.frame_index:
+            self.frame_index[key] = len(self.frames)
+            self.frames.append({"name": key[0], "file": key[1], "line": key[2]})
+        return self.frame_index[key]
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_id(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples.setdefault(thread_id, []).append(stack)
+
+    def to_speedscope(self, name: str) -> Dict[str, object]:
+        """Export the collected samples in speedscope's "sampled" file format."""
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        duration = self.stopped_at - self.started_at
+        profiles = []
+        for thread_id, stacks in self.samples.items():
+            profiles.append({
+                "type": "sampled",
+                "name": f"{name} [{thread_names.get(thread_id, thread_id)}]",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": duration,
+                "samples": stacks,
+                "weights": [self.interval] * len(stacks),
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": self.frames},
+            "profiles": profiles,
+            "name": name,
+            "exporter": "fast_api_demo.profiling",
+        }
+
+
+def _header(scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value
+    return None
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware that profiles selected requests end to end."""
+
+    def __init__(self, app, token: str = PROFILE_TOKEN, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 paths: Tuple[str, ...] = PROFILE_PATHS, output_dir: str = PROFILE_DIR):
+        self.app = app
+        self.token = token.encode()
+        self.sample_rate = sample_rate
+        self.paths = paths
+        self.output_dir = output_dir
+
+    def should_profile(self, scope) -> bool:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return False
+        if self.token:
+            supplied = _header(scope, TOKEN_HEADER)
+            if supplied is not None and hmac.compare_digest(supplied, self.token):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        if not _profiling.acquire(blocking=False):
+            metrics.inc("profiling.skipped")
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self._profile(scope, receive, send)
+        finally:
+            _profiling.release()
+
+    async def _profile(self, scope, receive, send) -> None:
+        import torch
+
+        profile_id = uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(ID_HEADER, profile_id.encode())]
+            await send(message)
+
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+
+        sampler = StackSampler()
+        profiler = torch.profiler.profile(activities=activities, record_shapes=True)
+        profiler.__enter__()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            profiler.__exit__(None, None, None)
+            metrics.inc("profiling.profiled")
+            await asyncio.to_thread(self._write, profile_id, f"{scope['method']} {scope['path']}", profiler, sampler)
+
+    def _write(self, profile_id: str, name: str, profiler, sampler: StackSampler) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, profile_id)
+        profiler.export_chrome_trace(f"{base}.torch.json")
+        with open(f"{base}.speedscope.json", "w") as f:
+            json.dump(sampler.to_speedscope(name), f)
+        logger.info("Profile %s written for %s → %s.*.json", profile_id, name, base)
@@ -0,0 +1,612 @@
+"""
+Session-affinity front router for running several server.py processes.
+• Conversation state (histories, summaries, prefix cache) lives in one process's memory,
+  so every request that names a session is consistent-hashed on its session_id to one
+  backend: POST /chat, /ws/chat, /chat/history/{id} and chat jobs. Sessions without an
+  id get one here, so their first turn already lands on the right backend.
+• The hash ring places ROUTER_VNODES virtual nodes per backend; a backend joining or
+  leaving only moves the sessions that hash to it (about 1/N of them).
+• Backends are health-checked (GET /health). Sessions of a backend that is down fail
+  over to the next healthy backend on the ring and move back once it recovers; a
+  connection failure also marks the backend down and retries on the next one.
+• GET /jobs/{id} goes to the backend that accepted the job. GET /chat/sessions asks
+  every healthy backend and merges the lists newest first; its keyset cursors mean the
+  same position on every backend. Other requests are spread round-robin.
+• Bodies up to ROUTER_RETRY_BODY are buffered so a failed backend can be retried;
+  larger uploads are streamed through, and a backend failure mid-upload is a 502.
+• GET /_router shows backends and counters. POST/DELETE /_router/backends?url=... adds
+  or removes a backend at runtime; it is disabled unless ROUTER_ADMIN_TOKEN is set, and
+  then requires that token in an `x-router-admin-token` header.
+Run:
+    python router.py --spawn 4                  # 4 local `uvicorn server:app` workers on ports 8101-8104
+    python router.py --backend http://10.0.0.2:8002 --backend http://10.0.0.3:8002
+"""
+
+import argparse
+import asyncio
+import bisect
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import uuid
+from collections import OrderedDict
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, quote, urlencode
+
+import httpx
+
+from metrics import metrics
+from session_index import encode_cursor
+
+logger = logging.getLogger(__name__)
+
+ROUTER_VNODES = int(os.environ.get("ROUTER_VNODES", "128"))  # ring points per backend
+ROUTER_HEALTH_INTERVAL = float(os.environ.get("ROUTER_HEALTH_INTERVAL", "2.0"))  # seconds
+ROUTER_FAIL_THRESHOLD = int(os.environ.get("ROUTER_FAIL_THRESHOLD", "2"))  # failed checks before "down"
+ROUTER_RETRY_BODY = int(os.environ.get("ROUTER_RETRY_BODY", str(1024 * 1024)))  # bytes buffered for retries
+ROUTER_ADMIN_TOKEN = os.environ.get("ROUTER_ADMIN_TOKEN", "")  # empty: membership changes disabled
+ROUTER_JOB_MEMORY = 100_000  # job id → backend entries kept
+
+FORWARDED = {b"x-forwarded-for", b"x-real-ip", b"forwarded"}  # replaced, never passed through from clients
+HOP_BY_HOP = {b"connection", b"keep-alive", b"transfer-encoding", b"upgrade", b"te", b"trailer", b"proxy-connection"}
+SESSIONS_PATH = "/chat/sessions"
+HISTORY_PATH = re.compile(r"^/chat/history/([^/]+)$")
+JOB_PATH = re.compile(r"^/jobs/([0-9a-f]+)(?:/events)?$")
+MULTIPART_SESSION = re.compile(
+    rb'Content-Disposition: form-data; name="session_id"\r\n(?:[^\r\n]+\r\n)*\r\n([^\r\n]*)\r\n', re.IGNORECASE
+)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing of keys onto nodes, with virtual nodes and failover order."""
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = ROUTER_VNODES):
+        self.vnodes = vnodes
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self.nodes: Set[str] = set()
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str) -> None:
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for i in range(self.vnodes):
+            point = _hash(f"{node}#{i}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node: str) -> None:
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        kept = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in kept]
+        self._owners = [o for _, o in kept]
+
+    def candidates(self, key: str) -> List[str]:
+        """Distinct nodes in ring order from `key`'s position: the owner, then its failovers."""
+        if not self._points:
+            return []
+        start = bisect.bisect(self._points, _hash(key))
+        seen: List[str] = []
+        for i in range(len(self._points)):
+            owner = self._owners[(start + i) % len(self._points)]
+            if owner not in seen:
+                seen.append(owner)
+                if len(seen) == len(self.nodes):
+                    break
+        return seen
+
+    def lookup(self, key: str, healthy: Optional[Set[str]] = None) -> Optional[str]:
+        """The first node for `key` that is in `healthy` (any node when None)."""
+        for node in self.candidates(key):
+            if healthy is None or node in healthy:
+                return node
+        return None
+
+
+# ---------- Finding the session of a request ----------
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _query_session(scope) -> Optional[str]:
+    values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("session_id")
+    return values[0] if values and values[0] else None
+
+
+def body_session(scope, body: bytes) -> Optional[str]:
+    """session_id carried in a form (POST /chat) or JSON (POST /jobs) body."""
+    content_type = (_header(scope, b"content-type") or "").lower()
+    if content_type.startswith("multipart/form-data"):
+        match = MULTIPART_SESSION.search(body)
+        return match.group(1).decode() if match and match.group(1) else None
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        values = parse_qs(body.decode("latin-1")).get("session_id")
+        return values[0] if values and values[0] else None
+    if content_type.startswith("application/json"):
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return None
+        return payload.get("session_id") if isinstance(payload, dict) else None
+    return None
+
+
+def add_body_session(scope, body: bytes, session_id: str, complete: bool = True) -> Optional[bytes]:
+    """`body` with a session_id field added, or None if it can't carry one.
+
+    Form fields are added in front, so this also works on the first bytes of a
+    streamed (`complete=False`) body; JSON needs the whole body.
+    """
+    content_type = _header(scope, b"content-type") or ""
+    if content_type.lower().startswith("multipart/form-data"):
+        boundary = re.search(r'boundary="?([^";]+)"?', content_type)
+        if boundary is None or not body.startswith(b"--" + boundary.group(1).encode()):
+            return None
+        part = (
+            b"--" + boundary.group(1).encode() + b'\r\nContent-Disposition: form-data; name="session_id"\r\n\r\n'
+            + session_id.encode() + b"\r\n"
+        )
+        return part + body
+    if content_type.lower().startswith("application/x-www-form-urlencoded"):
+        return urlencode({"session_id": session_id}).encode() + (b"&" + body if body else b"")
+    if content_type.lower().startswith("application/json") and complete:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return None
+        if not isinstance(payload, dict) or payload.get("type") != "chat":
+            return None
+        payload["session_id"] = session_id
+        return json.dumps(payload).encode()
+    return None
+
+
+class ClientDisconnected(Exception):
+    """The client went away while its body was being streamed to a backend."""
+
+
+class Backend:
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.healthy = True  # optimistic until the first check says otherwise
+        self.failures = 0
+        self.requests = 0
+
+    def public(self) -> Dict[str, object]:
+        return {"url": self.url, "healthy": self.healthy, "failures": self.failures, "requests": self.requests}
+
+
+class SessionRouter:
+    """ASGI app that proxies HTTP and WebSocket traffic to backends with session affinity."""
+
+    def __init__(
+        self,
+        backends: Iterable[str],
+        vnodes: int = ROUTER_VNODES,
+        health_interval: float = ROUTER_HEALTH_INTERVAL,
+        fail_threshold: int = ROUTER_FAIL_THRESHOLD,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        admin_token: str = ROUTER_ADMIN_TOKEN,
+        retry_body: int = ROUTER_RETRY_BODY,
+    ):
+        self.admin_token = admin_token
+        self.retry_body = retry_body
+        self.backends: Dict[str, Backend] = {}
+        self.ring = HashRing(vnodes=vnodes)
+        self.health_interval = health_interval
+        self.fail_threshold = fail_threshold
+        self.client = httpx.AsyncClient(transport=transport, timeout=httpx.Timeout(None, connect=5.0))
+        self._jobs: "OrderedDict[str, str]" = OrderedDict()
+        self._round_robin = itertools.count()
+        self._health_task: Optional[asyncio.Task] = None
+        for url in backends:
+            self.add_backend(url)
+        metrics.gauge("router.backends.healthy", lambda: len(self.healthy()))
+
+    # ----- membership and health -----
+    def add_backend(self, url: str) -> None:
+        backend = Backend(url)
+        self.backends.setdefault(backend.url, backend)
+        self.ring.add(backend.url)
+
+    def remove_backend(self, url: str) -> None:
+        url = url.rstrip("/")
+        self.backends.pop(url, None)
+        self.ring.remove(url)
+
+    def healthy(self) -> Set[str]:
+        return {url for url, backend in self.backends.items() if backend.healthy}
+
+    def _mark(self, url: str, ok: bool, immediately: bool = False) -> None:
+        backend = self.backends.get(url)
+        if backend is None:
+            return
+        if ok:
+            if not backend.healthy:
+                logger.info("Backend %s is back up", url)
+            backend.healthy, backend.failures = True, 0
+            return
+        backend.failures += 1
+        if backend.healthy and (immediately or backend.failures >= self.fail_threshold):
+            backend.healthy = False
+            metrics.inc("router.backend_down")
+            logger.warning("Backend %s is down; its sessions fail over", url)
+
+    async def check_health(self) -> None:
+        async def check(url: str) -> None:
+            try:
+                response = await self.client.get(f"{url}/health", timeout=self.health_interval)
+                self._mark(url, response.status_code == 200)
+            except httpx.HTTPError:
+                self._mark(url, False)
+
+        await asyncio.gather(*(check(url) for url in list(self.backends)))
+
+    async def _health_loop(self) -> None:
+        while True:
+            await self.check_health()
+            await asyncio.sleep(self.health_interval)
+
+    # ----- picking a backend -----
+    def route(self, session_id: Optional[str], exclude: Set[str] = frozenset()) -> Optional[str]:
+        healthy = self.healthy() - exclude
+        if session_id is not None:
+            backend = self.ring.lookup(session_id, healthy)
+            if backend is not None and backend != self.ring.lookup(session_id):
+                metrics.inc("router.failovers")
+            return backend
+        if not healthy:
+            return None
+        ordered = sorted(healthy)
+        return ordered[next(self._round_robin) % len(ordered)]
+
+    def _count_request(self, backend: str) -> None:
+        if backend in self.backends:
+            self.backends[backend].requests += 1
+        metrics.inc("router.requests")
+
+    def _remember_job(self, job_id: str, backend: str) -> None:
+        self._jobs[job_id] = backend
+        if len(self._jobs) > ROUTER_JOB_MEMORY:
+            self._jobs.popitem(last=False)
+
+    # ----- ASGI -----
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "websocket":
+            await self._websocket(scope, receive, send)
+        elif scope["path"] == "/_router" or scope["path"].startswith("/_router/"):
+            await self._admin(scope, receive, send)
+        else:
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._health_task = asyncio.create_task(self._health_loop())
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._health_task is not None:
+                    self._health_task.cancel()
+                await self.client.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _respond(self, send, status: int, payload) -> None:
+        body = json.dumps(payload).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def _admin(self, scope, receive, send) -> None:
+        url = (parse_qs(scope.get("query_string", b"").decode()).get("url") or [None])[0]
+        if scope["path"] == "/_router/backends" and url and scope["method"] in ("POST", "DELETE"):
+            # Membership decides where sessions go: never let an anonymous client change it
+            token = _header(scope, b"x-router-admin-token") or ""
+            if not self.admin_token or not hmac.compare_digest(token.encode(), self.admin_token.encode()):
+                metrics.inc("router.admin_rejected")
+                await self._respond(send, 403, {"detail": "Backend changes need ROUTER_ADMIN_TOKEN."})
+                return
+            (self.add_backend if scope["method"] == "POST" else self.remove_backend)(url)
+        elif scope["path"] != "/_router" or scope["method"] != "GET":
+            await self._respond(send, 404, {"detail": "Not Found"})
+            return
+        await self._respond(send, 200, {
+            "backends": [backend.public() for backend in self.backends.values()],
+            "vnodes": self.ring.vnodes,
+            "metrics": {k: v for k, v in metrics.snapshot().items() if k.startswith("router.")},
+        })
+
+    async def _read_prefix(self, receive) -> Tuple[Optional[bytes], bool]:
+        """(the body, or its first `retry_body` bytes; whether that is all of it). None if the client left."""
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None, True
+            chunk = message.get("body", b"")
+            chunks.append(chunk)
+            size += len(chunk)
+            if not message.get("more_body", False):
+                return b"".join(chunks), True
+            if size >= self.retry_body:
+                return b"".join(chunks), False
+
+    @staticmethod
+    async def _stream_body(prefix: bytes, receive):
+        yield prefix
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise ClientDisconnected()
+            yield message.get("body", b"")
+            if not message.get("more_body", False):
+                return
+
+    def _session_of(self, scope, body: bytes, complete: bool = True) -> Tuple[Optional[str], bytes]:
+        """(session_id to route on, body to forward); mints ids for new chat sessions.
+
+        For streamed bodies only the first `retry_body` bytes are searched, so clients
+        uploading large files should send session_id before them (the web UI does).
+        """
+        path, method = scope["path"], scope["method"]
+        match = HISTORY_PATH.match(path)
+        if match:
+            return match.group(1), body
+        session_id = _query_session(scope) or _header(scope, b"x-session-id")
+        if session_id is None and method == "POST" and path in ("/chat", "/jobs"):
+            session_id = body_session(scope, body)
+            if session_id is None:
+                minted = str(uuid.uuid4())
+                rewritten = add_body_session(scope, body, minted, complete)
+                if rewritten is not None:
+                    return minted, rewritten
+        return session_id, body
+
+    async def _http(self, scope, receive, send) -> None:
+        body, complete = await self._read_prefix(receive)
+        if body is None:
+            return
+        session_id, forwarded = self._session_of(scope, body, complete)
+        job = JOB_PATH.match(scope["path"])
+        pinned = self._jobs.get(job.group(1)) if job else None
+
+        submits_job = scope["method"] == "POST" and scope["path"] == "/jobs"
+        lists_sessions = scope["method"] == "GET" and scope["path"] == SESSIONS_PATH and session_id is None
+        dropped = {b"host"} | ({b"accept-encoding"} if submits_job or lists_sessions else set())
+        if complete or forwarded is not body:
+            dropped.add(b"content-length")  # httpx sets it, or the streamed body was rewritten
+        body = forwarded
+        headers = [(k, v) for k, v in scope["headers"] if k not in HOP_BY_HOP and k not in FORWARDED and k not in dropped]
+        if scope.get("client"):
+            # Our peer is the only address we can vouch for; a client-sent header would be spoofable
+            headers.append((b"x-forwarded-for", scope["client"][0].encode()))
+        path = (scope.get("raw_path") or quote(scope["path"]).encode()).decode("latin-1")
+        if scope.get("query_string"):
+            path += "?" + scope["query_string"].decode("latin-1")
+        if lists_sessions:
+            await self._list_sessions(scope, send, headers, path)
+            return
+        if not complete:
+            metrics.inc("router.streamed_bodies")
+
+        tried: Set[str] = set()
+        while True:
+            backend = pinned if pinned is not None and pinned not in tried else self.route(session_id, tried)
+            if backend is None:
+                await self._respond(send, 503, {"detail": "No healthy backend available."})
+                return
+            tried.add(backend)
+            content = body if complete else self._stream_body(body, receive)
+            request = self.client.build_request(scope["method"], backend + path, headers=headers, content=content)
+            try:
+                response = await self.client.send(request, stream=True)
+            except ClientDisconnected:
+                return
+            except httpx.TransportError as e:
+                self._mark(backend, False, immediately=True)
+                if not complete:  # part of the upload is gone; it can't be replayed
+                    logger.warning("Backend %s failed (%s) during a streamed upload", backend, type(e).__name__)
+                    await self._respond(send, 502, {"detail": "Backend failed while receiving the request."})
+                    return
+                logger.warning("Backend %s failed (%s); retrying elsewhere", backend, type(e).__name__)
+                metrics.inc("router.retries")
+                continue
+            break
+
+        self._count_request(backend)
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": [(k, v) for k, v in response.headers.raw if k.lower() not in HOP_BY_HOP],
+            })
+            if submits_job and response.status_code == 202:
+                # Remember where the job lives so GET /jobs/{id} finds it
+                content = await response.aread()
+                self._remember_job(json.loads(content)["id"], backend)
+                await send({"type": "http.response.body", "body": content})
+                return
+            # Raw bytes: compressed responses pass through with their Content-Encoding
+            async for chunk in response.aiter_raw():
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            await response.aclose()
+
+    async def _list_sessions(self, scope, send, headers, path: str) -> None:
+        """GET /chat/sessions from every healthy backend, merged newest first."""
+
+        async def fetch(backend: str) -> Optional[httpx.Response]:
+            try:
+                response = await self.client.get(backend + path, headers=headers)
+            except httpx.TransportError:
+                self._mark(backend, False, immediately=True)
+                return None
+            self._count_request(backend)
+            return response
+
+        responses = [r for r in await asyncio.gather(*(fetch(b) for b in sorted(self.healthy()))) if r is not None]
+        if not responses:
+            await self._respond(send, 503, {"detail": "No healthy backend available."})
+            return
+        failed = next((r for r in responses if r.status_code != 200), None)
+        if failed is not None:  # e.g. 400 for a bad cursor: the same on every backend
+            await self._respond(send, failed.status_code, failed.json())
+            return
+
+        def newest_first(sessions):
+            return sorted(sessions, key=lambda s: (s.get("last_updated") or "", s["session_id"]), reverse=True)
+
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        if (query.get("format") or [""])[0] == "ndjson":
+            lines = [json.loads(line) for r in responses for line in r.text.splitlines() if line]
+            body = "".join(json.dumps(line) + "\n" for line in newest_first(lines)).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/x-ndjson"), (b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        pages = [r.json() for r in responses]
+        merged = {"active_sessions": newest_first(chain.from_iterable(p["active_sessions"] for p in pages))}
+        merged["total_sessions"] = sum(p["total_sessions"] for p in pages)
+        if any("next_cursor" in p for p in pages):
+            # Each backend returned its newest `limit` after the cursor, so the merged
+            # newest `limit` are exact; the last one is where every backend resumes
+            limit = max(1, int((query.get("limit") or ["100"])[0]))
+            limit = min([limit] + [len(p["active_sessions"]) for p in pages if p.get("next_cursor")])
+            more = len(merged["active_sessions"]) > limit or any(p.get("next_cursor") for p in pages)
+            merged["active_sessions"] = merged["active_sessions"][:limit]
+            last = merged["active_sessions"][-1] if merged["active_sessions"] else None
+            merged["next_cursor"] = encode_cursor([last["last_updated"], last["session_id"]]) if more and last else None
+        await self._respond(send, 200, merged)
+
+    async def _websocket(self, scope, receive, send) -> None:
+        try:
+            import websockets  # installed with uvicorn[standard]
+        except ImportError:
+            await receive()
+            await send({"type": "websocket.close", "code": 1011})
+            return
+
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        session_id = _query_session(scope) or str(uuid.uuid4())
+        query["session_id"] = [session_id]
+        backend = self.route(session_id)
+        await receive()  # websocket.connect
+        if backend is None:
+            await send({"type": "websocket.close", "code": 1013})  # try again later
+            return
+        url = "ws" + backend[4:] + scope["path"] + "?" + urlencode(query, doseq=True)
+        forwarded = {"x-forwarded-for": scope["client"][0]} if scope.get("client") else {}
+        try:
+            try:
+                upstream = await websockets.connect(url, max_size=None, additional_headers=forwarded)
+            except TypeError:  # websockets < 14
+                upstream = await websockets.connect(url, max_size=None, extra_headers=forwarded)
+        except (OSError, websockets.exceptions.WebSocketException):
+            self._mark(backend, False, immediately=True)
+            await send({"type": "websocket.close", "code": 1013})
+            return
+        await send({"type": "websocket.accept"})
+        self._count_request(backend)
+
+        async def client_to_backend():
+            while True:
+                message = await receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                await upstream.send(message["text"] if message.get("text") is not None else message["bytes"])
+
+        async def backend_to_client():
+            async for data in upstream:
+                key = "text" if isinstance(data, str) else "bytes"
+                await send({"type": "websocket.send", key: data})
+            await send({"type": "websocket.close", "code": upstream.close_code or 1000})
+
+        tasks = [asyncio.create_task(client_to_backend()), asyncio.create_task(backend_to_client())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await upstream.close()
+
+
+# ---------- Local worker processes ----------
+def spawn_workers(count: int, app: str, base_port: int, host: str = "127.0.0.1") -> List[Tuple[str, subprocess.Popen]]:
+    """Start `count` uvicorn processes serving `app`; each keeps its own job DB and index files.
+
+    Workers trust X-Forwarded-For from `host` (the router), so per-client rate limits
+    see the real client instead of the router's address.
+    """
+    workers = []
+    for i in range(count):
+        port = base_port + i
+        env = dict(os.environ, JOBS_DB=f"jobs.{port}.sqlite3", TRUSTED_PROXIES=host)
+        if os.environ.get("VECTOR_INDEX_DIR"):
+            env["VECTOR_INDEX_DIR"] = f"{os.environ['VECTOR_INDEX_DIR'].rstrip(os.sep)}.{port}"
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", app, "--host", host, "--port", str(port)], env=env
+        )
+        workers.append((f"http://{host}:{port}", process))
+    return workers
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Session-affinity router in front of several chat servers")
+    parser.add_argument("--backend", action="append", default=[], help="backend base URL (repeatable)")
+    parser.add_argument("--spawn", type=int, default=0, help="start this many local worker processes")
+    parser.add_argument("--app", default="server:app", help="ASGI app for spawned workers")
+    parser.add_argument("--worker-port", type=int, default=8101, help="first port for spawned workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8002)
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    logging.basicConfig(level=logging.INFO)
+    workers = spawn_workers(args.spawn, args.app, args.worker_port) if args.spawn else []
+    backends = args.backend + [url for url, _ in workers]
+    if not backends:
+        parser.error("give at least one --backend or --spawn N")
+    try:
+        print(f"Routing sessions over {len(backends)} backend(s): {', '.join(backends)}")
+        uvicorn.run(SessionRouter(backends), host=args.host, port=args.port)
+    finally:
+        for _, process in workers:
+            process.terminate()
+        for _, process in workers:
+            process.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Sentiment for texts longer than the classifier's maximum input length.
+• Each text is tokenized once and split into overlapping windows that fit the model
+  (SENTIMENT_WINDOW_OVERLAP tokens shared by neighbours), so nothing is truncated away.
+• The windows of every text in a call are sorted by length and scored together in
+  batches of SENTIMENT_BATCH_SIZE: a multi-thousand-token document costs a few
+  forward passes, not one per window, and padding stays small.
+• Window probabilities are averaged, weighted by the tokens each window adds, into a
+  document-level label and score; per-window scores are returned on request.
+A text that fits in one window scores exactly as the plain pipeline would.
+"""
+
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from metrics import metrics
+
+SENTIMENT_WINDOW_OVERLAP = int(os.environ.get("SENTIMENT_WINDOW_OVERLAP", "64"))  # tokens
+SENTIMENT_BATCH_SIZE = int(os.environ.get("SENTIMENT_BATCH_SIZE", "32"))  # windows per forward pass
+DEFAULT_MAX_TOKENS = 512  # when the tokenizer doesn't say
+
+
+def split_windows(length: int, size: int, overlap: int) -> List[Tuple[int, int]]:
+    """(start, end) token spans of at most `size` covering `length` tokens, overlapping by `overlap`."""
+    if length <= size:
+        return [(0, length)]
+    step = max(1, size - overlap)
+    spans, start = [], 0
+    while True:
+        end = min(start + size, length)
+        spans.append((start, end))
+        if end == length:
+            return spans
+        start += step
+
+
+def combine(probs: np.ndarray, spans: Sequence[Tuple[int, int]], labels: Sequence[str]) -> Dict[str, Any]:
+    """Document label/score from per-window probabilities, weighted by each window's new tokens."""
+    weights = np.array(
+        [max(1, end - max(start, spans[i - 1][1] if i else start)) for i, (start, end) in enumerate(spans)],
+        dtype=np.float64,
+    )
+    mean = (probs * weights[:, None]).sum(axis=0) / weights.sum()
+    best = int(mean.argmax())
+    return {"label": labels[best], "score": float(mean[best])}
+
+
+class WindowedSentiment:
+    """Sliding-window, batched scoring with a sequence-classification model and its tokenizer."""
+
+    def __init__(self, model, tokenizer, overlap: int = SENTIMENT_WINDOW_OVERLAP, batch_size: int = SENTIMENT_BATCH_SIZE):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+        max_length = tokenizer.model_max_length
+        if not max_length or max_length > 100_000:  # "no limit" sentinel
+            max_length = getattr(model.config, "max_position_embeddings", DEFAULT_MAX_TOKENS)
+        self.window = max_length - tokenizer.num_special_tokens_to_add(pair=False)
+        self.overlap = min(overlap, self.window // 2)
+        self.labels = [model.config.id2label[i] for i in range(model.config.num_labels)]
+
+    @classmethod
+    def from_pipeline(cls, pipe) -> Optional["WindowedSentiment"]:
+        """Wrap a transformers text-classification pipeline, or None if it has no model/tokenizer."""
+        model, tokenizer = getattr(pipe, "model", None), getattr(pipe, "tokenizer", None)
+        if model is None or tokenizer is None:
+            return None
+        return cls(model, tokenizer)
+
+    def _score(self, windows: List[List[int]]) -> np.ndarray:
+        import torch
+
+        inputs = self.tokenizer.pad(
+            {"input_ids": [self.tokenizer.build_inputs_with_special_tokens(ids) for ids in windows]},
+            return_tensors="pt",
+        )
+        with torch.no_grad():
+            logits = self.model(**{k: v.to(self.model.device) for k, v in inputs.items()}).logits
+        return torch.softmax(logits.float(), dim=-1).cpu().numpy()
+
+    def analyze(self, texts: List[str], detail: bool = False) -> List[Dict[str, Any]]:
+        """Score each text; returns {"sentiment", "windows", "tokens"[, "window_scores"]} per text (blocking)."""
+        token_ids = self.tokenizer(texts, add_special_tokens=False)["input_ids"]
+        spans = [split_windows(len(ids), self.window, self.overlap) for ids in token_ids]
+        windows = [(doc, start, end) for doc, doc_spans in enumerate(spans) for start, end in doc_spans]
+
+        # Similar lengths share a batch, so little compute goes to padding
+        order = sorted(range(len(windows)), key=lambda i: windows[i][2] - windows[i][1])
+        probs = np.empty((len(windows), len(self.labels)), dtype=np.float32)
+        for i in range(0, len(order), self.batch_size):
+            batch = order[i : i + self.batch_size]
+            probs[batch] = self._score([token_ids[doc][start:end] for doc, start, end in (windows[j] for j in batch)])
+        metrics.inc("sentiment.windows", len(windows))
+        metrics.inc("sentiment.forward_passes", -(-len(windows) // self.batch_size))
+
+        results, offset = [], 0
+        for doc, doc_spans in enumerate(spans):
+            doc_probs = probs[offset : offset + len(doc_spans)]
+            offset += len(doc_spans)
+            result = {
+                "sentiment": combine(doc_probs, doc_spans, self.labels),
+                "windows": len(doc_spans),
+                "tokens": len(token_ids[doc]),
+            }
+            if detail:
+                result["window_scores"] = [
+                    {"start_token": start, "end_token": end, "label": self.labels[int(p.argmax())], "score": float(p.max())}
+                    for (start, end), p in zip(doc_spans, doc_probs)
+                ]
+            results.append(result)
+        return results
@@ -9,85 +9,188 @@ Open:
     http://localhost:8000/docs   ← interactive Swagger UI
 """
 
-from fastapi import FastAPI, UploadFile, HTTPException, Form
-from fastapi.responses import JSONResponse, HTMLResponse
-from fastapi.staticfiles import StaticFiles
+import time
+
+STARTUP_BEGAN = time.perf_counter()  # cold-start timing includes the heavy imports below
+
+from fastapi import FastAPI, UploadFile, HTTPException, Form, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, StreamingResponse
+from pydantic import BaseModel
+import numpy as np
 import torch
-from torchvision import models, transforms
 from PIL import Image
+import asyncio
+import base64
+import binascii
+import contextlib
+import copy
+import hashlib
 import io
 import json
-import urllib.request
 import os
 import logging
-from typing import List, Dict, Any, Optional
+import queue
+import threading
+from typing import List, Dict, Any, AsyncIterator, Iterator, Literal, Optional, Tuple, Union
 from datetime import datetime
 import uuid
 
-logging.basicConfig(level=logging.INFO)
+from admission import AdmissionRejected, FairAdmission
+from bundle import ModelBundle
+from chat_images import TIERS, ImageTier, fit_image, get_tier
+from classifier import INPUT_SIZE, classify_tensors, load_labels, load_resnet18, normalize, preprocess, top1
+from degradation import (
+    DEGRADE_PREDICTED_WAIT,
+    DEGRADE_QUEUE_DEPTH,
+    DEGRADE_SENTIMENT_INFLIGHT,
+    KEYWORD_SENTIMENT_MODEL,
+    RULE_BASED_CHAT_MODEL,
+    DegradationPolicy,
+    keyword_sentiment,
+    rule_based_chat_response,
+)
+from http_encoding import CompressionMiddleware, JSONResponse, dumps as json_dumps
+from metrics import metrics
+from prefix_cache import PrefixCache
+from profiling import ProfilingMiddleware, profiling_enabled
+from sentiment import WindowedSentiment
+from session_index import SessionIndex, decode_cursor, encode_cursor
+from singleflight import SingleFlight
+from summarizer import CHAT_SUMMARIZE, ConversationSummarizer, transcript
+from static_assets import StaticAssetStore
+from logging_setup import log_request, setup_logging
+from jobs import JOB_MAX_BYTES, TERMINAL, Job, JobStore, JobWorkerPool, RetryLater
+from vector_index import VectorIndex
+from uploads import (
+    MAX_UPLOAD_BYTES,
+    UploadLimitMiddleware,
+    open_image,
+    parse_npy,
+    read_body,
+    read_image_stream,
+    read_image_upload,
+    sniff_image_header,
+    spool_image_stream,
+    spool_image_upload,
+)
+
+# Records are queued and written by a background thread (see logging_setup.py)
+setup_logging()
 logger = logging.getLogger(__name__)
 
+# Boot from a prepared offline bundle (see bundle.py) instead of the network when set
+MODEL_BUNDLE = os.environ.get("MODEL_BUNDLE")
+BUNDLE_TORCHSCRIPT = os.environ.get("BUNDLE_TORCHSCRIPT", "0") == "1"
+CHAT_WARMUP = os.environ.get("CHAT_WARMUP", "1") == "1"
+if MODEL_BUNDLE:
+    # Must be set before transformers is imported; any attempted download then fails fast
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+startup_timings: Dict[str, float] = {}
+
 # We are using transformers for future extensions, e.g., sentiment analysis
 from transformers import (
+    StoppingCriteria,
+    StoppingCriteriaList,
     pipeline,
 )  # Using pipeline for image-text-to-text tasks
 
 
-app = FastAPI(title="Minimal FastAPI Image Classifier")
+app = FastAPI(title="Minimal FastAPI Image Classifier", default_response_class=JSONResponse)
+
+# orjson-encoded responses, brotli/gzip-compressed above COMPRESS_MIN_SIZE bytes
+app.add_middleware(CompressionMiddleware)
+
+# Reject oversized upload bodies before multipart parsing (see uploads.py)
+app.add_middleware(UploadLimitMiddleware, paths=("/predict", "/chat", "/embed", "/similar", "/sentiment_analysis"))
+app.add_middleware(UploadLimitMiddleware, max_body=JOB_MAX_BYTES, paths=("/jobs",))
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Frontend assets are loaded and pre-compressed once (see static_assets.py)
+static_assets = StaticAssetStore("static")
+
+# Opt-in per-request profiling (see profiling.py); not installed unless configured
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware)
 
 # ---------- 1. Load model & labels ----------
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+startup_timings["imports"] = time.perf_counter() - STARTUP_BEGAN
+bundle = ModelBundle(MODEL_BUNDLE) if MODEL_BUNDLE else None
+if bundle is not None:
+    logger.info("Loading models from bundle %s (%s)", bundle.version, bundle.path)
 
 
-print(f"Using device: {device}")
-# Load a pretrained ResNet-18 model
-model = models.resnet18(weights=models.ResNet18_Weights.IMAGENET1K_V1)
-model.eval().to(device)
+logger.info("Using device: %s", device)
+phase_began = time.perf_counter()
+# Load a pretrained ResNet-18 model (see classifier.py)
+model = load_resnet18(device, bundle, prefer_torchscript=BUNDLE_TORCHSCRIPT)
+startup_timings["resnet18"] = time.perf_counter() - phase_began
 
+phase_began = time.perf_counter()
 sentiment_analyzer = pipeline(
-    "sentiment-analysis", device=0 if torch.cuda.is_available() else -1
+    "sentiment-analysis",
+    model=bundle.sentiment_dir if bundle is not None else None,
+    device=0 if torch.cuda.is_available() else -1,
 )
+# Long texts are scored as batched, overlapping windows instead of truncated (see sentiment.py)
+sentiment_windows = WindowedSentiment.from_pipeline(sentiment_analyzer)
+startup_timings["sentiment"] = time.perf_counter() - phase_began
 
 # Initialize chat capabilities
-print("Initializing chat models...")
+logger.info("Initializing chat models...")
 
 # Initialize chat model using transformers pipeline
 chat_bot = None
+chat_model_source = "HuggingFaceTB/SmolVLM-Instruct"
+if bundle is not None:
+    chat_model_source = bundle.chat_dir  # None when the bundle was prepared with --skip-chat
 
+phase_began = time.perf_counter()
 try:
+    if chat_model_source is None:
+        raise FileNotFoundError(f"bundle {bundle.version} has no chat model")
     # Use image-text-to-text pipeline for SmolVLM
     chat_bot = pipeline(
         "image-text-to-text",
-        model="HuggingFaceTB/SmolVLM-Instruct",
+        model=chat_model_source,
         device=0 if torch.cuda.is_available() else -1,
         torch_dtype=torch.float16,
     )
-    print(f"✓ SmolVLM-Instruct loaded successfully for chat using pipeline. Running on {device}.")
+    logger.info("✓ SmolVLM-Instruct loaded successfully for chat using pipeline. Running on %s.", device)
 except Exception as e:
-    print(f"✗ Warning: Could not load SmolVLM-Instruct: {e}")
+    logger.warning("✗ Could not load SmolVLM-Instruct: %s", e)
     chat_bot = None
+startup_timings["chat"] = time.perf_counter() - phase_began
 
 # Ensure the chat model is ready
-if chat_bot is not None:
+phase_began = time.perf_counter()
+if chat_bot is not None and CHAT_WARMUP:
     try:
         # Test the chat model with a simple prompt
         test_messages = [
             {"role": "user", "content": [{"type": "text", "text": "Hello, how are you?"}]}
         ]
         test_response = chat_bot(text=test_messages, max_new_tokens=50, return_full_text=False)
-        print(f"Chat model initialized successfully: {test_response}")
+        logger.info("Chat model initialized successfully", extra={"fields": {"warmup_response": test_response}})
     except Exception as e:
-        print(f"Error during chat model initialization: {e}")
+        logger.error("Error during chat model initialization: %s", e)
+startup_timings["chat_warmup"] = time.perf_counter() - phase_began
 
-print("Chat initialization complete")
+logger.info("Chat initialization complete")
 
 # ---------- Conversation History Management ----------
 # In-memory storage for conversation histories
 # In production, you'd want to use a database like Redis or PostgreSQL
 conversation_histories: Dict[str, List[Dict[str, Any]]] = {}
+# Sessions ordered by last update, for paginated listing (see session_index.py)
+session_index = SessionIndex()
+# Most recent messages sent to the model per turn; with CHAT_SUMMARIZE=1 older turns are
+# folded into a summary in the background and the history itself can keep many more
+CHAT_PROMPT_MAX_MESSAGES = 20
+CHAT_HISTORY_LIMIT = int(os.environ.get("CHAT_HISTORY_LIMIT", "200" if CHAT_SUMMARIZE else "20"))
+summarizer: Optional[ConversationSummarizer] = None  # set up next to chat_admission
+# Optional fixed system message sent first on every turn (shared by all sessions' prefix cache)
+CHAT_SYSTEM_PROMPT = os.environ.get("CHAT_SYSTEM_PROMPT")
 
 def get_or_create_conversation_history(session_id: str) -> List[Dict[str, Any]]:
     """Get existing conversation history or create a new one."""
@@ -98,19 +201,27 @@ def get_or_create_conversation_history(session_id: str) -> List[Dict[str, Any]]:
 def add_to_conversation_history(session_id: str, role: str, content: List[Dict[str, Any]]) -> None:
     """Add a message to the conversation history."""
     history = get_or_create_conversation_history(session_id)
+    timestamp = datetime.now().isoformat()
     history.append({
         "role": role,
         "content": content,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": timestamp
     })
+    session_index.touch(session_id, timestamp)
     
-    # Limit history to last 10 exchanges (20 messages) to prevent memory issues
-    if len(history) > 20:
-        history[:] = history[-20:]
+    # Limit history to prevent memory issues (10 exchanges, or more when old turns get summarized)
+    if len(history) > CHAT_HISTORY_LIMIT:
+        history[:] = history[-CHAT_HISTORY_LIMIT:]
 
 def clean_conversation_history(session_id: str) -> List[Dict[str, Any]]:
-    """Clean conversation history to ensure only one image is kept."""
+    """Clean conversation history to ensure only one image is kept.
+
+    Turns already folded into the session summary are replaced by that summary.
+    """
     history = get_or_create_conversation_history(session_id)
+    if summarizer is not None:
+        history = [m for m in history if not m.get("summarized")]
+    history = history[-CHAT_PROMPT_MAX_MESSAGES:]
     
     # Find the most recent message with an image
     last_image_index = -1
@@ -142,40 +253,154 @@ def clean_conversation_history(session_id: str) -> List[Dict[str, Any]]:
         # Only add the message if it has content
         if cleaned_message["content"]:
             cleaned_history.append(cleaned_message)
-    
+
+    summary = summarizer.system_message(session_id) if summarizer is not None else None
+    if summary is not None:
+        cleaned_history.insert(0, summary)
+    if CHAT_SYSTEM_PROMPT:
+        cleaned_history.insert(0, {"role": "system", "content": [{"type": "text", "text": CHAT_SYSTEM_PROMPT}]})
     return cleaned_history
 
 # Download ImageNet labels (only once)
-LABELS_PATH = "imagenet_classes.txt"
-if not os.path.exists(LABELS_PATH):
-    urllib.request.urlretrieve(
-        "https://raw.githubusercontent.com/pytorch/hub/master/imagenet_classes.txt",
-        "imagenet_classes.txt",
-    )
+LABELS_PATH = os.environ.get("LABELS_PATH", bundle.labels_path if bundle is not None else "imagenet_classes.txt")
+LABELS = load_labels(LABELS_PATH)
 
-# Read labels into a list
-with open("imagenet_classes.txt") as f:
-    LABELS = [line.strip() for line in f.readlines()]
+startup_timings["total"] = time.perf_counter() - STARTUP_BEGAN
+for phase, seconds in startup_timings.items():
+    metrics.set(f"startup.{phase}.seconds", round(seconds, 3))
+logger.info(
+    "Cold start: %.2f s (%s)",
+    startup_timings["total"],
+    ", ".join(f"{k} {v:.2f} s" for k, v in startup_timings.items() if k != "total"),
+)
 
 # ---------- 2. Pre-processing pipeline ----------
-preprocess = transforms.Compose(
-    [
-        transforms.Resize(256),
-        transforms.CenterCrop(224),
-        transforms.ToTensor(),
-        transforms.Normalize(
-            mean=[0.485, 0.456, 0.406],  # ImageNet means
-            std=[0.229, 0.224, 0.225],  # ImageNet stds
-        ),
-    ]
+# INPUT_SIZE, normalize and preprocess are shared with bulk_classify.py (see classifier.py)
+
+# Pre-decoded /predict inputs: 224x224x3 uint8 (HWC, RGB), already resized and cropped
+RAW_IMAGE_TYPES = ("application/octet-stream", "image/jpeg", "image/png")
+NPY_TYPE = "application/x-npy"
+RGB24_TYPE = "application/x-rgb24"
+TENSOR_BYTES = INPUT_SIZE * INPUT_SIZE * 3
+
+
+def tensor_from_uint8_hwc(payload) -> torch.Tensor:
+    """Normalize a 224x224x3 uint8 buffer exactly like `preprocess` does after cropping."""
+    pixels = torch.frombuffer(bytearray(payload), dtype=torch.uint8).view(INPUT_SIZE, INPUT_SIZE, 3)
+    return normalize(pixels.permute(2, 0, 1).float().div_(255))
+
+
+# Everything but the final fc layer: 512-d pooled features used as an image embedding.
+# Unavailable for a frozen TorchScript model (BUNDLE_TORCHSCRIPT=1), which has no submodules.
+EMBEDDING_DIM = 512
+embedding_backbone = (
+    torch.nn.Sequential(*list(model.children())[:-1]) if isinstance(getattr(model, "fc", None), torch.nn.Linear) else None
 )
 
 
+def classify_and_embed(tensor: torch.Tensor) -> Tuple[str, float, Optional[np.ndarray]]:
+    """One ResNet-18 forward pass; return (label, confidence, embedding or None)."""
+    batch = tensor.unsqueeze(0).to(device)
+    with torch.no_grad():
+        if embedding_backbone is None:
+            outputs, features = model(batch), None
+        else:
+            features = torch.flatten(embedding_backbone(batch), 1)
+            outputs = model.fc(features)
+    label, confidence = top1(outputs, LABELS)[0]
+    embedding = features[0].cpu().numpy() if features is not None else None
+    return label, confidence, embedding
+
+
+def classify(tensor: torch.Tensor) -> Tuple[str, float]:
+    """Run ResNet-18 on one normalized 3x224x224 tensor; return (label, confidence)."""
+    return classify_tensors(model, [tensor], LABELS, device)[0]
+
+
+def classify_batch(tensors: List[torch.Tensor]) -> List[Tuple[str, float]]:
+    """`classify` for several tensors in one forward pass."""
+    return classify_tensors(model, tensors, LABELS, device)
+
+
+# ---------- Vector indexes (see vector_index.py) ----------
+# Near-duplicate /predict cache keyed by a 16x16 RGB thumbnail (no forward pass needed),
+# and a k-NN index of ResNet-18 embeddings for /similar.
+THUMBNAIL_SIZE = 16
+# Opt-in: a near-duplicate gets another image's label, so this trades exactness for speed
+PREDICT_DEDUP_THRESHOLD = float(os.environ.get("PREDICT_DEDUP_THRESHOLD", "0"))  # e.g. 0.995; <= 0 disables
+VECTOR_INDEX_DIR = os.environ.get("VECTOR_INDEX_DIR")  # persisted on shutdown, memory-mapped on startup
+VECTOR_INDEX_MODE = os.environ.get("VECTOR_INDEX_MODE", "flat")  # flat | ivf | ivfpq
+VECTOR_INDEX_MAX_SIZE = int(os.environ.get("VECTOR_INDEX_MAX_SIZE", "100000"))
+
+
+def open_vector_index(name: str, dim: int) -> VectorIndex:
+    path = os.path.join(VECTOR_INDEX_DIR, name) if VECTOR_INDEX_DIR else None
+    if path and os.path.exists(os.path.join(path, "index.json")):
+        index = VectorIndex.load(path)
+        logger.info("Loaded %s vector index (%d vectors) from %s", name, len(index), path)
+        return index
+    return VectorIndex(dim, mode=VECTOR_INDEX_MODE, max_size=VECTOR_INDEX_MAX_SIZE)
+
+
+predict_cache = open_vector_index("predict_cache", THUMBNAIL_SIZE * THUMBNAIL_SIZE * 3)
+embedding_index = open_vector_index("embeddings", EMBEDDING_DIM)
+metrics.gauge("predict.dedup.size", lambda: len(predict_cache))
+metrics.gauge("embeddings.size", lambda: len(embedding_index))
+
+
+@app.on_event("shutdown")
+def save_vector_indexes():
+    if VECTOR_INDEX_DIR:
+        predict_cache.save(os.path.join(VECTOR_INDEX_DIR, "predict_cache"))
+        embedding_index.save(os.path.join(VECTOR_INDEX_DIR, "embeddings"))
+
+
+def thumbnail_vector(image: Image.Image) -> np.ndarray:
+    """Tiny mean-centered RGB thumbnail: near-identical images have cosine similarity ~1."""
+    pixels = np.asarray(image.resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.BOX), dtype=np.float32)
+    return (pixels - pixels.mean()).reshape(-1)
+
+
+def pixels_thumbnail_vector(pixels: np.ndarray) -> np.ndarray:
+    """`thumbnail_vector` of a 224x224x3 uint8 array, by mean-pooling 14x14 blocks (no PIL)."""
+    block = INPUT_SIZE // THUMBNAIL_SIZE
+    pooled = pixels.reshape(THUMBNAIL_SIZE, block, THUMBNAIL_SIZE, block, 3).mean(axis=(1, 3), dtype=np.float32)
+    return (pooled - pooled.mean()).reshape(-1)
+
+
+def predict_image(key: str, filename: Optional[str], make_thumbnail, make_tensor) -> Dict[str, Any]:
+    """Top-1 prediction for a decoded image, answered from a near-duplicate when possible.
+
+    `make_thumbnail()` builds the dedup key and `make_tensor()` the model input; the
+    latter is only called on a cache miss. Fresh predictions also store their
+    embedding for /similar.
+    """
+    thumbnail = make_thumbnail() if PREDICT_DEDUP_THRESHOLD > 0 else None
+    if thumbnail is not None:
+        hit = predict_cache.nearest(thumbnail)
+        if hit is not None and hit[0] >= PREDICT_DEDUP_THRESHOLD:
+            metrics.inc("predict.dedup.hit")
+            return {**hit[1], "cached": True, "similarity": round(hit[0], 4)}
+        metrics.inc("predict.dedup.miss")
+
+    label, confidence, embedding = classify_and_embed(make_tensor())
+    result = {"predicted_class": label, "confidence": round(confidence, 4)}
+    if thumbnail is not None:
+        predict_cache.add(thumbnail, result)
+    if embedding is not None:
+        embedding_index.add(embedding, {"id": key, "filename": filename, **result})
+    return result
+
+
 # ---------- 3. Routes ----------
-@app.get("/", response_class=HTMLResponse)
-async def root():
-    with open("static/index.html", "r") as ff:
-        return HTMLResponse(content=ff.read(), status_code=200)
+@app.api_route("/", methods=["GET", "HEAD"], response_class=HTMLResponse)
+async def root(request: Request):
+    return static_assets.response("index.html", request)
+
+
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def static_file(path: str, request: Request):
+    return static_assets.response(path, request)
 
 
 @app.get("/health")
@@ -183,62 +408,584 @@ def health():
     return {"msg": "Up and running!  Visit /docs for Swagger UI."}
 
 
+@app.get("/metrics")
+def get_metrics():
+    """Counters and gauges (admission, caches, ...) as a flat JSON object."""
+    return metrics.snapshot()
+
+
+# Sizes the web UI downscales images to before uploading (see static/script.js)
+PREDICT_UPLOAD_SHORTEST_SIDE = 256  # preprocess resizes the shorter side to 256 before cropping
+UPLOAD_JPEG_QUALITY = float(os.environ.get("UPLOAD_JPEG_QUALITY", "0.9"))
+
+
+def chat_image_longest_side() -> int:
+    """Longest image edge the default chat tier keeps (see chat_images.py).
+
+    Clients that request another tier size images to its edge in "tiers" instead.
+    """
+    configured = os.environ.get("CHAT_UPLOAD_LONGEST_SIDE")
+    if configured:
+        return int(configured)
+    return get_tier().longest_edge
+
+
+@app.get("/upload_preferences")
+def upload_preferences():
+    """Preferred image dimensions and encoding per endpoint, for client-side downscaling.
+
+    Only JPEG and PNG uploads are accepted, so clients should re-encode as JPEG.
+    """
+    return {
+        "predict": {"shortest_side": PREDICT_UPLOAD_SHORTEST_SIDE, "type": "image/jpeg", "quality": UPLOAD_JPEG_QUALITY},
+        "chat": {
+            "longest_side": chat_image_longest_side(),
+            "type": "image/jpeg",
+            "quality": UPLOAD_JPEG_QUALITY,
+            "tiers": {name: tier.longest_edge for name, tier in TIERS.items()},
+            "default_tier": get_tier().name,
+        },
+        "accepted_types": ["image/jpeg", "image/png"],
+        "max_upload_bytes": MAX_UPLOAD_BYTES,
+    }
+
+
+# In-flight deduplication of identical inference requests (see singleflight.py)
+predict_flight = SingleFlight("predict")
+embed_flight = SingleFlight("embed")
+sentiment_flight = SingleFlight("sentiment")
+# Keyword sentiment instead of the transformer once too many analyses are running (see degradation.py)
+sentiment_degradation = DegradationPolicy("sentiment", max_inflight=DEGRADE_SENTIMENT_INFLIGHT)
+
+
+async def read_image_input(request: Request, file: Optional[UploadFile]):
+    """Read an image in any format /predict accepts, without decoding it yet.
+
+    Returns (key, filename, spool, decode): `key` is the sha256 of the input bytes,
+    `spool` the temporary file to close if `decode` is never called, and `decode()`
+    (blocking) returns (make_thumbnail, make_tensor): `make_thumbnail()` builds the
+    near-duplicate key and `make_tensor()` the normalized model input.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    filename = request.headers.get("x-filename")
+
+    if file is not None or content_type in RAW_IMAGE_TYPES:
+        if file is not None:
+            # 3-A. Safety checks
+            if file.content_type not in ("image/jpeg", "image/png"):
+                raise HTTPException(
+                    status_code=415, detail="Please upload a JPEG or PNG image."
+                )
+            filename = file.filename
+
+        # 3-B. Stream upload (size/format/dimension checks) into a spool, hashing it
+        hasher = hashlib.sha256()
+        if file is not None:
+            spool = await spool_image_upload(file, hasher=hasher)
+        else:
+            spool = await spool_image_stream(request.stream(), hasher=hasher)
+
+        # 3-C. Decode + pre-process → tensor
+        def decode():
+            with spool:
+                image = open_image(spool)
+            return lambda: thumbnail_vector(image), lambda: preprocess(image)
+
+        return "image:" + hasher.hexdigest(), filename, spool, decode
+    elif content_type in (NPY_TYPE, RGB24_TYPE):
+        body = await read_body(request.stream(), max_bytes=TENSOR_BYTES + 4096)
+        if content_type == NPY_TYPE:
+            try:
+                descr, shape, body = parse_npy(body)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if descr != "|u1" or shape != (INPUT_SIZE, INPUT_SIZE, 3):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Expected a uint8 array of shape ({INPUT_SIZE}, {INPUT_SIZE}, 3), got {descr} {shape}.",
+                )
+        if len(body) != TENSOR_BYTES:
+            raise HTTPException(status_code=400, detail=f"Expected {TENSOR_BYTES} bytes of RGB data, got {len(body)}.")
+
+        def decode():
+            pixels = np.frombuffer(body, dtype=np.uint8).reshape(INPUT_SIZE, INPUT_SIZE, 3)
+            return lambda: pixels_thumbnail_vector(pixels), lambda: tensor_from_uint8_hwc(body)
+
+        return "tensor:" + hashlib.sha256(body).hexdigest(), filename, None, decode
+    elif content_type.startswith("multipart/"):
+        raise HTTPException(status_code=422, detail="Missing 'file' form field.")
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported content type '{content_type}'.")
+
+
+async def run_image_work(flight: SingleFlight, key: str, spool, work) -> Any:
+    """Run `work()` in a thread, coalesced with identical in-flight inputs."""
+    started = False
+
+    def start():
+        nonlocal started
+        started = True
+        return asyncio.to_thread(work)
+
+    try:
+        return await flight.do(key, start)
+    finally:
+        if spool is not None and not started:
+            spool.close()  # a concurrent identical request did the work
+
+
 @app.post("/predict")
-async def predict(file: UploadFile):
-    # 3-A. Safety checks
-    if file.content_type not in ("image/jpeg", "image/png"):
-        raise HTTPException(
-            status_code=415, detail="Please upload a JPEG or PNG image."
-        )
+async def predict(request: Request, file: Optional[UploadFile] = None):
+    """Classify an image with ResNet-18.
+
+    Accepts a multipart `file` upload (JPEG/PNG), a raw JPEG/PNG body
+    (`application/octet-stream`, `image/jpeg` or `image/png`), or a pre-decoded
+    224x224x3 uint8 RGB tensor as `application/x-npy` or raw `application/x-rgb24`
+    bytes. The tensor modes skip image decoding and resizing entirely.
+    Near-duplicates of recently classified images are answered from a cache
+    (`"cached": true`) without running the model.
+    """
+    key, filename, spool, decode = await read_image_input(request, file)
+
+    # 3-D. Inference (off the event loop); identical images in flight share one computation
+    result = await run_image_work(predict_flight, key, spool, lambda: predict_image(key, filename, *decode()))
+    log_request(
+        logger, "predict", "Predicted", predicted_class=result["predicted_class"],
+        confidence=result["confidence"], cached=result.get("cached", False), filename=filename,
+    )
+    # 3-E. Return JSON
+    return JSONResponse({"filename": filename, **result})
+
 
-    # 3-B. Read image bytes -> PIL Image
-    img_bytes = await file.read()
-    image = Image.open(io.BytesIO(img_bytes)).convert("RGB")
+def require_embeddings():
+    if embedding_backbone is None:
+        raise HTTPException(status_code=503, detail="Embeddings are unavailable for the loaded model.")
 
-    # 3-C. Pre-process → tensor
-    tensor = preprocess(image).unsqueeze(0).to(device)
 
-    # 3-D. Inference
+def embed_image(decode) -> np.ndarray:
+    _, make_tensor = decode()
     with torch.no_grad():
-        outputs = model(tensor)
-    prob = torch.nn.functional.softmax(outputs[0], dim=0)
-    top_idx = torch.argmax(prob).item()
-    top_label = LABELS[top_idx]
-    confidence = prob[top_idx].item()
-    logger.info(f"Predicted: {top_label} with confidence {confidence:.4f}") 
-    # 3-E. Return JSON
+        features = embedding_backbone(make_tensor().unsqueeze(0).to(device))
+    return torch.flatten(features, 1)[0].cpu().numpy()
+
+
+@app.post("/embed")
+async def embed(request: Request, file: Optional[UploadFile] = None, store: bool = False):
+    """Return the 512-d ResNet-18 image embedding (penultimate-layer features).
+
+    Accepts the same inputs as /predict. With `store=true` the embedding is also
+    added to the index searched by /similar.
+    """
+    require_embeddings()
+    key, filename, spool, decode = await read_image_input(request, file)
+    embedding = await run_image_work(embed_flight, key, spool, lambda: embed_image(decode))
+    if store:
+        embedding_index.add(embedding, {"id": key, "filename": filename})
+    return JSONResponse({"id": key, "filename": filename, "dim": len(embedding), "embedding": embedding.tolist()})
+
+
+@app.post("/similar")
+async def similar(request: Request, file: Optional[UploadFile] = None, k: int = 5):
+    """k-NN search over embeddings of previously classified (or stored) images."""
+    require_embeddings()
+    if not 1 <= k <= 100:
+        raise HTTPException(status_code=400, detail="k must be between 1 and 100.")
+    key, filename, spool, decode = await read_image_input(request, file)
+    embedding = await run_image_work(embed_flight, key, spool, lambda: embed_image(decode))
+    matches = await asyncio.to_thread(embedding_index.search, embedding, k)
+    return JSONResponse({
+        "id": key,
+        "filename": filename,
+        "index_size": len(embedding_index),
+        "matches": [{"similarity": round(score, 4), **payload} for score, payload in matches],
+    })
+
+
+SENTIMENT_MAX_TEXTS = int(os.environ.get("SENTIMENT_MAX_TEXTS", "64"))  # per POST /sentiment_analysis
+SENTIMENT_MAX_CHARS = int(os.environ.get("SENTIMENT_MAX_CHARS", "200000"))  # per text
+
+
+class SentimentRequest(BaseModel):
+    texts: List[str]
+    detail: bool = False  # include per-window scores
+
+
+def analyze_sentiment(texts: List[str], detail: bool = False) -> List[Dict[str, Any]]:
+    """Document-level sentiment for each text (blocking; run in a thread)."""
+    if sentiment_windows is not None:
+        return sentiment_windows.analyze(texts, detail=detail)
+    # Pipelines without a model/tokenizer to window with: score as-is
+    return [{"sentiment": result, "windows": 1} for result in sentiment_analyzer(texts, truncation=True)]
+
+
+@app.get("/sentiment_analysis")
+async def sentiment_analysis(text: str, detail: bool = False):
+    """
+    Sentiment of `text` of any length; texts longer than the model's input are scored
+    as overlapping windows and combined. `detail=true` adds the per-window scores.
+    """
+    # Under overload, answer from keywords rather than queueing behind the transformer
+    degraded = sentiment_degradation.check(inflight=sentiment_flight.inflight)
+    if degraded:
+        return JSONResponse({
+            "text": text,
+            "sentiment": keyword_sentiment(text),
+            "model_used": KEYWORD_SENTIMENT_MODEL,
+            "degraded": degraded,
+        })
+    # Identical texts already being analyzed are coalesced into one forward pass
+    result = await sentiment_flight.do((text, detail), lambda: asyncio.to_thread(analyze_sentiment, [text], detail))
+    return JSONResponse({"text": text, **result[0]})
+
+
+@app.post("/sentiment_analysis")
+async def sentiment_analysis_batch(request: SentimentRequest):
+    """Sentiment of several texts; the windows of all of them are scored in shared batches."""
+    if not 1 <= len(request.texts) <= SENTIMENT_MAX_TEXTS:
+        raise HTTPException(status_code=422, detail=f"Send between 1 and {SENTIMENT_MAX_TEXTS} texts.")
+    if any(len(text) > SENTIMENT_MAX_CHARS for text in request.texts):
+        raise HTTPException(status_code=413, detail=f"Each text must be at most {SENTIMENT_MAX_CHARS} characters.")
+    degraded = sentiment_degradation.check(inflight=sentiment_flight.inflight)
+    if degraded:
+        return JSONResponse({
+            "results": [{"sentiment": keyword_sentiment(text)} for text in request.texts],
+            "model_used": KEYWORD_SENTIMENT_MODEL,
+            "degraded": degraded,
+        })
+    key = (tuple(request.texts), request.detail)
+    results = await sentiment_flight.do(key, lambda: asyncio.to_thread(analyze_sentiment, request.texts, request.detail))
+    return JSONResponse({"results": results})
+
+
+CHAT_MAX_NEW_TOKENS = 256
+
+# Fair-share admission in front of the chat model (see admission.py)
+chat_admission = FairAdmission()
+# Rule-based replies instead of queueing once the chat queue is too deep (see degradation.py)
+chat_degradation = DegradationPolicy(
+    "chat", max_queue_depth=DEGRADE_QUEUE_DEPTH, max_predicted_wait=DEGRADE_PREDICTED_WAIT
+)
+
+
+def chat_degraded_reason() -> Optional[str]:
+    """Why this chat turn should skip the model, or None to queue for it."""
+    if chat_bot is None:
+        return None  # already rule-based; nothing to degrade to
+    return chat_degradation.check(
+        queue_depth=chat_admission.queue_depth, predicted_wait=chat_admission.predicted_wait()
+    )
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
     return JSONResponse(
-        {
-            "filename": file.filename,
-            "predicted_class": top_label,
-            "confidence": round(confidence, 4),
-        }
+        {"detail": exc.reason, "retry_after": round(exc.retry_after, 2)},
+        status_code=429,
+        headers={"Retry-After": exc.retry_after_header},
     )
 
 
-@app.get("/sentiment_analysis")
-async def sentiment_analysis(text: str):
+# ---------- Rolling summaries of old turns (see summarizer.py) ----------
+SUMMARY_MODEL = os.environ.get("SUMMARY_MODEL")  # e.g. a small seq2seq model; default: the chat model
+SUMMARY_MAX_NEW_TOKENS = int(os.environ.get("SUMMARY_MAX_NEW_TOKENS", "128"))
+SUMMARY_INSTRUCTION = (
+    "Summarize the conversation below in a few sentences for the assistant's memory. "
+    "Keep names, facts, decisions and open questions; leave out greetings."
+)
+summary_pipeline = None
+if CHAT_SUMMARIZE and SUMMARY_MODEL:
+    try:
+        summary_pipeline = pipeline("summarization", model=SUMMARY_MODEL, device=0 if torch.cuda.is_available() else -1)
+    except Exception as e:
+        logger.warning("✗ Could not load summary model %s: %s", SUMMARY_MODEL, e)
+
+
+def summarize_turns(previous: Optional[str], messages: List[Dict[str, Any]]) -> str:
+    """Fold `messages` (and the previous summary) into a new summary (blocking)."""
+    text = transcript(messages)
+    if previous:
+        text = f"Earlier summary: {previous}\n{text}"
+    if summary_pipeline is not None:
+        return summary_pipeline(text, max_length=SUMMARY_MAX_NEW_TOKENS, truncation=True)[0]["summary_text"]
+    prompt = [{"role": "user", "content": [{"type": "text", "text": f"{SUMMARY_INSTRUCTION}\n\n{text}"}]}]
+    response = chat_bot(text=prompt, max_new_tokens=SUMMARY_MAX_NEW_TOKENS, return_full_text=False)
+    return response[0].get("generated_text", "") if isinstance(response, list) and response else ""
+
+
+if CHAT_SUMMARIZE and (summary_pipeline is not None or chat_bot is not None):
+    summarizer = ConversationSummarizer(conversation_histories, summarize_turns, chat_admission)
+
+
+@app.on_event("startup")
+async def start_summarizer():
+    if summarizer is not None:
+        summarizer.start()
+
+
+@app.on_event("shutdown")
+async def stop_summarizer():
+    if summarizer is not None:
+        await summarizer.stop()
+
+
+# Peers (e.g. router.py) whose X-Forwarded-For is believed; anyone else could forge it
+TRUSTED_PROXIES = {ip.strip() for ip in os.environ.get("TRUSTED_PROXIES", "").split(",") if ip.strip()}
+
+
+def client_id(connection: Union[Request, WebSocket]) -> str:
+    """Identify the calling client for rate limiting."""
+    peer = connection.client.host if connection.client else "unknown"
+    forwarded = connection.headers.get("x-forwarded-for")
+    if forwarded and peer in TRUSTED_PROXIES:
+        return forwarded.rsplit(",", 1)[-1].strip() or peer  # the address our proxy saw
+    return peer
+
+
+DEFAULT_REPLY = "I'm here to help! Could you please rephrase your question?"
+
+
+def begin_chat_turn(session_id: str, message: str, pil_image: Optional[Image.Image]) -> Tuple[List[Dict[str, Any]], List[Image.Image]]:
+    """Record the user's message and return the (messages, images) to send to chat_bot."""
+    # Prepare the current user message content
+    current_content = []
+    if pil_image is not None:
+        current_content.append({"type": "image"})
+
+    # Add text message
+    current_content.append({"type": "text", "text": message})
+
+    # Add current user message to history
+    add_to_conversation_history(session_id, "user", current_content)
+
+    # Get cleaned conversation history (with only one image)
+    messages = clean_conversation_history(session_id)
+    metrics.inc("chat.prompt.turns")
+    metrics.inc("chat.prompt.messages", len(messages))
+
+    # Collect images from the conversation history
+    images = []
+    for msg in messages:
+        if msg["role"] == "user":
+            for content_item in msg["content"]:
+                if content_item.get("type") == "image":
+                    if pil_image is not None:
+                        images.append(pil_image)
+                    break
+    return messages, images
+
+
+def chat_bot_kwargs(
+    messages: List[Dict[str, Any]],
+    images: List[Image.Image],
+    max_new_tokens: int = CHAT_MAX_NEW_TOKENS,
+    tier: Optional[ImageTier] = None,
+) -> Dict[str, Any]:
+    """Keyword arguments for a chat_bot pipeline call."""
+    kwargs = {"text": messages, "max_new_tokens": max_new_tokens, "return_full_text": False}
+    if images:
+        kwargs["images"] = images
+        kwargs.update((tier or get_tier()).processor_kwargs())  # forwarded to the processor
+    return kwargs
+
+
+def chat_image_tier(quality: Optional[str]) -> ImageTier:
+    """Resolve a request's image `quality` (fast/balanced/detailed) or 422."""
+    try:
+        return get_tier(quality)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+async def fit_chat_image(pil_image: Image.Image, tier: ImageTier) -> Image.Image:
+    """Downscale an uploaded chat image to its tier before the processor sees it."""
+    metrics.inc(f"chat.image_tier.{tier.name}")
+    metrics.inc("chat.vision_tiles", tier.tiles(pil_image.size))
+    return await asyncio.to_thread(fit_image, pil_image, tier)
+
+
+# ---------- Shared prompt-prefix KV cache (see prefix_cache.py) ----------
+CHAT_PREFIX_CACHE = os.environ.get("CHAT_PREFIX_CACHE", "1") == "1"
+chat_prefix_cache = None
+if chat_bot is not None and CHAT_PREFIX_CACHE and getattr(chat_bot, "processor", None) is not None:
+    chat_prefix_cache = PrefixCache()
+
+
+def _has_image(messages: List[Dict[str, Any]]) -> bool:
+    return any(item.get("type") == "image" for m in messages for item in m["content"])
+
+
+def _chat_token_ids(messages: List[Dict[str, Any]], add_generation_prompt: bool) -> List[int]:
+    text = chat_bot.processor.apply_chat_template(messages, add_generation_prompt=add_generation_prompt)
+    return list(chat_bot.processor(text=[text])["input_ids"][0])
+
+
+class CancelGeneration(StoppingCriteria):
+    """Stops generate() at the next token once `event` is set (e.g. the client went away)."""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs) -> torch.Tensor:
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+def generate_with_prefix_cache(
+    messages: List[Dict[str, Any]], max_new_tokens: int, streamer=None, stopping_criteria=None
+) -> List[Dict[str, str]]:
+    """Text-only generation that skips the prefill of the longest cached prompt prefix (blocking).
+
+    The conversation before the newest user message is cached for later turns and for
+    other sessions that share it (e.g. the system prompt). Prompts with an image don't
+    come here: SmolVLM only encodes pixel values during an uncached prefill.
+    """
+    model = chat_bot.model
+    ids = _chat_token_ids(messages, add_generation_prompt=True)
+    boundary = _chat_token_ids(messages[:-1], add_generation_prompt=False) if len(messages) > 1 else []
+    if ids[: len(boundary)] != boundary:
+        boundary = []  # tokenized differently inside the full prompt; not a reusable prefix
+    input_ids = torch.tensor([ids], device=model.device)
+
+    with chat_prefix_cache.lease(ids) as hit:
+        # generate() extends the cache in place, so it always gets a private copy
+        kv, cached = (copy.deepcopy(hit.kv), hit.length) if hit is not None else (None, 0)
+        if len(boundary) > cached and len(boundary) >= chat_prefix_cache.min_tokens:
+            with torch.no_grad():
+                kv = model(
+                    input_ids=input_ids[:, cached : len(boundary)], past_key_values=kv, use_cache=True
+                ).past_key_values
+            chat_prefix_cache.insert(boundary, copy.deepcopy(kv))
+        output = model.generate(
+            input_ids=input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            past_key_values=kv,
+            max_new_tokens=max_new_tokens,
+            streamer=streamer,
+            stopping_criteria=stopping_criteria,
+        )
+    metrics.inc("chat.prefill_tokens", len(ids) - cached)  # tokens actually prefilled, cache hits excluded
+    text = chat_bot.processor.decode(output[0, len(ids) :], skip_special_tokens=True)
+    return [{"generated_text": text}]
+
+
+def run_chat_bot(
+    messages: List[Dict[str, Any]],
+    images: List[Image.Image],
+    max_new_tokens: int = CHAT_MAX_NEW_TOKENS,
+    streamer=None,
+    tier: Optional[ImageTier] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Any:
+    """Blocking chat_bot call; text-only prompts reuse the shared prefix cache.
+
+    Setting `cancel` stops generation at the next token.
     """
-    Example endpoint for sentiment analysis using transformers.
-    This is just a placeholder to show how you might extend the app.
+    stopping_criteria = StoppingCriteriaList([CancelGeneration(cancel)]) if cancel is not None else None
+    if chat_prefix_cache is not None and not images and not _has_image(messages):
+        return generate_with_prefix_cache(messages, max_new_tokens, streamer, stopping_criteria)
+    kwargs = chat_bot_kwargs(messages, images, max_new_tokens, tier)
+    generate_kwargs = {"streamer": streamer, "stopping_criteria": stopping_criteria}
+    generate_kwargs = {k: v for k, v in generate_kwargs.items() if v is not None}
+    if generate_kwargs:
+        kwargs["generate_kwargs"] = generate_kwargs
+    return chat_bot(**kwargs)
+
+
+def extract_chat_response(response: Any, has_images: bool) -> str:
+    """Pull the assistant text out of a pipeline result."""
+    if isinstance(response, list) and len(response) > 0:
+        assistant_response = response[0].get('generated_text', '').strip()
+    elif isinstance(response, str):
+        assistant_response = response.strip()
+    else:
+        assistant_response = DEFAULT_REPLY
+
+    if not assistant_response:
+        if has_images:
+            assistant_response = "I can see your image! How can I help you with it?"
+        else:
+            assistant_response = DEFAULT_REPLY
+    return assistant_response
+
+
+def finish_chat_turn(
+    session_id: str,
+    message: str,
+    assistant_response: str,
+    has_image: bool,
+    degraded: Optional[str] = None,
+    tier: Optional[ImageTier] = None,
+) -> Dict[str, Any]:
+    """Record the assistant's reply and build the response payload for the turn.
+
+    `degraded` is the overload reason when the rule-based responder stood in for the model;
+    `tier` is the resolution tier the turn's image was sent at.
     """
-    result = sentiment_analyzer(text)
-    return JSONResponse({"text": text, "sentiment": result[0]})
+    # Clean up and validate response
+    if not assistant_response or len(assistant_response.strip()) == 0:
+        assistant_response = DEFAULT_REPLY
+
+    # Add assistant response to history
+    add_to_conversation_history(session_id, "assistant", [{"type": "text", "text": assistant_response}])
+    if summarizer is not None:
+        summarizer.note_turn(session_id)
+
+    # Log the interaction
+    if degraded:
+        model_name = f"{RULE_BASED_CHAT_MODEL} (overload: {degraded})"
+    else:
+        model_name = "SmolVLM-Instruct" if chat_bot is not None else RULE_BASED_CHAT_MODEL
+    log_request(
+        logger, "chat", "Chat turn", session=session_id[:8], user=message, assistant=assistant_response, model=model_name
+    )
+
+    payload = {
+        "message": message,
+        "response": assistant_response,
+        "has_image": has_image,
+        "model_used": model_name,
+        "session_id": session_id,
+        "conversation_length": len(conversation_histories.get(session_id, []))
+    }
+    if degraded:
+        payload["degraded"] = degraded
+    if has_image and tier is not None:
+        payload["image_quality"] = tier.name
+    return payload
+
+
+def chat_error_payload(session_id: str, message: str, has_image: bool) -> Dict[str, Any]:
+    """Fallback payload returned when generation fails."""
+    return {
+        "message": message,
+        "response": "I'm sorry, I'm having trouble processing your request right now. Please try again.",
+        "has_image": has_image,
+        "model_used": "Error fallback",
+        "session_id": session_id,
+        "conversation_length": len(conversation_histories.get(session_id, []))
+    }
 
 
 @app.post("/chat")
-async def chat(message: str = Form(...), image: UploadFile = None, session_id: str = Form(None)):
+async def chat(
+    request: Request,
+    message: str = Form(...),
+    image: UploadFile = None,
+    session_id: str = Form(None),
+    quality: str = Form(None),
+):
     """Chat endpoint that provides conversational AI with image understanding.
     Uses SmolVLM pipeline for multimodal conversations with conversation history.
+    `quality` (fast/balanced/detailed) bounds the resolution an image is processed at.
     """
     # Generate session ID if not provided
     if not session_id:
         session_id = str(uuid.uuid4())
     
     try:
-        # Prepare the current user message content
-        current_content = []
+        # Rate limits apply to every reply, degraded ones included (raises AdmissionRejected → 429)
+        chat_admission.check_rate(session_id, client_id(request))
         pil_image = None
+        tier = chat_image_tier(quality)
         
         # Handle image upload
         if image:
@@ -247,111 +994,295 @@ async def chat(message: str = Form(...), image: UploadFile = None, session_id: s
                     status_code=415, detail="Please upload a JPEG or PNG image."
                 )
             
-            # Convert image to PIL
-            img_bytes = await image.read()
-            pil_image = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-            current_content.append({"type": "image"})
+            # Stream upload (size/format/dimension checks) -> PIL Image
+            pil_image = await read_image_upload(image)
+            pil_image = await fit_chat_image(pil_image, tier)
         
-        # Add text message
-        current_content.append({"type": "text", "text": message})
+        # Overloaded: answer right away from the rule-based tier instead of queueing
+        degraded = chat_degraded_reason()
+        if degraded:
+            begin_chat_turn(session_id, message, pil_image)
+            assistant_response = rule_based_chat_response(message, image is not None)
+            return JSONResponse(finish_chat_turn(session_id, message, assistant_response, image is not None, degraded))
         
-        # Add current user message to history
-        add_to_conversation_history(session_id, "user", current_content)
-        
-        # Get cleaned conversation history (with only one image)
-        conversation_history = clean_conversation_history(session_id)
-        
-        # Process with chat model
-        if chat_bot is not None:
-            # Prepare messages for the pipeline
-            messages = conversation_history.copy()
-            
-            # Collect images from the conversation history
-            images = []
-            for msg in messages:
-                if msg["role"] == "user":
-                    for content_item in msg["content"]:
-                        if content_item.get("type") == "image":
-                            if pil_image is not None:
-                                images.append(pil_image)
-                            break
-            
-            # Generate response using pipeline with proper parameters
-            if images:
-                response = chat_bot(
-                    text=messages, 
-                    images=images, 
-                    max_new_tokens=256, 
-                    return_full_text=False
-                )
-            else:
-                response = chat_bot(
-                    text=messages, 
-                    max_new_tokens=256, 
-                    return_full_text=False
-                )
+        # Wait for a fair share of the chat model (raises AdmissionRejected → 429)
+        async with chat_admission.slot(session_id, client_id(request), rate_limited=False):
+            messages, images = begin_chat_turn(session_id, message, pil_image)
             
-            # Extract assistant response
-            if isinstance(response, list) and len(response) > 0:
-                assistant_response = response[0].get('generated_text', '').strip()
-            elif isinstance(response, str):
-                assistant_response = response.strip()
-            else:
-                assistant_response = "I'm here to help! Could you please rephrase your question?"
-            
-            if not assistant_response:
-                if images:
-                    assistant_response = "I can see your image! How can I help you with it?"
-                else:
-                    assistant_response = "I'm here to help! Could you please rephrase your question?"
-        else:
-            # Simple rule-based fallback
-            if image:
-                assistant_response = "I can see you sent an image! While I can't analyze it yet, I'm here to help with your message."
+            # Process with chat model (in a worker thread, so queued requests can be admitted)
+            if chat_bot is not None:
+                response = await asyncio.to_thread(run_chat_bot, messages, images, CHAT_MAX_NEW_TOKENS, None, tier)
+                assistant_response = extract_chat_response(response, bool(images))
             else:
-                assistant_response = f"I understand you said: '{message}'. I'm a simple AI assistant here to help!"
-        
-        # Clean up and validate response
-        if not assistant_response or len(assistant_response.strip()) == 0:
-            assistant_response = "I'm here to help! Could you please rephrase your question?"
-        
-        # Add assistant response to history
-        add_to_conversation_history(session_id, "assistant", [{"type": "text", "text": assistant_response}])
+                assistant_response = rule_based_chat_response(message, image is not None)
         
-        # Log the interaction
-        model_name = "SmolVLM-Instruct" if chat_bot is not None else "Simple Rule-based Chat"
-        logger.info(f"Session {session_id[:8]}... | User: {message} | Assistant: {assistant_response} | Model: {model_name}")
-        
-        return JSONResponse({
-            "message": message,
-            "response": assistant_response,
-            "has_image": image is not None,
-            "model_used": model_name,
-            "session_id": session_id,
-            "conversation_length": len(conversation_histories.get(session_id, []))
-        })
+        return JSONResponse(finish_chat_turn(session_id, message, assistant_response, image is not None, tier=tier))
         
+    except (HTTPException, AdmissionRejected):
+        # Invalid uploads and rate limiting are client errors, not model failures
+        raise
     except Exception as e:
-        logger.error(f"Chat error: {str(e)} | Message: {message} | Image: {image.filename if image else 'None'} | Session: {session_id}")
+        logger.error(
+            "Chat error: %s", e,
+            extra={"fields": {"message": message, "image": image.filename if image else None, "session": session_id}},
+        )
         # Provide a fallback response even if there's an error
-        return JSONResponse({
-            "message": message,
-            "response": "I'm sorry, I'm having trouble processing your request right now. Please try again.",
-            "has_image": image is not None,
-            "model_used": "Error fallback",
-            "session_id": session_id,
-            "conversation_length": len(conversation_histories.get(session_id, []))
+        return JSONResponse(chat_error_payload(session_id, message, image is not None))
+
+
+# ---------- WebSocket chat ----------
+WS_MAX_PIPELINED = 16  # queued messages per connection before new ones are refused
+
+
+def _chat_tokenizer():
+    tokenizer = getattr(chat_bot, "tokenizer", None)
+    if tokenizer is None:
+        tokenizer = getattr(getattr(chat_bot, "processor", None), "tokenizer", None)
+    return tokenizer
+
+
+_STREAM_END = object()
+
+
+def _next_delta(streamer) -> Any:
+    """Next streamed text chunk, None on a poll timeout, or _STREAM_END."""
+    try:
+        return next(streamer)
+    except StopIteration:
+        return _STREAM_END
+    except queue.Empty:
+        return None
+
+
+async def stream_chat_reply(
+    messages: List[Dict[str, Any]],
+    images: List[Image.Image],
+    max_new_tokens: int = CHAT_MAX_NEW_TOKENS,
+    tier: Optional[ImageTier] = None,
+) -> AsyncIterator[Tuple[str, Optional[str]]]:
+    """Run chat_bot in a worker thread and yield (delta, None) per decoded chunk.
+
+    The final item is ("", full_response). Falls back to a single, non-streamed delta
+    when the pipeline has no tokenizer to stream with. If the consumer stops early
+    (closed or cancelled), generation is told to stop and awaited, so a caller
+    holding an admission slot keeps it until the model is actually free.
+    """
+    loop = asyncio.get_running_loop()
+    tokenizer = _chat_tokenizer()
+    streamer = None
+    if tokenizer is not None:
+        from transformers import TextIteratorStreamer
+
+        # The timeout lets us notice a generation that failed before signalling the streamer
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=0.5)
+    cancel = threading.Event()
+    generation = loop.run_in_executor(None, run_chat_bot, messages, images, max_new_tokens, streamer, tier, cancel)
+    finished = False
+    try:
+        if streamer is None:
+            await asyncio.shield(generation)  # a cancelled caller must not orphan the thread
+        else:
+            while True:
+                delta = await loop.run_in_executor(None, _next_delta, streamer)
+                if delta is _STREAM_END or (delta is None and generation.done()):
+                    break
+                if delta:
+                    yield delta, None
+        finished = True
+    finally:
+        if not finished:
+            cancel.set()
+            metrics.inc("chat.generation.cancelled")
+        response = await generation  # re-raises generation errors
+    text = extract_chat_response(response, bool(images))
+    if streamer is None:
+        yield text, None
+    yield "", text
+
+
+def decode_base64_image(data: str) -> bytes:
+    """Decode a base64 (optionally data-URL) image sent over the WebSocket or to /jobs."""
+    if data.startswith("data:"):
+        data = data.partition(",")[2]
+    if len(data) > MAX_UPLOAD_BYTES * 4 // 3 + 4:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_BYTES} bytes.")
+    try:
+        return base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Image must be base64-encoded.")
+
+
+async def _single_chunk(data: bytes) -> AsyncIterator[bytes]:
+    yield data
+
+
+async def _ws_chat_turn(websocket: WebSocket, session_id: str, request: Dict[str, Any]) -> None:
+    """Handle one pipelined WebSocket chat message, streaming deltas back."""
+    request_id = request.get("id")
+    message = str(request.get("message", ""))
+    has_image = bool(request.get("image"))
+    try:
+        chat_admission.check_rate(session_id, client_id(websocket))  # degraded replies count too
+        pil_image = None
+        tier = chat_image_tier(request.get("quality"))
+        if has_image:
+            pil_image = await read_image_stream(_single_chunk(decode_base64_image(request["image"])))
+            pil_image = await fit_chat_image(pil_image, tier)
+
+        degraded = chat_degraded_reason()
+        if degraded:
+            begin_chat_turn(session_id, message, pil_image)
+            assistant_response = rule_based_chat_response(message, has_image)
+            await websocket.send_json({"type": "start", "id": request_id})
+            await websocket.send_json({"type": "delta", "id": request_id, "text": assistant_response})
+            await websocket.send_json(
+                {"type": "done", "id": request_id, **finish_chat_turn(session_id, message, assistant_response, has_image, degraded)}
+            )
+            return
+
+        async with chat_admission.slot(session_id, client_id(websocket), rate_limited=False):
+            messages, images = begin_chat_turn(session_id, message, pil_image)
+
+            await websocket.send_json({"type": "start", "id": request_id})
+            if chat_bot is not None:
+                assistant_response = ""
+                # aclosing: on disconnect the generation is stopped and awaited before the slot is released
+                async with contextlib.aclosing(stream_chat_reply(messages, images, tier=tier)) as reply:
+                    async for delta, final in reply:
+                        if final is not None:
+                            assistant_response = final
+                        else:
+                            await websocket.send_json({"type": "delta", "id": request_id, "text": delta})
+            else:
+                assistant_response = rule_based_chat_response(message, has_image)
+                await websocket.send_json({"type": "delta", "id": request_id, "text": assistant_response})
+
+        payload = finish_chat_turn(session_id, message, assistant_response, has_image, tier=tier)
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "id": request_id, "status": e.status_code, "detail": e.detail})
+        return
+    except AdmissionRejected as e:
+        await websocket.send_json({
+            "type": "error", "id": request_id, "status": 429, "detail": e.reason, "retry_after": e.retry_after
         })
+        return
+    except WebSocketDisconnect:
+        raise
+    except Exception as e:
+        logger.error("WebSocket chat error: %s", e, extra={"fields": {"message": message, "session": session_id}})
+        payload = chat_error_payload(session_id, message, has_image)
+    await websocket.send_json({"type": "done", "id": request_id, **payload})
+
+
+@app.websocket("/ws/chat")
+async def websocket_chat(websocket: WebSocket, session_id: Optional[str] = None):
+    """Chat over a persistent WebSocket bound to one session.
+
+    Client → server: {"type": "message", "id": <any>, "message": str, "image": <base64, optional>}
+    Server → client: {"type": "session"}, then per message "start", zero or more
+    "delta" ({"text": ...}) and a final "done" carrying the same fields as POST /chat
+    (or "error"). Messages may be pipelined; they are answered in order.
+    """
+    await websocket.accept()
+    if not session_id:
+        session_id = str(uuid.uuid4())
+    await websocket.send_json({"type": "session", "session_id": session_id})
+
+    pending: asyncio.Queue = asyncio.Queue(maxsize=WS_MAX_PIPELINED)
+
+    async def worker():
+        while True:
+            request = await pending.get()
+            try:
+                await _ws_chat_turn(websocket, session_id, request)
+            except WebSocketDisconnect:
+                return  # the receive loop sees the disconnect too
+            except Exception as e:
+                # Queued messages could never be answered: close so the client can reconnect
+                logger.error("WebSocket chat worker failed: %s", e, extra={"fields": {"session": session_id}})
+                with contextlib.suppress(Exception):
+                    await websocket.close(code=1011)
+                return
+
+    worker_task = asyncio.create_task(worker())
+    try:
+        while True:
+            request = await websocket.receive_json()
+            if not isinstance(request, dict) or request.get("type", "message") != "message":
+                await websocket.send_json({"type": "error", "status": 400, "detail": "Expected a message object."})
+                continue
+            try:
+                pending.put_nowait(request)
+            except asyncio.QueueFull:
+                await websocket.send_json({
+                    "type": "error", "id": request.get("id"), "status": 429,
+                    "detail": f"Too many pipelined messages (max {WS_MAX_PIPELINED})."
+                })
+    except WebSocketDisconnect:
+        pass
+    except ValueError:
+        await websocket.close(code=1003)  # unsupported data (not JSON)
+    finally:
+        worker_task.cancel()
+        # Wait for an in-flight turn to stop its generation and release its admission slot
+        await asyncio.wait({worker_task})
+        if not worker_task.cancelled():
+            worker_task.exception()  # retrieve it; the worker logs its own failures
+
+
+DEFAULT_PAGE_SIZE = 100  # when no limit is given
+MAX_PAGE_SIZE = 1000
+NDJSON_CHUNK_SIZE = 500
+
+
+def _parse_cursor(cursor: Optional[str]):
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _ndjson(lines) -> bytes:
+    return b"".join(json_dumps(line) + b"\n" for line in lines)
+
+
+def _ndjson_lines(items) -> Iterator[bytes]:
+    """One NDJSON line per item, so the response is streamed as it is encoded."""
+    for item in items:
+        yield json_dumps(item) + b"\n"
 
 
 @app.get("/chat/history/{session_id}")
-async def get_conversation_history(session_id: str):
-    """Get the conversation history for a specific session."""
+async def get_conversation_history(
+    session_id: str, limit: Optional[int] = None, cursor: Optional[str] = None, format: str = "json"
+):
+    """Get the conversation history for a specific session.
+
+    Without `limit` the whole history is returned. With `limit`, at most that many
+    messages are returned along with a `next_cursor` for the following page.
+    `format=ndjson` streams one message per line instead.
+    """
     history = conversation_histories.get(session_id, [])
+    if format == "ndjson":
+        return StreamingResponse(_ndjson_lines(list(history)), media_type="application/x-ndjson")
+
+    start = _parse_cursor(cursor) or 0
+    if not isinstance(start, int) or start < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if limit is None:
+        page, next_cursor = history[start:], None
+    else:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        page = history[start:start + limit]
+        next_cursor = encode_cursor(start + limit) if start + limit < len(history) else None
     return JSONResponse({
         "session_id": session_id,
-        "history": history,
-        "length": len(history)
+        "history": page,
+        "length": len(history),
+        "next_cursor": next_cursor,
+        "summary": summarizer.summaries.get(session_id) if summarizer is not None else None
     })
 
 @app.delete("/chat/history/{session_id}")
@@ -359,21 +1290,264 @@ async def clear_conversation_history(session_id: str):
     """Clear the conversation history for a specific session."""
     if session_id in conversation_histories:
         del conversation_histories[session_id]
+        session_index.remove(session_id)
+        if summarizer is not None:
+            summarizer.forget(session_id)
         return JSONResponse({"message": f"Conversation history cleared for session {session_id}"})
     else:
         return JSONResponse({"message": f"No conversation history found for session {session_id}"})
 
+
+def _session_summary(key) -> Dict[str, Any]:
+    last_updated, session_id = key
+    return {
+        "session_id": session_id,
+        "message_count": len(conversation_histories.get(session_id, [])),
+        "last_updated": last_updated
+    }
+
+
+def _session_filter(min_messages: int):
+    if min_messages <= 0:
+        return None
+    return lambda session_id: len(conversation_histories.get(session_id, [])) >= min_messages
+
+
+async def _stream_sessions(updated_since: Optional[str], min_messages: int):
+    """Yield NDJSON chunks of session summaries, newest first, without holding the loop."""
+    where = _session_filter(min_messages)
+    before = None
+    while True:
+        keys, before = session_index.page(NDJSON_CHUNK_SIZE, before, updated_since, where)
+        if keys:
+            yield _ndjson(_session_summary(key) for key in keys)
+        if before is None:
+            return
+        await asyncio.sleep(0)
+
+
 @app.get("/chat/sessions")
-async def list_active_sessions():
-    """List all active conversation sessions."""
-    sessions = []
-    for session_id, history in conversation_histories.items():
-        sessions.append({
-            "session_id": session_id,
-            "message_count": len(history),
-            "last_updated": history[-1]["timestamp"] if history else None
-        })
-    return JSONResponse({"active_sessions": sessions, "total_sessions": len(sessions)})
+async def list_active_sessions(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    updated_since: Optional[str] = None,
+    min_messages: int = 0,
+    format: str = "json"
+):
+    """List active conversation sessions, most recently updated first.
+
+    Results are paginated (DEFAULT_PAGE_SIZE when no `limit` is given): pass the
+    returned `next_cursor` as `cursor` to get the next page. `updated_since`
+    (ISO-8601) is an index seek; `min_messages` is checked per session while walking
+    the index, i.e. a scan of the sessions newer than the cursor. `format=ndjson`
+    streams every matching session as one JSON object per line.
+    """
+    if format == "ndjson":
+        return StreamingResponse(_stream_sessions(updated_since, min_messages), media_type="application/x-ndjson")
+    limit = max(1, min(DEFAULT_PAGE_SIZE if limit is None else limit, MAX_PAGE_SIZE))
+    before = _parse_cursor(cursor)
+    if before is not None and not (isinstance(before, list) and len(before) == 2 and all(isinstance(v, str) for v in before)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # A selective min_messages filter may walk many sessions: keep it off the event loop
+    keys, next_key = await asyncio.to_thread(
+        session_index.page, limit, before, updated_since, _session_filter(min_messages)
+    )
+    return JSONResponse({
+        "active_sessions": [_session_summary(key) for key in keys],
+        "total_sessions": len(session_index),
+        "next_cursor": encode_cursor(next_key) if next_key else None
+    })
+
+
+# ---------- Background jobs (see jobs.py) ----------
+JOB_CHAT_MAX_NEW_TOKENS = int(os.environ.get("JOB_CHAT_MAX_NEW_TOKENS", "2048"))
+JOB_CHAT_WEIGHT = float(os.environ.get("JOB_CHAT_WEIGHT", "0.25"))  # fair-queue share vs. interactive chat
+JOB_CHAT_BATCH_SIZE = int(os.environ.get("JOB_CHAT_BATCH_SIZE", "1"))  # chat jobs claimed per worker; run one by one
+JOB_MAX_IMAGES = int(os.environ.get("JOB_MAX_IMAGES", "1000"))  # per classify job
+JOB_FORWARD_BATCH = int(os.environ.get("JOB_FORWARD_BATCH", "32"))  # images per ResNet-18 forward pass
+JOB_STREAM_INTERVAL = 0.5  # seconds between status polls in /jobs/{id}/events
+JOB_PARTIAL_INTERVAL = 1.0  # seconds between partial-text writes during chat jobs
+
+
+class JobImage(BaseModel):
+    data: str  # base64 or data URL
+    filename: Optional[str] = None
+
+
+class JobRequest(BaseModel):
+    type: Literal["chat", "classify"]
+    # chat
+    message: Optional[str] = None
+    session_id: Optional[str] = None
+    image: Optional[str] = None
+    quality: Optional[str] = None
+    max_new_tokens: int = CHAT_MAX_NEW_TOKENS
+    # classify
+    images: Optional[List[JobImage]] = None
+
+
+async def run_chat_jobs(batch: List[Job], progress) -> List[Any]:
+    """Generate each reply with a low-weight share of the chat model slots.
+
+    Claimed one job at a time (JOB_CHAT_BATCH_SIZE): a reply is stored as soon as it is
+    generated, and a shutdown never re-queues (and replays) a reply already in the history.
+    """
+    results = []
+    for job in batch:
+        payload = job.payload
+        session_id = payload["session_id"]
+        try:
+            pil_image = None
+            tier = get_tier(payload.get("quality"))
+            if payload.get("image"):
+                raw = await asyncio.to_thread(decode_base64_image, payload["image"])
+                pil_image = await fit_chat_image(await read_image_stream(_single_chunk(raw)), tier)
+            async with chat_admission.slot(session_id, "jobs", weight=JOB_CHAT_WEIGHT, rate_limited=False):
+                messages, images = begin_chat_turn(session_id, payload["message"], pil_image)
+                if chat_bot is None:
+                    assistant_response = rule_based_chat_response(payload["message"], pil_image is not None)
+                else:
+                    text, last_write = "", time.monotonic()
+                    reply = stream_chat_reply(messages, images, payload["max_new_tokens"], tier)
+                    async with contextlib.aclosing(reply):  # generation stops before the slot is released
+                        async for delta, final in reply:
+                            if final is not None:
+                                assistant_response = final
+                                break
+                            text += delta
+                            if time.monotonic() - last_write >= JOB_PARTIAL_INTERVAL:
+                                progress(job.id, min(0.99, len(text) / (4 * payload["max_new_tokens"])), {"partial": text})
+                                last_write = time.monotonic()
+            results.append(
+                finish_chat_turn(session_id, payload["message"], assistant_response, pil_image is not None, tier=tier)
+            )
+        except AdmissionRejected as e:
+            results.append(RetryLater(e.reason, e.retry_after))
+        except HTTPException as e:
+            results.append(ValueError(e.detail))
+        except Exception as e:
+            logger.error("Chat job %s failed: %s", job.id, e, extra={"fields": {"session": session_id}})
+            results.append(e)
+    return results
+
+
+def decode_job_image(data: str) -> torch.Tensor:
+    """base64 JPEG/PNG → model input tensor (blocking; run in a worker thread)."""
+    raw = decode_base64_image(data)
+    try:
+        sniff_image_header(raw[:64 * 1024])
+    except ValueError:
+        raise HTTPException(status_code=415, detail="Please upload a JPEG or PNG image.")
+    return preprocess(open_image(io.BytesIO(raw)))
+
+
+async def run_classify_jobs(batch: List[Job], progress) -> List[Any]:
+    """Decode every image in the batch, then classify them JOB_FORWARD_BATCH at a time."""
+    items = []  # (job index, filename, tensor or error)
+    for index, job in enumerate(batch):
+        for image in job.payload["images"]:
+            try:
+                items.append((index, image.get("filename"), await asyncio.to_thread(decode_job_image, image["data"])))
+            except HTTPException as e:
+                items.append((index, image.get("filename"), e.detail))
+
+    outputs: List[List[Dict[str, Any]]] = [[] for _ in batch]
+    totals = [len(job.payload["images"]) for job in batch]
+    pending = [item for item in items if isinstance(item[2], torch.Tensor)]
+    for index, filename, error in (item for item in items if not isinstance(item[2], torch.Tensor)):
+        outputs[index].append({"filename": filename, "error": error})
+    for start in range(0, len(pending), JOB_FORWARD_BATCH):
+        chunk = pending[start : start + JOB_FORWARD_BATCH]
+        predictions = await asyncio.to_thread(classify_batch, [tensor for _, _, tensor in chunk])
+        for (index, filename, _), (label, confidence) in zip(chunk, predictions):
+            outputs[index].append({"filename": filename, "predicted_class": label, "confidence": round(confidence, 4)})
+        for index in {index for index, _, _ in chunk}:
+            progress(batch[index].id, len(outputs[index]) / totals[index])
+    return [{"predictions": predictions} for predictions in outputs]
+
+
+job_store = JobStore()
+job_pool = JobWorkerPool(
+    job_store, {"chat": run_chat_jobs, "classify": run_classify_jobs}, batch_sizes={"chat": JOB_CHAT_BATCH_SIZE}
+)
+
+
+@app.on_event("startup")
+async def start_job_workers():
+    job_pool.start()
+
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    await job_pool.stop()
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(job: JobRequest):
+    """Queue a chat generation or a batch of image classifications; poll GET /jobs/{id}."""
+    if job.type == "chat":
+        if not job.message:
+            raise HTTPException(status_code=422, detail="Chat jobs need a 'message'.")
+        if not 1 <= job.max_new_tokens <= JOB_CHAT_MAX_NEW_TOKENS:
+            raise HTTPException(status_code=422, detail=f"max_new_tokens must be between 1 and {JOB_CHAT_MAX_NEW_TOKENS}.")
+        if job.image:
+            # Reject bad input now rather than in the worker; decoding is CPU work
+            await asyncio.to_thread(decode_base64_image, job.image)
+        payload = {
+            "message": job.message,
+            "session_id": job.session_id or str(uuid.uuid4()),
+            "image": job.image,
+            "quality": chat_image_tier(job.quality).name,
+            "max_new_tokens": job.max_new_tokens,
+        }
+    else:
+        if not job.images:
+            raise HTTPException(status_code=422, detail="Classify jobs need a non-empty 'images' list.")
+        if len(job.images) > JOB_MAX_IMAGES:
+            raise HTTPException(status_code=413, detail=f"At most {JOB_MAX_IMAGES} images per job.")
+        await asyncio.to_thread(lambda: [decode_base64_image(image.data) for image in job.images])
+        payload = {"images": [{"data": image.data, "filename": image.filename} for image in job.images]}
+
+    job_id = await asyncio.to_thread(job_store.submit, job.type, payload)
+    job_pool.notify()
+    response = {"id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}", "events_url": f"/jobs/{job_id}/events"}
+    if job.type == "chat":
+        response["session_id"] = payload["session_id"]
+    return JSONResponse(response, status_code=202)
+
+
+async def _get_job(job_id: str) -> Job:
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status, progress and (once done) the result of a job."""
+    return JSONResponse((await _get_job(job_id)).public())
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Stream the job's status as newline-delimited JSON whenever it changes, ending when it finishes."""
+    job = await _get_job(job_id)
+
+    async def events():
+        nonlocal job
+        last = None
+        while True:
+            state = job.public()
+            if state != last:
+                yield json_dumps(state) + b"\n"
+                last = state
+            if job.status in TERMINAL:
+                return
+            await asyncio.sleep(JOB_STREAM_INTERVAL)
+            job = await _get_job(job_id)
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
 
 
 # ---------- 4. Entry point ----------
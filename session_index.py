@@ -0,0 +1,90 @@
+"""
+Last-update index over the in-memory chat sessions.
+• Keeps (last_updated, session_id) keys in a sorted list, so listing the most recently
+  active sessions, resuming from a cursor and `updated_since` filters are bisect
+  seeks instead of scans over every session.
+• Cursors are opaque, URL-safe strings encoding the last key a client has seen.
+"""
+
+import base64
+import bisect
+import json
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+Key = Tuple[str, str]  # (ISO-8601 last_updated, session_id)
+
+
+def encode_cursor(value) -> str:
+    raw = json.dumps(value, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor; raises ValueError on malformed input."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+class SessionIndex:
+    """Sessions ordered by last update time (ISO timestamps sort lexicographically)."""
+
+    def __init__(self):
+        self._keys: List[Key] = []  # ascending
+        self._updated: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._updated
+
+    def touch(self, session_id: str, updated_at: str) -> None:
+        """Record that `session_id` was updated at `updated_at`."""
+        with self._lock:
+            self._discard(session_id)
+            self._updated[session_id] = updated_at
+            bisect.insort(self._keys, (updated_at, session_id))
+
+    def remove(self, session_id: str) -> None:
+        with self._lock:
+            self._discard(session_id)
+
+    def _discard(self, session_id: str) -> None:
+        old = self._updated.pop(session_id, None)
+        if old is not None:
+            i = bisect.bisect_left(self._keys, (old, session_id))
+            del self._keys[i]
+
+    def page(
+        self,
+        limit: int,
+        before: Optional[Key] = None,
+        updated_since: Optional[str] = None,
+        where: Optional[Callable[[str], bool]] = None,
+    ) -> Tuple[List[Key], Optional[Key]]:
+        """Return up to `limit` keys, newest first, strictly older than `before`.
+
+        Iteration stops as soon as keys fall below `updated_since`. `where` is an
+        additional per-session predicate. The second element of the result is the
+        cursor key for the next page, or None when there is nothing left.
+        """
+        with self._lock:
+            keys = self._keys
+            i = bisect.bisect_left(keys, tuple(before)) if before else len(keys)
+            items: List[Key] = []
+            while i > 0:
+                i -= 1
+                key = keys[i]
+                if updated_since is not None and key[0] < updated_since:
+                    return items, None
+                if where is None or where(key[1]):
+                    items.append(key)
+                    if len(items) == limit:
+                        has_more = i > 0 and (updated_since is None or keys[i - 1][0] >= updated_since)
+                        return items, (key if has_more else None)
+            return items, None
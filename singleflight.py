@@ -0,0 +1,45 @@
+"""
+Single-flight coalescing of identical in-flight work.
+• Concurrent callers with the same key share one computation and all receive its
+  result (or its exception); nothing is cached once the computation finishes.
+• The computation runs as its own task, so a caller that disconnects does not cancel
+  it for everybody else.
+• Executed/coalesced counts and the coalesce rate are published via metrics.py.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from metrics import metrics
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        metrics.gauge(f"{name}.singleflight.inflight", lambda: self.inflight)
+        metrics.gauge(f"{name}.singleflight.coalesce_rate", self.coalesce_rate)
+
+    @property
+    def inflight(self) -> int:
+        """Distinct computations currently running."""
+        return len(self._inflight)
+
+    def coalesce_rate(self) -> float:
+        executed = metrics.get(f"{self.name}.singleflight.executed")
+        coalesced = metrics.get(f"{self.name}.singleflight.coalesced")
+        total = executed + coalesced
+        return round(coalesced / total, 4) if total else 0.0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the result of `fn()`, sharing it with concurrent callers of the same key."""
+        future = self._inflight.get(key)
+        if future is not None:
+            metrics.inc(f"{self.name}.singleflight.coalesced")
+            return await asyncio.shield(future)
+
+        metrics.inc(f"{self.name}.singleflight.executed")
+        future = asyncio.ensure_future(fn())
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
@@ -5,6 +5,7 @@ const imagePreview = document.getElementById('imagePreview');
 const previewImg = document.getElementById('previewImg');
 const classifyBtn = document.getElementById('classifyBtn');
 const imageResult = document.getElementById('imageResult');
+const imageSizeInfo = document.getElementById('imageSizeInfo');
 const textInput = document.getElementById('textInput');
 const sentimentBtn = document.getElementById('sentimentBtn');
 const sentimentResult = document.getElementById('sentimentResult');
@@ -21,12 +22,22 @@ const chatImageBtn = document.getElementById('chatImageBtn');
 const chatImageInput = document.getElementById('chatImageInput');
 const chatImageUpload = document.getElementById('chatImageUpload');
 const chatImagePreview = document.getElementById('chatImagePreview');
+const chatImageSizeInfo = document.getElementById('chatImageSizeInfo');
+const chatImageQuality = document.getElementById('chatImageQuality');
 const removeChatImage = document.getElementById('removeChatImage');
 
 // Chat state
 let chatImageFile = null;
+let chatImagePrepared = null; // Promise of the downscaled chat image (see prepareImageForUpload)
+let uploadPreferences = null; // Preferred upload sizes per endpoint, from /upload_preferences
 let currentSessionId = null;
 
+// WebSocket chat state (HTTP /chat is used whenever the socket is not ready)
+let chatSocket = null;
+let chatSocketReady = false;
+let chatSocketCounter = 0;
+const pendingSocketMessages = new Map();
+
 // Generate a new session ID
 function generateSessionId() {
     return 'session_' + Date.now() + '_' + Math.random().toString(36).substr(2, 9);
@@ -46,6 +57,198 @@ function initNewSession() {
             <small>New session started: ${currentSessionId}</small>
         </div>
     `;
+    
+    connectChatSocket();
+}
+
+// Open a WebSocket bound to the current session
+function connectChatSocket() {
+    if (!('WebSocket' in window) || !currentSessionId) return;
+    
+    if (chatSocket) {
+        chatSocket.onclose = null;
+        chatSocket.close();
+        failPendingSocketMessages('Session changed');
+    }
+    chatSocketReady = false;
+    
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const socket = new WebSocket(`${protocol}//${window.location.host}/ws/chat?session_id=${encodeURIComponent(currentSessionId)}`);
+    socket.onmessage = (event) => handleSocketMessage(JSON.parse(event.data));
+    socket.onclose = () => {
+        chatSocketReady = false;
+        chatSocket = null;
+        failPendingSocketMessages('Connection closed');
+    };
+    chatSocket = socket;
+}
+
+function handleSocketMessage(data) {
+    if (data.type === 'session') {
+        chatSocketReady = true;
+        return;
+    }
+    
+    const pending = pendingSocketMessages.get(data.id);
+    if (!pending) return;
+    
+    if (data.type === 'delta') {
+        pending.onDelta(data.text);
+    } else if (data.type === 'done') {
+        pendingSocketMessages.delete(data.id);
+        pending.resolve(data);
+    } else if (data.type === 'error') {
+        pendingSocketMessages.delete(data.id);
+        pending.reject(new Error(data.detail || 'Chat request failed'));
+    }
+}
+
+function failPendingSocketMessages(reason) {
+    pendingSocketMessages.forEach(pending => pending.reject(new Error(reason)));
+    pendingSocketMessages.clear();
+}
+
+function readFileAsDataURL(file) {
+    return new Promise((resolve, reject) => {
+        const reader = new FileReader();
+        reader.onload = () => resolve(reader.result);
+        reader.onerror = () => reject(reader.error);
+        reader.readAsDataURL(file);
+    });
+}
+
+// Fetch the image sizes and encoding the server prefers for each endpoint
+async function loadUploadPreferences() {
+    try {
+        const response = await fetch('/upload_preferences');
+        if (response.ok) {
+            uploadPreferences = await response.json();
+            if (uploadPreferences.chat && uploadPreferences.chat.default_tier) {
+                chatImageQuality.value = uploadPreferences.chat.default_tier;
+            }
+        }
+    } catch (error) {
+        console.warn('Upload preferences unavailable; images will be sent unchanged.', error);
+    }
+}
+
+function formatBytes(bytes) {
+    if (bytes < 1024) return `${bytes} B`;
+    if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(0)} KB`;
+    return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
+}
+
+// Downscale and re-encode an image in the browser to the size the endpoint prefers
+// (or to longestSide, when given). Resolves to
+// { file, originalSize, resized, width, height, originalWidth, originalHeight }.
+async function prepareImageForUpload(file, endpoint, longestSide = null) {
+    const endpointPrefs = uploadPreferences && uploadPreferences[endpoint];
+    const prefs = endpointPrefs && longestSide ? { ...endpointPrefs, longest_side: longestSide } : endpointPrefs;
+    if (!prefs || typeof createImageBitmap !== 'function') {
+        return { file, originalSize: file.size, resized: false };
+    }
+    
+    const bitmap = await createImageBitmap(file);
+    const originalWidth = bitmap.width;
+    const originalHeight = bitmap.height;
+    let scale = 1;
+    if (prefs.shortest_side) {
+        scale = Math.min(scale, prefs.shortest_side / Math.min(originalWidth, originalHeight));
+    }
+    if (prefs.longest_side) {
+        scale = Math.min(scale, prefs.longest_side / Math.max(originalWidth, originalHeight));
+    }
+    const width = Math.max(1, Math.round(originalWidth * scale));
+    const height = Math.max(1, Math.round(originalHeight * scale));
+    
+    let canvas;
+    if (typeof OffscreenCanvas !== 'undefined') {
+        canvas = new OffscreenCanvas(width, height);
+    } else {
+        canvas = document.createElement('canvas');
+        canvas.width = width;
+        canvas.height = height;
+    }
+    const ctx = canvas.getContext('2d');
+    ctx.imageSmoothingQuality = 'high';
+    ctx.fillStyle = '#fff'; // JPEG has no alpha; flatten transparent PNGs onto white
+    ctx.fillRect(0, 0, width, height);
+    ctx.drawImage(bitmap, 0, 0, width, height);
+    bitmap.close();
+    
+    const blob = canvas.convertToBlob
+        ? await canvas.convertToBlob({ type: prefs.type, quality: prefs.quality })
+        : await new Promise(resolve => canvas.toBlob(resolve, prefs.type, prefs.quality));
+    
+    // Keep the original if it is already small enough and re-encoding would not shrink it
+    if (!blob || (scale === 1 && blob.size >= file.size)) {
+        return { file, originalSize: file.size, resized: false, width: originalWidth, height: originalHeight };
+    }
+    const name = file.name.replace(/\.[^.]+$/, '') + '.jpg';
+    return {
+        file: new File([blob], name, { type: blob.type }),
+        originalSize: file.size,
+        resized: true,
+        width, height, originalWidth, originalHeight
+    };
+}
+
+// Longest edge to send a chat image at: the chosen tier's, or the advertised default
+function chatImageLongestSide(quality) {
+    const prefs = uploadPreferences && uploadPreferences.chat;
+    if (!prefs || !prefs.tiers || quality === prefs.default_tier) {
+        return null;
+    }
+    return prefs.tiers[quality] || null;
+}
+
+// Check the prepared image against the server limit and describe the size change
+function describePreparedImage(prepared, infoElement) {
+    const maxBytes = (uploadPreferences && uploadPreferences.max_upload_bytes) || 10 * 1024 * 1024;
+    if (prepared.file.size > maxBytes) {
+        throw new Error(`Image must be smaller than ${formatBytes(maxBytes)}.`);
+    }
+    infoElement.textContent = prepared.resized
+        ? `${formatBytes(prepared.originalSize)} → ${formatBytes(prepared.file.size)} ` +
+          `(${prepared.originalWidth}×${prepared.originalHeight} → ${prepared.width}×${prepared.height})`
+        : `${formatBytes(prepared.file.size)} (sent as is)`;
+    return prepared;
+}
+
+// Send a chat message over the WebSocket; onDelta receives streamed text
+async function sendChatMessageSocket(message, imageFile, onDelta) {
+    const payload = { type: 'message', id: ++chatSocketCounter, message: message };
+    if (imageFile) {
+        payload.image = await readFileAsDataURL(imageFile);
+        payload.quality = chatImageQuality.value;
+    }
+    
+    return new Promise((resolve, reject) => {
+        pendingSocketMessages.set(payload.id, { resolve, reject, onDelta });
+        chatSocket.send(JSON.stringify(payload));
+    });
+}
+
+// Send a chat message with a regular HTTP request
+async function sendChatMessageHttp(message, imageFile) {
+    const formData = new FormData();
+    formData.append('message', message);
+    formData.append('session_id', currentSessionId);
+    if (imageFile) {
+        formData.append('image', imageFile);
+        formData.append('quality', chatImageQuality.value);
+    }
+    
+    const response = await fetch('/chat', {
+        method: 'POST',
+        body: formData
+    });
+    
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    
+    return response.json();
 }
 
 // Clear conversation history
@@ -103,6 +306,7 @@ function showNotification(message, type = 'info') {
 // Initialize app
 document.addEventListener('DOMContentLoaded', function() {
     checkServerStatus();
+    loadUploadPreferences();
     setupEventListeners();
     initNewSession(); // Initialize first session
 });
@@ -159,6 +363,7 @@ function setupEventListeners() {
     
     chatImageBtn.addEventListener('click', () => chatImageInput.click());
     chatImageInput.addEventListener('change', handleChatImageSelect);
+    chatImageQuality.addEventListener('change', prepareChatImage);
     removeChatImage.addEventListener('click', removeChatImagePreview);
     
     // Session management buttons
@@ -211,12 +416,6 @@ function handleFile(file) {
         return;
     }
     
-    // Validate file size (max 10MB)
-    if (file.size > 10 * 1024 * 1024) {
-        showNotification('File size must be less than 10MB.', 'error');
-        return;
-    }
-    
     // Show preview
     const reader = new FileReader();
     reader.onload = function(e) {
@@ -227,14 +426,19 @@ function handleFile(file) {
     };
     reader.readAsDataURL(file);
     
-    // Store file for classification
-    imageInput.file = file;
+    // Downscale for classification while the preview is shown
+    imageSizeInfo.textContent = 'Preparing image…';
+    imageInput.prepared = prepareImageForUpload(file, 'predict')
+        .then(prepared => describePreparedImage(prepared, imageSizeInfo));
+    imageInput.prepared.catch(error => {
+        imageSizeInfo.textContent = '';
+        showNotification(error.message, 'error');
+    });
 }
 
 // Classify image
 async function classifyImage() {
-    const file = imageInput.file;
-    if (!file) {
+    if (!imageInput.prepared) {
         showNotification('Please select an image first.', 'error');
         return;
     }
@@ -242,6 +446,7 @@ async function classifyImage() {
     showLoading(true);
     
     try {
+        const file = (await imageInput.prepared).file;
         const formData = new FormData();
         formData.append('file', file);
         
@@ -375,7 +580,8 @@ function showNotification(message, type = 'info') {
 // Reset image upload
 function resetImageUpload() {
     imageInput.value = '';
-    imageInput.file = null;
+    imageInput.prepared = null;
+    imageSizeInfo.textContent = '';
     imagePreview.style.display = 'none';
     imageResult.style.display = 'none';
     uploadArea.style.display = 'block';
@@ -421,13 +627,8 @@ function handleChatImageSelect(e) {
             return;
         }
         
-        // Validate file size (max 5MB for chat)
-        if (file.size > 5 * 1024 * 1024) {
-            showNotification('Image size must be less than 5MB.', 'error');
-            return;
-        }
-        
         chatImageFile = file;
+        prepareChatImage();
         
         // Show preview
         const reader = new FileReader();
@@ -439,8 +640,27 @@ function handleChatImageSelect(e) {
     }
 }
 
+// Downscale the selected chat image to the chosen quality tier
+function prepareChatImage() {
+    if (!chatImageFile) {
+        return;
+    }
+    chatImageSizeInfo.textContent = 'Preparing image…';
+    const prepared = prepareImageForUpload(chatImageFile, 'chat', chatImageLongestSide(chatImageQuality.value))
+        .then(result => describePreparedImage(result, chatImageSizeInfo));
+    chatImagePrepared = prepared;
+    prepared.catch(error => {
+        if (chatImagePrepared === prepared) {
+            removeChatImagePreview();
+            showNotification(error.message, 'error');
+        }
+    });
+}
+
 function removeChatImagePreview() {
     chatImageFile = null;
+    chatImagePrepared = null;
+    chatImageSizeInfo.textContent = '';
     chatImageUpload.style.display = 'none';
     chatImageInput.value = '';
 }
@@ -519,6 +739,16 @@ async function sendChatMessage() {
         initNewSession();
     }
     
+    // Use the downscaled image prepared when it was selected
+    let imageFile = null;
+    if (chatImagePrepared) {
+        try {
+            imageFile = (await chatImagePrepared).file;
+        } catch (error) {
+            return; // already reported when preparing failed
+        }
+    }
+    
     // Add user message to chat
     const userImageUrl = chatImageFile ? URL.createObjectURL(chatImageFile) : null;
     addChatMessage(message || '(Image)', true, userImageUrl);
@@ -530,32 +760,36 @@ async function sendChatMessage() {
     const thinkingIndicator = showThinkingIndicator();
     
     try {
-        // Prepare form data
-        const formData = new FormData();
-        formData.append('message', message);
-        formData.append('session_id', currentSessionId);
-        if (chatImageFile) {
-            formData.append('image', chatImageFile);
-        }
-        
-        // Send request
-        const response = await fetch('/chat', {
-            method: 'POST',
-            body: formData
-        });
+        let result;
         
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
+        if (chatSocket && chatSocketReady) {
+            // Stream the reply into a message bubble as it is generated
+            let streamedText = null;
+            result = await sendChatMessageSocket(message, imageFile, (delta) => {
+                if (!streamedText) {
+                    removeThinkingIndicator();
+                    streamedText = addChatMessage('', false).querySelector('.message-bubble div');
+                }
+                streamedText.textContent += delta;
+                chatMessages.scrollTop = chatMessages.scrollHeight;
+            });
+            
+            removeThinkingIndicator();
+            if (streamedText) {
+                streamedText.textContent = result.response;
+            } else {
+                addChatMessage(result.response, false);
+            }
+        } else {
+            result = await sendChatMessageHttp(message, imageFile);
+            
+            // Remove thinking indicator
+            removeThinkingIndicator();
+            
+            // Add assistant response
+            addChatMessage(result.response, false);
         }
         
-        const result = await response.json();
-        
-        // Remove thinking indicator
-        removeThinkingIndicator();
-        
-        // Add assistant response
-        addChatMessage(result.response, false);
-        
         // Update session info
         document.getElementById('sessionId').textContent = result.session_id.substring(0, 20) + '...';
         
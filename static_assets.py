@@ -0,0 +1,145 @@
+"""
+In-memory, pre-compressed serving of the frontend assets in static/.
+• Every file is read once at startup and compressed with gzip (and brotli when the
+  `brotli` package is installed), so a page load never touches the disk.
+• Each representation has a strong ETag; `If-None-Match` revalidation returns 304.
+• index.html is rewritten to reference `/static/<file>?v=<hash>`, which lets the
+  assets themselves be cached as immutable while the HTML is always revalidated.
+• Set STATIC_HOT_RELOAD=1 during development to pick up edits without a restart.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response
+
+from http_encoding import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # optional: gzip-only when brotli is not installed
+    brotli = None
+
+HOT_RELOAD = os.environ.get("STATIC_HOT_RELOAD", "0") == "1"
+MIN_COMPRESS_SIZE = 256  # bytes; smaller files are served as-is
+HTML_CACHE_CONTROL = "no-cache"
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class StaticAsset:
+    """One file held in memory with its pre-compressed variants."""
+
+    def __init__(self, name: str, body: bytes, media_type: str, cache_control: str):
+        self.name = name
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self.digest = hashlib.sha256(body).hexdigest()[:20]
+        # encoding -> (body, etag); identity is always present
+        self.variants: Dict[str, Tuple[bytes, str]] = {"identity": (body, f'"{self.digest}"')}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(gzipped) < len(body):
+                self.variants["gzip"] = (gzipped, f'"{self.digest}-gzip"')
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.variants["br"] = (compressed, f'"{self.digest}-br"')
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison as required for If-None-Match (RFC 9110 §13.1.2)."""
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class StaticAssetStore:
+    """Loads a directory of frontend assets into memory and serves them."""
+
+    def __init__(self, directory: str, index: str = "index.html", hot_reload: bool = HOT_RELOAD):
+        self.directory = directory
+        self.index = index
+        self.hot_reload = hot_reload
+        self.assets: Dict[str, StaticAsset] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def _scan(self) -> Dict[str, float]:
+        mtimes = {}
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                mtimes[name] = os.stat(path).st_mtime
+        return mtimes
+
+    def load(self) -> None:
+        """(Re)load every file; non-HTML assets first so index.html can be fingerprinted."""
+        mtimes = self._scan()
+        assets: Dict[str, StaticAsset] = {}
+        for name in sorted(mtimes, key=lambda n: n == self.index):
+            with open(os.path.join(self.directory, name), "rb") as f:
+                body = f.read()
+            media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            if media_type.startswith("text/") or media_type in ("application/javascript", "application/json"):
+                media_type += "; charset=utf-8"
+            if name == self.index:
+                body = self._fingerprint(body, assets)
+                assets[name] = StaticAsset(name, body, media_type, HTML_CACHE_CONTROL)
+            else:
+                assets[name] = StaticAsset(name, body, media_type, ASSET_CACHE_CONTROL)
+        self.assets = assets
+        self._mtimes = mtimes
+
+    @staticmethod
+    def _fingerprint(html: bytes, assets: Dict[str, StaticAsset]) -> bytes:
+        for name, asset in assets.items():
+            html = html.replace(f'"/static/{name}"'.encode(), f'"/static/{name}?v={asset.digest}"'.encode())
+        return html
+
+    def _maybe_reload(self) -> None:
+        if self.hot_reload and self._scan() != self._mtimes:
+            with self._lock:
+                if self._scan() != self._mtimes:
+                    self.load()
+
+    def get(self, name: str) -> Optional[StaticAsset]:
+        self._maybe_reload()
+        return self.assets.get(name)
+
+    def response(self, name: str, request: Request) -> Response:
+        """Build the response for `name`, negotiating encoding and handling 304s."""
+        asset = self.get(name)
+        if asset is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+
+        encoding = "identity"
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        for candidate in ("br", "gzip"):
+            if candidate in asset.variants and candidate in accepted:
+                encoding = candidate
+                break
+        body, etag = asset.variants[encoding]
+
+        headers = {"ETag": etag, "Cache-Control": asset.cache_control, "Vary": "Accept-Encoding"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        if request.method == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            return Response(status_code=200, headers=headers, media_type=asset.media_type)
+        return Response(content=body, status_code=200, headers=headers, media_type=asset.media_type)
@@ -0,0 +1,142 @@
+"""
+Rolling summarization of old conversation turns (opt-in with CHAT_SUMMARIZE=1).
+• Once a session has more than SUMMARIZE_AFTER unsummarized messages, all but the newest
+  SUMMARY_KEEP_RECENT are folded, together with the previous summary, into a short
+  summary that server.py sends as a system message in place of those turns.
+• Compaction runs in the background, only after the chat model has been idle for
+  SUMMARY_IDLE_SECONDS, and holds a low-weight admission slot while it generates.
+• Folded messages are only flagged `"summarized": true`; /chat/history still returns them.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CHAT_SUMMARIZE = os.environ.get("CHAT_SUMMARIZE", "0") == "1"
+SUMMARIZE_AFTER = int(os.environ.get("SUMMARIZE_AFTER", "12"))  # unsummarized messages
+SUMMARY_KEEP_RECENT = int(os.environ.get("SUMMARY_KEEP_RECENT", "6"))  # always sent verbatim
+SUMMARY_IDLE_SECONDS = float(os.environ.get("SUMMARY_IDLE_SECONDS", "2"))
+SUMMARY_MAX_CHARS = 2000
+SUMMARY_WEIGHT = 0.1  # fair-queue share; interactive chat always goes first
+
+# summarize(previous_summary or None, messages to fold) -> new summary text
+Summarize = Callable[[Optional[str], List[Dict[str, Any]]], str]
+
+
+def message_text(message: Dict[str, Any]) -> str:
+    """Plain text of a history message, with images shown as [image]."""
+    parts = []
+    for item in message["content"]:
+        if item.get("type") == "text":
+            parts.append(item.get("text", ""))
+        elif item.get("type") == "image":
+            parts.append("[image]")
+    return " ".join(parts)
+
+
+def transcript(messages: List[Dict[str, Any]]) -> str:
+    return "\n".join(f"{m['role'].capitalize()}: {message_text(m)}" for m in messages)
+
+
+class ConversationSummarizer:
+    """Background compaction of conversation histories into per-session summaries."""
+
+    def __init__(
+        self,
+        histories: Dict[str, List[Dict[str, Any]]],
+        summarize: Summarize,
+        admission,
+        after: int = SUMMARIZE_AFTER,
+        keep_recent: int = SUMMARY_KEEP_RECENT,
+        idle_seconds: float = SUMMARY_IDLE_SECONDS,
+        poll_interval: float = 0.5,
+    ):
+        self.histories = histories
+        self.summarize = summarize
+        self.admission = admission
+        self.after = after
+        self.keep_recent = keep_recent
+        self.idle_seconds = idle_seconds
+        self.poll_interval = poll_interval
+        self.summaries: Dict[str, str] = {}
+        self._pending: "OrderedDict[str, None]" = OrderedDict()
+        self._busy_at = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        metrics.gauge("chat.summary.pending_sessions", lambda: len(self._pending))
+
+    def foldable(self, session_id: str) -> List[Dict[str, Any]]:
+        """Messages that the next compaction of this session would fold."""
+        unsummarized = [m for m in self.histories.get(session_id, []) if not m.get("summarized")]
+        if len(unsummarized) <= self.after:
+            return []
+        return unsummarized[: len(unsummarized) - self.keep_recent]
+
+    def note_turn(self, session_id: str) -> None:
+        """Queue the session for compaction if it has grown past the threshold."""
+        if self.foldable(session_id):
+            self._pending[session_id] = None
+
+    def forget(self, session_id: str) -> None:
+        self.summaries.pop(session_id, None)
+        self._pending.pop(session_id, None)
+
+    def system_message(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The summary as a system message to put in front of the prompt, if any."""
+        summary = self.summaries.get(session_id)
+        if not summary:
+            return None
+        return {"role": "system", "content": [{"type": "text", "text": f"Summary of the earlier conversation: {summary}"}]}
+
+    async def compact(self, session_id: str) -> bool:
+        """Fold this session's old turns into its summary now; returns whether it did."""
+        history = self.histories.get(session_id)
+        messages = self.foldable(session_id)
+        if not messages:
+            return False
+        async with self.admission.slot(session_id, "summarizer", weight=SUMMARY_WEIGHT, rate_limited=False):
+            summary = await asyncio.to_thread(self.summarize, self.summaries.get(session_id), messages)
+        if self.histories.get(session_id) is not history:
+            return False  # cleared while we were summarizing
+        summary = summary.strip()[:SUMMARY_MAX_CHARS]
+        if not summary:
+            raise ValueError("summarizer returned an empty summary")
+        self.summaries[session_id] = summary
+        for message in messages:
+            message["summarized"] = True
+        metrics.inc("chat.summary.runs")
+        metrics.inc("chat.summary.messages_folded", len(messages))
+        return True
+
+    def _idle(self) -> bool:
+        now = time.monotonic()
+        if self.admission.active or self.admission.queue_depth:
+            self._busy_at = now
+        return now - self._busy_at >= self.idle_seconds
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if not self._pending or not self._idle():
+                continue
+            session_id, _ = self._pending.popitem(last=False)
+            try:
+                await self.compact(session_id)
+            except Exception as e:
+                metrics.inc("chat.summary.failed")
+                logger.error("Summarizing session %s... failed: %s", session_id[:8], e)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
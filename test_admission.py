@@ -0,0 +1,115 @@
+"""
+Tests for chat admission control (admission.py)
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from admission import AdmissionRejected, FairAdmission, TokenBucket
+
+
+def _admission(**kwargs):
+    defaults = dict(concurrency=1, max_queue=100, max_queue_per_session=100, max_wait=5,
+                    session_rate=1000, session_burst=1000, client_rate=1000, client_burst=1000)
+    defaults.update(kwargs)
+    return FairAdmission(**defaults)
+
+
+def test_token_bucket_refills_over_time():
+    bucket = TokenBucket(rate=2, burst=2, now=0)
+    assert bucket.try_acquire(0) == 0
+    assert bucket.try_acquire(0) == 0
+    assert bucket.try_acquire(0) == 0.5  # one token every 0.5 s
+    assert bucket.try_acquire(0.5) == 0
+
+
+def test_session_rate_limit_rejects_with_retry_after():
+    async def scenario():
+        admission = _admission(session_rate=1, session_burst=1)
+        async with admission.slot("s1", "c1"):
+            pass
+        try:
+            await admission.acquire("s1", "c1")
+        except AdmissionRejected as e:
+            return e
+        return None
+
+    rejected = asyncio.run(scenario())
+    assert rejected is not None
+    assert rejected.retry_after_header == "1"
+
+
+def test_rate_checked_before_the_slot_is_charged_once():
+    """Callers that may reply without a slot (degraded chat) check the rate up front."""
+    async def scenario():
+        admission = _admission(client_rate=1, client_burst=2)
+        admission.check_rate("s1", "c1")
+        async with admission.slot("s1", "c1", rate_limited=False):
+            pass
+        admission.check_rate("s2", "c1")  # a degraded reply: no slot, still charged
+        try:
+            admission.check_rate("s3", "c1")
+        except AdmissionRejected as e:
+            return e.reason
+        return None
+
+    assert asyncio.run(scenario()) == "Too many requests from this client."
+
+
+def test_fair_queue_interleaves_sessions():
+    """A session arriving behind a heavy session's backlog is served next, not last."""
+    order = []
+
+    async def request(admission, session_id, tag):
+        async with admission.slot(session_id, "client"):
+            order.append(tag)
+            await asyncio.sleep(0)
+
+    async def scenario():
+        admission = _admission()
+        await admission.acquire("heavy", "client")  # occupy the only slot
+        tasks = [asyncio.create_task(request(admission, "heavy", f"heavy{i}")) for i in range(4)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request(admission, "light", "light0")))
+        await asyncio.sleep(0)
+        admission.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert order.index("light0") <= 1, order
+
+
+def test_queue_bounds_and_timeout():
+    async def scenario():
+        admission = _admission(max_queue=1, max_wait=0.05)
+        await admission.acquire("a", "c")
+        waiter = asyncio.create_task(admission.acquire("b", "c"))
+        await asyncio.sleep(0)
+        try:
+            await admission.acquire("c", "c")
+            full = None
+        except AdmissionRejected as e:
+            full = e.reason
+        try:
+            await waiter
+            timed_out = None
+        except AdmissionRejected as e:
+            timed_out = e.reason
+        return full, timed_out, admission.queue_depth
+
+    full, timed_out, depth = asyncio.run(scenario())
+    assert full and "full" in full
+    assert timed_out and "Timed out" in timed_out
+    assert depth == 0
+
+
+if __name__ == "__main__":
+    test_token_bucket_refills_over_time()
+    test_session_rate_limit_rejects_with_retry_after()
+    test_rate_checked_before_the_slot_is_charged_once()
+    test_fair_queue_interleaves_sessions()
+    test_queue_bounds_and_timeout()
+    print("✓ All admission tests passed")
@@ -0,0 +1,68 @@
+"""
+Tests for the offline model bundle (bundle.py)
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bundle import BUNDLE_FORMAT, CURRENT, MANIFEST, ModelBundle, _file_hashes
+
+
+def _bundle(files):
+    """Write a bundle version with `files` ({relative path: bytes}) and a matching manifest."""
+    root = tempfile.mkdtemp(prefix="bundle_")
+    path = os.path.join(root, "v1")
+    for name, content in files.items():
+        os.makedirs(os.path.dirname(os.path.join(path, name)), exist_ok=True)
+        with open(os.path.join(path, name), "wb") as f:
+            f.write(content)
+    with open(os.path.join(path, MANIFEST), "w") as f:
+        json.dump({"format": BUNDLE_FORMAT, "version": "v1", "files": _file_hashes(path)}, f)
+    with open(os.path.join(root, CURRENT), "w") as f:
+        f.write("v1")
+    return root
+
+
+def test_verify_reports_missing_and_modified_files():
+    root = _bundle({"imagenet_classes.txt": b"tench\ngoldfish\n", "sentiment/config.json": b"{}"})
+    bundle = ModelBundle(root)
+    assert bundle.version == "v1" and bundle.verify() == {}
+    assert bundle.chat_dir is None
+
+    os.remove(bundle.file("sentiment/config.json"))
+    with open(bundle.labels_path, "ab") as f:
+        f.write(b"shark\n")
+    assert bundle.verify() == {"sentiment/config.json": "missing", "imagenet_classes.txt": "modified"}
+
+
+def test_resnet18_round_trips_through_safetensors_onto_real_tensors():
+    torch = pytest.importorskip("torch")
+    models = pytest.importorskip("torchvision.models")
+    save_file = pytest.importorskip("safetensors.torch").save_file
+
+    torch.manual_seed(0)
+    source = models.resnet18(weights=None).eval()
+    state = {k: v.contiguous() for k, v in source.state_dict().items()}
+    root = _bundle({})
+    version = os.path.join(root, "v1")
+    save_file(state, os.path.join(version, "resnet18.safetensors"))
+
+    model = ModelBundle(root).load_resnet18(torch.device("cpu"))
+    loaded = model.state_dict()
+    assert not any(t.is_meta for t in loaded.values())  # assign=True replaced every meta tensor
+    assert all(torch.equal(loaded[k], state[k]) for k in state)
+    x = torch.randn(1, 3, 224, 224)
+    with torch.no_grad():
+        assert torch.allclose(model(x), source(x))
+
+
+if __name__ == "__main__":
+    test_verify_reports_missing_and_modified_files()
+    test_resnet18_round_trips_through_safetensors_onto_real_tensors()
+    print("✓ All bundle tests passed")
@@ -0,0 +1,45 @@
+"""
+Tests for the chat image resolution tiers (chat_images.py)
+"""
+
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from chat_images import TIERS, fit_image, get_tier
+
+
+def test_fit_image_only_downscales_to_tier_edge():
+    photo = Image.new("RGB", (4032, 3024))
+    assert fit_image(photo, TIERS["fast"]).size == (384, 288)
+    assert fit_image(photo, TIERS["balanced"]).size == (768, 576)
+    assert fit_image(photo, TIERS["detailed"]).size == (1536, 1152)
+
+    small = Image.new("RGB", (300, 200))
+    assert fit_image(small, TIERS["detailed"]) is small
+
+
+def test_tiles_bound_vision_tokens_per_tier():
+    size = (4032, 3024)
+    assert TIERS["fast"].tiles(size) == 1
+    assert TIERS["balanced"].tiles(size) == 2 * 2 + 1
+    assert TIERS["detailed"].tiles(size) == 4 * 3 + 1
+    assert TIERS["fast"].processor_kwargs() == {"do_image_splitting": False, "size": {"longest_edge": 384}}
+
+
+def test_get_tier_defaults_and_rejects_unknown():
+    assert get_tier(None).name == os.environ.get("CHAT_IMAGE_TIER", "balanced")
+    assert get_tier("detailed") is TIERS["detailed"]
+    with pytest.raises(ValueError):
+        get_tier("ultra")
+
+
+if __name__ == "__main__":
+    test_fit_image_only_downscales_to_tier_edge()
+    test_tiles_bound_vision_tokens_per_tier()
+    test_get_tier_defaults_and_rejects_unknown()
+    print("✓ All chat image tier tests passed")
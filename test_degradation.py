@@ -0,0 +1,54 @@
+"""
+Tests for overload degradation (degradation.py)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from degradation import DegradationPolicy, keyword_sentiment, rule_based_chat_response
+from metrics import metrics
+
+
+def test_thresholds_pick_a_reason():
+    policy = DegradationPolicy("test_chat", mode="auto", max_queue_depth=4, max_predicted_wait=10)
+    assert policy.reason(queue_depth=3, predicted_wait=9) is None
+    assert policy.reason(queue_depth=4, predicted_wait=0) == "queue_depth"
+    assert policy.reason(queue_depth=0, predicted_wait=12) == "predicted_wait"
+
+
+def test_modes_override_load():
+    assert DegradationPolicy("test_off", mode="off", max_inflight=1).reason(inflight=100) is None
+    assert DegradationPolicy("test_always", mode="always", max_inflight=1).reason(inflight=0) == "forced"
+    try:
+        DegradationPolicy("test_bad", mode="sometimes")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("invalid mode accepted")
+
+
+def test_check_counts_decisions():
+    policy = DegradationPolicy("test_count", mode="auto", max_inflight=2)
+    policy.check(inflight=0)
+    policy.check(inflight=2)
+    policy.check(inflight=5)
+    assert metrics.get("test_count.full_model") == 1
+    assert metrics.get("test_count.degraded.inflight") == 2
+
+
+def test_cheap_responders():
+    assert rule_based_chat_response("Hello!", False).startswith("Hello!")
+    assert "image" in rule_based_chat_response("what is this", True)
+    assert keyword_sentiment("I love this, it's great")["label"] == "POSITIVE"
+    assert keyword_sentiment("This is terrible")["label"] == "NEGATIVE"
+    assert keyword_sentiment("It is a chair")["label"] == "NEUTRAL"
+
+
+if __name__ == "__main__":
+    test_thresholds_pick_a_reason()
+    test_modes_override_load()
+    test_check_counts_decisions()
+    test_cheap_responders()
+    print("✓ All degradation tests passed")
@@ -0,0 +1,79 @@
+"""
+Tests for response compression and encoding negotiation (http_encoding.py)
+"""
+
+import gzip
+import os
+import sys
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import http_encoding
+from http_encoding import CompressionMiddleware, JSONResponse, accepted_encodings, choose_encoding
+
+BIG = {"items": [{"id": i, "text": "hello world"} for i in range(200)]}
+
+
+def _client(minimum_size=1024):
+    app = FastAPI(default_response_class=JSONResponse)
+    app.add_middleware(CompressionMiddleware, minimum_size=minimum_size)
+    app.get("/big")(lambda: BIG)
+    app.get("/small")(lambda: {"ok": True})
+    app.get("/png")(lambda: PlainTextResponse(b"\x89PNG" * 1000, media_type="image/png"))
+    app.get("/stream")(lambda: StreamingResponse(iter([b"x" * 2000, b"y" * 2000]), media_type="text/plain"))
+    app.get("/encoded")(lambda: PlainTextResponse(
+        gzip.compress(b"a" * 5000), headers={"Content-Encoding": "gzip"}, media_type="text/plain"
+    ))
+    return TestClient(app)
+
+
+def test_accept_encoding_q_values():
+    assert accepted_encodings("gzip, deflate;q=0.5, br;q=0, identity") == ["gzip", "deflate", "identity"]
+    assert accepted_encodings("GZIP;q=1.0, *;q=bogus") == ["gzip"]
+    assert choose_encoding("br;q=0, gzip;q=0.1") == "gzip"
+    assert choose_encoding("gzip;q=0, deflate") is None
+    assert choose_encoding("") is None
+
+
+def test_brotli_is_preferred_over_gzip_when_available():
+    pytest.importorskip("brotli")
+    assert choose_encoding("gzip, br") == "br"
+    response = _client().get("/big", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br" and response.json() == BIG
+
+
+def test_large_json_is_gzipped_with_vary():
+    response = _client().get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(http_encoding.dumps(BIG))
+    assert response.json() == BIG  # decoded by the client
+
+
+def test_small_streamed_binary_and_encoded_responses_pass_through():
+    client = _client()
+    for path in ("/small", "/png", "/stream"):
+        response = client.get(path, headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers, path
+    assert client.get("/stream", headers={"Accept-Encoding": "gzip"}).text == "x" * 2000 + "y" * 2000
+
+    # Already-encoded bodies are not compressed twice
+    encoded = client.get("/encoded", headers={"Accept-Encoding": "gzip"})
+    assert encoded.headers["content-encoding"] == "gzip" and encoded.text == "a" * 5000
+
+    # Without Accept-Encoding nothing is compressed, whatever the size
+    assert "content-encoding" not in client.get("/big", headers={"Accept-Encoding": "identity"}).headers
+    assert "content-encoding" in _client(minimum_size=1).get("/small", headers={"Accept-Encoding": "gzip"}).headers
+
+
+if __name__ == "__main__":
+    test_accept_encoding_q_values()
+    test_brotli_is_preferred_over_gzip_when_available()
+    test_large_json_is_gzipped_with_vary()
+    test_small_streamed_binary_and_encoded_responses_pass_through()
+    print("✓ All http encoding tests passed")
@@ -0,0 +1,129 @@
+"""
+Tests for the SQLite job queue and worker pool (jobs.py)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from jobs import JobStore, JobWorkerPool, RetryLater
+
+
+def _store():
+    return JobStore(os.path.join(tempfile.mkdtemp(), "jobs.sqlite3"))
+
+
+def test_claim_batches_oldest_type_first():
+    store = _store()
+    first = store.submit("classify", {"n": 1})
+    store.submit("chat", {"n": 2})
+    third = store.submit("classify", {"n": 3})
+
+    batch = store.claim(["chat", "classify"], limit=8)
+    assert [job.id for job in batch] == [first, third]
+    assert all(job.status == "running" for job in batch)
+    assert [job.type for job in store.claim(["chat", "classify"], limit=8)] == ["chat"]
+    assert store.claim(["chat", "classify"], limit=8) == []
+
+
+def test_per_type_batch_sizes():
+    store = _store()
+    chats = [store.submit("chat", {"n": n}) for n in range(3)]
+    store.submit("classify", {"n": 3})
+    limits = {"chat": 1}
+    assert [job.id for job in store.claim(["chat", "classify"], 8, limits)] == chats[:1]
+    assert [job.id for job in store.claim(["chat", "classify"], 8, limits)] == chats[1:2]
+    store.complete(chats[2], None)  # finished elsewhere
+    assert [job.type for job in store.claim(["chat", "classify"], 8, limits)] == ["classify"]
+
+
+def test_results_survive_reopen_and_running_jobs_recover():
+    path = os.path.join(tempfile.mkdtemp(), "jobs.sqlite3")
+    store = JobStore(path)
+    done = store.submit("chat", {"message": "hi"})
+    interrupted = store.submit("chat", {"message": "long"})
+    store.claim(["chat"], limit=1)
+    store.complete(done, {"response": "hello"})
+    store.claim(["chat"], limit=1)  # never finishes: the process "dies"
+
+    reopened = JobStore(path)
+    assert reopened.get(done).result == {"response": "hello"}
+    assert reopened.get(done).payload is None  # inputs are dropped once finished
+    assert reopened.recover() == 1
+    assert reopened.get(interrupted).status == "queued"
+
+
+def test_pool_runs_batches_and_retries():
+    store = _store()
+    seen_batches = []
+    attempts = {}
+
+    async def handler(batch, progress):
+        seen_batches.append(len(batch))
+        results = []
+        for job in batch:
+            attempts[job.id] = attempts.get(job.id, 0) + 1
+            progress(job.id, 0.5)
+            if job.payload["n"] == 0 and attempts[job.id] == 1:
+                results.append(RetryLater("busy", 0))
+            elif job.payload["n"] < 0:
+                results.append(ValueError("negative"))
+            else:
+                results.append({"double": job.payload["n"] * 2})
+        return results
+
+    async def scenario():
+        ids = [store.submit("math", {"n": n}) for n in (0, 1, 2, -1)]
+        pool = JobWorkerPool(store, {"math": handler}, workers=1, batch_size=8, poll_interval=0.01)
+        pool.start()
+        for _ in range(200):
+            if all(store.get(i).status in ("done", "failed") for i in ids):
+                break
+            await asyncio.sleep(0.01)
+        await pool.stop()
+        return [store.get(i) for i in ids]
+
+    retried, one, two, negative = asyncio.run(scenario())
+    assert seen_batches[0] == 4  # all four claimed together
+    assert retried.status == "done" and retried.result == {"double": 0}
+    assert one.result == {"double": 2} and one.progress == 1
+    assert negative.status == "failed" and negative.error == "negative"
+
+
+def test_progress_and_results_are_written_off_the_event_loop():
+    store = _store()
+    writers = []
+    for name in ("progress", "complete"):
+        method = getattr(store, name)
+        setattr(store, name, lambda *args, method=method: (writers.append(threading.current_thread()), method(*args))[1])
+
+    async def handler(batch, progress):
+        for step in range(1, 4):
+            progress(batch[0].id, step / 4, {"partial": step})
+        return [{"done": True}]
+
+    async def scenario():
+        job_id = store.submit("work", {})
+        pool = JobWorkerPool(store, {"work": handler}, workers=1, poll_interval=0.01)
+        pool.start()
+        while store.get(job_id).status != "done":
+            await asyncio.sleep(0.01)
+        await pool.stop()
+        return store.get(job_id)
+
+    job = asyncio.run(scenario())
+    assert len(writers) == 4 and threading.main_thread() not in writers
+    assert job.result == {"done": True} and job.progress == 1  # the result lands after every progress write
+
+
+if __name__ == "__main__":
+    test_claim_batches_oldest_type_first()
+    test_per_type_batch_sizes()
+    test_results_survive_reopen_and_running_jobs_recover()
+    test_pool_runs_batches_and_retries()
+    test_progress_and_results_are_written_off_the_event_loop()
+    print("✓ All job tests passed")
@@ -0,0 +1,67 @@
+"""
+Tests for queue-based, sampled request logging (logging_setup.py)
+"""
+
+import json
+import logging
+import os
+import queue
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import logging_setup
+from logging_setup import LazyQueueHandler, StructuredFormatter, log_request, parse_sample_rates
+from metrics import metrics
+
+
+class CountingStr:
+    def __init__(self):
+        self.calls = 0
+
+    def __str__(self):
+        self.calls += 1
+        return "rendered"
+
+
+def _queued_logger(name, size=100):
+    records = queue.Queue(size)
+    logger = logging.Logger(name)
+    logger.addHandler(LazyQueueHandler(records))
+    return logger, records
+
+
+def test_records_are_queued_unformatted_and_rendered_with_truncated_fields():
+    logger, records = _queued_logger("test.lazy")
+    value = CountingStr()
+    logger.info("value is %s", value, extra={"fields": {"user": "x" * 500, "confidence": 0.25}})
+    record = records.get_nowait()
+    assert value.calls == 0 and record.args == (value,)  # nothing formatted on the caller's thread
+
+    text = StructuredFormatter(max_chars=10).format(record)
+    assert text == "INFO:test.lazy:value is rendered | user='xxxxxxxxxx…(+490 chars)' confidence=0.25"
+    line = json.loads(StructuredFormatter(json_lines=True, max_chars=10).format(record))
+    assert line["message"] == "value is rendered" and line["user"].startswith("xxxxxxxxxx…")
+
+
+def test_sampling_and_full_queue_never_block():
+    logger, records = _queued_logger("test.sampling", size=2)
+    assert parse_sample_rates("predict=0.01, chat=0 ,*=1") == {"predict": 0.01, "chat": 0.0, "*": 1.0}
+    logging_setup.LOG_SAMPLE["test_off"] = 0.0
+
+    for _ in range(5):
+        log_request(logger, "test_off", "dropped by sampling")
+    assert records.empty()
+
+    dropped = metrics.get("logging.dropped")
+    for _ in range(5):
+        log_request(logger, "test_on", "kept", n=1)
+    assert records.qsize() == 2 and metrics.get("logging.dropped") == dropped + 3
+    logger.error("errors are never sampled")  # queue full: dropped, but still no blocking
+    assert metrics.get("logging.dropped") == dropped + 4
+
+
+if __name__ == "__main__":
+    test_records_are_queued_unformatted_and_rendered_with_truncated_fields()
+    test_sampling_and_full_queue_never_block()
+    print("✓ All logging tests passed")
@@ -0,0 +1,56 @@
+"""
+Tests for the shared prompt-prefix KV cache (prefix_cache.py)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import metrics
+from prefix_cache import PrefixCache
+
+
+def test_longest_strict_prefix_is_shared():
+    cache = PrefixCache(max_tokens=100, min_tokens=2, name="test_share")
+    system = list(range(10))
+    cache.insert(system, "kv-system")
+    cache.insert(system + [50, 51, 52], "kv-turn")
+
+    with cache.lease(system + [50, 51, 52, 53]) as entry:
+        assert entry.kv == "kv-turn" and entry.length == 13
+    with cache.lease(system + [60, 61]) as entry:  # another session, same system prompt
+        assert entry.kv == "kv-system"
+    with cache.lease(system) as entry:  # must leave a token to process
+        assert entry is None
+    with cache.lease([9, 9, 9]) as entry:
+        assert entry is None
+
+    assert metrics.get("test_share.prefix_cache.hits") == 2
+    assert metrics.get("test_share.prefix_cache.prefill_tokens_saved") == 23
+    assert cache.hit_rate() == 0.5
+    assert not cache.insert([1], "too short")
+
+
+def test_lru_eviction_skips_pinned_entries():
+    cache = PrefixCache(max_tokens=30, min_tokens=1, name="test_evict")
+    a, b, c = [1] * 10, [2] * 10, [3] * 10
+    cache.insert(a, "a")
+    cache.insert(b, "b")
+    cache.insert(c, "c")
+
+    with cache.lease(a + [0]) as entry:  # a becomes most recent and is pinned
+        assert entry.refs == 1
+        cache.insert([4] * 10, "d")  # evicts b, the least recently used
+        assert b not in cache and a in cache
+        cache.insert([5] * 25, "e")  # doesn't fit next to the pinned a: everything else goes
+        assert a in cache and len(cache) == 1
+    cache.insert([6] * 25, "f")  # released: now a is evicted like any other entry
+    assert a not in cache and cache.tokens == 25
+    assert entry.refs == 0
+
+
+if __name__ == "__main__":
+    test_longest_strict_prefix_is_shared()
+    test_lru_eviction_skips_pinned_entries()
+    print("✓ All prefix cache tests passed")
@@ -0,0 +1,116 @@
+"""
+Tests for the opt-in request profiler (profiling.py)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import metrics
+from profiling import ProfilingMiddleware, StackSampler
+
+
+async def _noop_app(scope, receive, send):
+    pass
+
+
+def _scope(path="/predict", headers=()):
+    return {"type": "http", "method": "POST", "path": path, "headers": list(headers)}
+
+
+def test_unprofiled_requests_pass_through():
+    """Requests without a token (and with no sampling) are never profiled."""
+    middleware = ProfilingMiddleware(_noop_app, token="secret", sample_rate=0)
+    assert not middleware.should_profile(_scope())
+    assert not middleware.should_profile(_scope(headers=[(b"x-profile-token", b"wrong")]))
+    assert not middleware.should_profile(_scope(path="/health", headers=[(b"x-profile-token", b"secret")]))
+
+
+def test_token_and_sampling_trigger_profiling():
+    """A matching admin token or a sample rate of 1.0 selects the request."""
+    with_token = ProfilingMiddleware(_noop_app, token="secret", sample_rate=0)
+    assert with_token.should_profile(_scope(headers=[(b"x-profile-token", b"secret")]))
+
+    always = ProfilingMiddleware(_noop_app, token="", sample_rate=1.0)
+    assert always.should_profile(_scope(path="/chat"))
+
+
+def test_unprofiled_request_reaches_app_unchanged():
+    """The wrapped app receives the original send callable."""
+    seen = {}
+
+    async def app(scope, receive, send):
+        seen["send"] = send
+
+    async def send(message):
+        pass
+
+    middleware = ProfilingMiddleware(app, token="secret", sample_rate=0)
+    asyncio.run(middleware(_scope(), None, send))
+    assert seen["send"] is send
+
+
+def test_stack_sampler_speedscope_export():
+    """The sampler records stacks of other threads and exports valid speedscope data."""
+    sampler = StackSampler(interval=0.001)
+    sampler.start()
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+    sampler.stop()
+
+    data = sampler.to_speedscope("POST /predict")
+    assert data["profiles"], "expected at least one sampled thread"
+    frame_count = len(data["shared"]["frames"])
+    for profile in data["profiles"]:
+        assert profile["type"] == "sampled"
+        assert len(profile["samples"]) == len(profile["weights"])
+        assert all(0 <= idx < frame_count for stack in profile["samples"] for idx in stack)
+    names = {frame["name"] for frame in data["shared"]["frames"]}
+    assert "test_stack_sampler_speedscope_export" in names
+
+
+def test_overlapping_sampled_requests_profile_one_at_a_time():
+    """A request sampled while another is being profiled is served unprofiled, not failed."""
+    pytest.importorskip("torch")
+
+    async def app(scope, receive, send):
+        await asyncio.sleep(0.05)  # both requests are in flight together
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    middleware = ProfilingMiddleware(app, token="", sample_rate=1.0, output_dir=tempfile.mkdtemp(prefix="profiles_"))
+    skipped = metrics.get("profiling.skipped")
+
+    async def request():
+        started = []
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                started.append(message)
+
+        await middleware(_scope(), None, send)
+        return dict(started[0]["headers"])
+
+    async def both():
+        return await asyncio.gather(request(), request())
+
+    responses = asyncio.run(both())
+    assert sorted(b"x-profile-id" in headers for headers in responses) == [False, True]
+    assert metrics.get("profiling.skipped") == skipped + 1
+    assert len(os.listdir(middleware.output_dir)) == 2  # one torch trace + one speedscope file
+
+
+if __name__ == "__main__":
+    test_unprofiled_requests_pass_through()
+    test_token_and_sampling_trigger_profiling()
+    test_unprofiled_request_reaches_app_unchanged()
+    test_stack_sampler_speedscope_export()
+    test_overlapping_sampled_requests_profile_one_at_a_time()
+    print("✓ All profiling tests passed")
@@ -0,0 +1,213 @@
+"""
+Tests for the session-affinity router (router.py)
+"""
+
+import asyncio
+import os
+import sys
+
+import httpx
+from fastapi import FastAPI, File, Form, Request
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import metrics
+from router import HashRing, SessionRouter
+from session_index import SessionIndex, decode_cursor, encode_cursor as cursor_of
+
+BACKENDS = ["http://w1:8101", "http://w2:8102", "http://w3:8103"]
+
+
+def test_ring_moves_only_the_changed_nodes_keys():
+    keys = [f"session-{i}" for i in range(5000)]
+    ring = HashRing(BACKENDS[:2] + ["http://w4:8104"])
+    before = {key: ring.lookup(key) for key in keys}
+    counts = [list(before.values()).count(node) for node in ring.nodes]
+    assert min(counts) > 5000 / 3 * 0.7  # roughly even with virtual nodes
+
+    ring.add("http://w5:8105")
+    after = {key: ring.lookup(key) for key in keys}
+    moved = [key for key in keys if after[key] != before[key]]
+    assert all(after[key] == "http://w5:8105" for key in moved)
+    assert 0.1 < len(moved) / len(keys) < 0.4
+
+    ring.remove("http://w5:8105")
+    assert {key: ring.lookup(key) for key in keys} == before
+
+
+class FakeBackends(httpx.AsyncBaseTransport):
+    """Transport standing in for several server.py processes (one ASGI app, told apart by Host)."""
+
+    def __init__(self):
+        self.down = set()
+        self.jobs = {}
+        self.app = FastAPI()
+        self.app.post("/chat")(self.chat)
+        self.app.get("/chat/history/{session_id}")(self.history)
+        self.app.post("/jobs")(self.submit)
+        self.app.get("/jobs/{job_id}")(self.job)
+        self.app.get("/chat/sessions")(self.sessions)
+        self.indexes = {backend: SessionIndex() for backend in BACKENDS}
+        self.asgi = httpx.ASGITransport(app=self.app)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if f"http://{request.url.host}:{request.url.port}" in self.down:
+            raise httpx.ConnectError("connection refused", request=request)
+        return await self.asgi.handle_async_request(request)
+
+    @staticmethod
+    def backend(request: Request) -> str:
+        return f"http://{request.headers['host']}"
+
+    async def chat(self, request: Request, session_id: str = Form(None), image: bytes = File(None)):
+        return {
+            "backend": self.backend(request),
+            "session_id": session_id,
+            "forwarded_for": request.headers.get("x-forwarded-for"),
+            "image_bytes": len(image) if image else 0,
+        }
+
+    async def sessions(self, request: Request, limit: int = None, cursor: str = None):
+        """Keyset pages over this backend's sessions, as server.py serves them."""
+        index = self.indexes[self.backend(request)]
+        keys, next_key = index.page(limit or 100, decode_cursor(cursor) if cursor else None)
+        return {
+            "active_sessions": [{"session_id": k[1], "last_updated": k[0]} for k in keys],
+            "total_sessions": len(index),
+            "next_cursor": cursor_of(next_key) if next_key else None,
+        }
+
+    async def history(self, request: Request, session_id: str):
+        return {"backend": self.backend(request), "session_id": session_id}
+
+    async def submit(self, request: Request):
+        job_id = f"{len(self.jobs):032x}"
+        self.jobs[job_id] = self.backend(request)
+        return JSONResponse({"id": job_id, "status": "queued"}, status_code=202)
+
+    async def job(self, request: Request, job_id: str):
+        status = 200 if self.jobs.get(job_id) == self.backend(request) else 404
+        return JSONResponse({"backend": self.backend(request)}, status_code=status)
+
+
+def _router(**kwargs):
+    fake = FakeBackends()
+    router = SessionRouter(BACKENDS, transport=fake, **kwargs)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=router), base_url="http://router")
+    return fake, router, client
+
+
+def test_sessions_stick_and_fail_over():
+    fake, router, client = _router()
+
+    async def scenario():
+        results = {}
+        for i in range(30):
+            sid = f"s{i}"
+            first = await client.post("/chat", data={"message": "hi", "session_id": sid}, files={"image": ("a.png", b"x")})
+            history = await client.get(f"/chat/history/{sid}")
+            results[sid] = (first.json()["backend"], history.json()["backend"])
+
+        victim = BACKENDS[0]
+        fake.down.add(victim)
+        moved = {}
+        for sid, (backend, _) in results.items():
+            response = await client.post("/chat", data={"message": "again", "session_id": sid}, files={"image": ("a.png", b"x")})
+            moved[sid] = response.json()["backend"]
+        return results, moved
+
+    results, moved = asyncio.run(scenario())
+    assert all(first == history == router.ring.lookup(sid) for sid, (first, history) in results.items())
+    assert len({backend for backend, _ in results.values()}) == 3
+    for sid, (backend, _) in results.items():
+        if backend == BACKENDS[0]:
+            assert moved[sid] == router.ring.candidates(sid)[1]  # next backend on the ring
+        else:
+            assert moved[sid] == backend  # untouched sessions stay put
+    assert not router.backends[BACKENDS[0]].healthy
+
+
+def test_new_sessions_get_an_id_and_jobs_are_pinned():
+    fake, router, client = _router()
+
+    async def scenario():
+        chat = await client.post("/chat", data={"message": "hello"}, headers={"x-forwarded-for": "6.6.6.6"})
+        submitted = [(await client.post("/jobs", json={"type": "classify", "images": []})).json()["id"] for _ in range(6)]
+        statuses = [(await client.get(f"/jobs/{job_id}")).status_code for job_id in submitted]
+        return chat.json(), statuses
+
+    chat, statuses = asyncio.run(scenario())
+    assert chat["session_id"] and chat["backend"] == router.ring.lookup(chat["session_id"])
+    assert chat["forwarded_for"] == "127.0.0.1"  # the client's own header is replaced, not appended to
+    assert len(set(fake.jobs.values())) > 1  # classify jobs are spread out...
+    assert statuses == [200] * 6  # ...and still found again
+
+
+def test_backend_changes_need_the_admin_token():
+    _, open_router, open_client = _router()
+    _, router, client = _router(admin_token="s3cret")
+
+    async def scenario():
+        return [
+            (await open_client.post("/_router/backends", params={"url": "http://evil:80"})).status_code,
+            (await client.post("/_router/backends", params={"url": "http://evil:80"})).status_code,
+            (await client.delete("/_router/backends", params={"url": BACKENDS[0]}, headers={"x-router-admin-token": "nope"})).status_code,
+            (await client.get("/_router")).status_code,
+            (await client.post("/_router/backends", params={"url": "http://w4:8104"}, headers={"x-router-admin-token": "s3cret"})).status_code,
+        ]
+
+    assert asyncio.run(scenario()) == [403, 403, 403, 200, 200]
+    assert "http://evil:80" not in open_router.backends and "http://evil:80" not in router.backends
+    assert BACKENDS[0] in router.backends and "http://w4:8104" in router.backends
+
+
+def test_session_listing_is_merged_across_backends():
+    fake, router, client = _router()
+    for i in range(25):
+        fake.indexes[BACKENDS[i % 3]].touch(f"s{i:02d}", f"2024-01-01T00:00:{i:02d}")
+    newest_first = [f"s{i:02d}" for i in reversed(range(25))]
+
+    async def scenario():
+        everything = (await client.get("/chat/sessions")).json()
+        pages, cursor = [], None
+        while True:
+            params = {"limit": 7, **({"cursor": cursor} if cursor else {})}
+            page = (await client.get("/chat/sessions", params=params)).json()
+            pages.append([s["session_id"] for s in page["active_sessions"]])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return everything, pages
+
+    everything, pages = asyncio.run(scenario())
+    assert [s["session_id"] for s in everything["active_sessions"]] == newest_first
+    assert everything["total_sessions"] == 25 and everything["next_cursor"] is None  # one default-size page
+    assert [len(page) for page in pages] == [7, 7, 7, 4]
+    assert sum(pages, []) == newest_first
+
+
+def test_large_uploads_are_streamed_with_their_session():
+    fake, router, client = _router(retry_body=1024)
+    image = os.urandom(64 * 1024)
+    streamed = metrics.get("router.streamed_bodies")
+
+    async def scenario():
+        named = await client.post("/chat", data={"session_id": "big", "message": "hi"}, files={"image": ("a.png", image)})
+        minted = await client.post("/chat", data={"message": "hi"}, files={"image": ("a.png", image)})
+        return named.json(), minted.json()
+
+    named, minted = asyncio.run(scenario())
+    assert named["backend"] == router.ring.lookup("big") and named["image_bytes"] == len(image)
+    assert minted["session_id"] and minted["backend"] == router.ring.lookup(minted["session_id"])
+    assert minted["image_bytes"] == len(image)
+    assert metrics.get("router.streamed_bodies") == streamed + 2
+
+
+if __name__ == "__main__":
+    test_ring_moves_only_the_changed_nodes_keys()
+    test_sessions_stick_and_fail_over()
+    test_new_sessions_get_an_id_and_jobs_are_pinned()
+    test_backend_changes_need_the_admin_token()
+    test_session_listing_is_merged_across_backends()
+    test_large_uploads_are_streamed_with_their_session()
+    print("✓ All router tests passed")
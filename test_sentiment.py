@@ -0,0 +1,79 @@
+"""
+Tests for sliding-window, batched sentiment (sentiment.py)
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sentiment import WindowedSentiment, combine, split_windows
+
+
+class WordTokenizer:
+    """One token per word: "good" → 1, "bad" → 2, anything else → 3."""
+
+    model_max_length = 10
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 2
+
+    def __call__(self, texts, add_special_tokens=True):
+        vocab = {"good": 1, "bad": 2}
+        return {"input_ids": [[vocab.get(word, 3) for word in text.split()] for text in texts]}
+
+
+class CountingSentiment(WindowedSentiment):
+    """Scores a window by its share of "good" vs "bad" words and records each batch."""
+
+    def __init__(self, **kwargs):
+        config = SimpleNamespace(id2label={0: "NEGATIVE", 1: "POSITIVE"}, num_labels=2)
+        super().__init__(SimpleNamespace(config=config), WordTokenizer(), **kwargs)
+        self.batches = []
+
+    def _score(self, windows):
+        self.batches.append([len(ids) for ids in windows])
+        good = np.array([ids.count(1) + 1 for ids in windows], dtype=np.float32)
+        bad = np.array([ids.count(2) + 1 for ids in windows], dtype=np.float32)
+        return np.stack([bad, good], axis=1) / (good + bad)[:, None]
+
+
+def test_windows_cover_the_text_with_overlap():
+    assert split_windows(5, 8, 2) == [(0, 5)]
+    spans = split_windows(20, 8, 2)
+    assert spans == [(0, 8), (6, 14), (12, 20)]
+    assert all(end - start <= 8 for start, end in spans)
+    assert split_windows(9, 8, 2) == [(0, 8), (6, 9)]
+
+    # The overlap is not counted twice: the last window only adds 3 new tokens
+    probs = np.array([[0.0, 1.0], [1.0, 0.0]])
+    assert combine(probs, [(0, 8), (6, 11)], ["NEGATIVE", "POSITIVE"]) == {"label": "POSITIVE", "score": 8 / 11}
+
+
+def test_windows_of_all_texts_share_batches():
+    analyzer = CountingSentiment(overlap=2, batch_size=4)
+    assert analyzer.window == 8 and analyzer.labels == ["NEGATIVE", "POSITIVE"]
+
+    long_review = " ".join(["good"] * 30 + ["bad"] * 4)
+    results = analyzer.analyze(["bad bad movie", long_review, "good"], detail=True)
+
+    assert [r["windows"] for r in results] == [1, 6, 1]
+    assert [r["tokens"] for r in results] == [3, 34, 1]
+    assert [r["sentiment"]["label"] for r in results] == ["NEGATIVE", "POSITIVE", "POSITIVE"]
+    # 8 windows in 2 forward passes, shortest first
+    assert [len(batch) for batch in analyzer.batches] == [4, 4]
+    assert analyzer.batches[0][:2] == [1, 3]
+
+    scores = results[1]["window_scores"]
+    assert [(w["start_token"], w["end_token"]) for w in scores] == split_windows(34, 8, 2)
+    assert scores[0]["label"] == "POSITIVE" and scores[-1]["label"] == "NEGATIVE"
+    assert "window_scores" not in analyzer.analyze(["good"])[0]
+
+
+if __name__ == "__main__":
+    test_windows_cover_the_text_with_overlap()
+    test_windows_of_all_texts_share_batches()
+    print("✓ All sentiment tests passed")
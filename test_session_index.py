@@ -0,0 +1,65 @@
+"""
+Tests for the last-update session index used by /chat/sessions
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from session_index import SessionIndex, decode_cursor, encode_cursor
+
+
+def _index(n):
+    index = SessionIndex()
+    for i in range(n):
+        index.touch(f"s{i}", f"2025-01-01T12:00:{i:02d}")
+    return index
+
+
+def test_pages_are_newest_first_and_resume_from_cursor():
+    index = _index(5)
+    first, cursor = index.page(2)
+    assert [sid for _, sid in first] == ["s4", "s3"]
+    second, cursor = index.page(2, before=decode_cursor(encode_cursor(cursor)))
+    assert [sid for _, sid in second] == ["s2", "s1"]
+    third, cursor = index.page(2, before=cursor)
+    assert [sid for _, sid in third] == ["s0"]
+    assert cursor is None
+
+
+def test_touch_moves_session_to_front():
+    index = _index(3)
+    index.touch("s0", "2025-01-01T13:00:00")
+    keys, _ = index.page(10)
+    assert [sid for _, sid in keys] == ["s0", "s2", "s1"]
+    assert len(index) == 3
+
+
+def test_remove_and_filters():
+    index = _index(6)
+    index.remove("s5")
+    assert "s5" not in index and len(index) == 5
+
+    recent, cursor = index.page(10, updated_since="2025-01-01T12:00:03")
+    assert [sid for _, sid in recent] == ["s4", "s3"]
+    assert cursor is None
+
+    even, _ = index.page(10, where=lambda sid: int(sid[1:]) % 2 == 0)
+    assert [sid for _, sid in even] == ["s4", "s2", "s0"]
+
+
+def test_invalid_cursor_raises_value_error():
+    try:
+        decode_cursor("not-a-cursor!!")
+    except ValueError:
+        return
+    raise AssertionError("expected ValueError")
+
+
+if __name__ == "__main__":
+    test_pages_are_newest_first_and_resume_from_cursor()
+    test_touch_moves_session_to_front()
+    test_remove_and_filters()
+    test_invalid_cursor_raises_value_error()
+    print("✓ All session index tests passed")
@@ -0,0 +1,76 @@
+"""
+Tests for single-flight request coalescing (singleflight.py)
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import metrics
+from singleflight import SingleFlight
+
+
+def test_concurrent_duplicates_share_one_computation():
+    flight = SingleFlight("test_dedupe")
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "cat"
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do("same-image", compute) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["cat"] * 5
+    assert len(calls) == 1
+    assert metrics.get("test_dedupe.singleflight.coalesced") == 4
+    assert flight.coalesce_rate() == 0.8
+
+
+def test_sequential_calls_are_not_cached():
+    flight = SingleFlight("test_sequential")
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return len(calls)
+
+    async def scenario():
+        return [await flight.do("k", compute), await flight.do("k", compute)]
+
+    assert asyncio.run(scenario()) == [1, 2]
+
+
+def test_errors_propagate_and_leader_cancellation_is_isolated():
+    flight = SingleFlight("test_errors")
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "ok"
+
+    async def scenario():
+        results = await asyncio.gather(flight.do("e", fail), flight.do("e", fail), return_exceptions=True)
+        leader = asyncio.create_task(flight.do("s", slow))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("s", slow))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return results, await follower
+
+    errors, follower_result = asyncio.run(scenario())
+    assert all(isinstance(e, ValueError) for e in errors)
+    assert follower_result == "ok"
+
+
+if __name__ == "__main__":
+    test_concurrent_duplicates_share_one_computation()
+    test_sequential_calls_are_not_cached()
+    test_errors_propagate_and_leader_cancellation_is_isolated()
+    print("✓ All single-flight tests passed")
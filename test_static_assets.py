@@ -0,0 +1,92 @@
+"""
+Tests for in-memory, pre-compressed static asset serving (static_assets.py)
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from static_assets import ASSET_CACHE_CONTROL, HTML_CACHE_CONTROL, StaticAssetStore
+
+SCRIPT = b"console.log('hello');\n" * 50
+INDEX = b'<link href="/static/styles.css"><script src="/static/app.js"></script><a href="/static/app.js.map">'
+
+
+def _client(hot_reload=False):
+    directory = tempfile.mkdtemp(prefix="static_")
+    for name, body in {"index.html": INDEX, "app.js": SCRIPT, "styles.css": b"body{}"}.items():
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(body)
+    store = StaticAssetStore(directory, hot_reload=hot_reload)
+    app = FastAPI()
+
+    @app.get("/")
+    async def root(request: Request):
+        return store.response("index.html", request)
+
+    @app.get("/static/{name:path}")
+    async def static(name: str, request: Request):
+        return store.response(name, request)
+
+    return TestClient(app), directory
+
+
+def test_index_references_fingerprinted_assets():
+    client, _ = _client()
+    response = client.get("/")
+    digest = hashlib.sha256(SCRIPT).hexdigest()[:20]
+    assert f'"/static/app.js?v={digest}"'.encode() in response.content
+    assert b'"/static/styles.css?v=' in response.content
+    assert b'"/static/app.js.map"' in response.content  # not an asset: left alone
+    assert response.headers["cache-control"] == HTML_CACHE_CONTROL
+
+    asset = client.get(f"/static/app.js?v={digest}")
+    assert asset.content == SCRIPT and asset.headers["cache-control"] == ASSET_CACHE_CONTROL
+    assert "javascript" in asset.headers["content-type"]  # text/ or application/, per platform
+    assert client.get("/static/missing.js").status_code == 404
+
+
+def test_each_encoding_has_its_own_etag_and_304():
+    client, _ = _client()
+    plain = client.get("/static/app.js", headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/static/app.js", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in plain.headers and gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.content == SCRIPT and plain.headers["vary"] == gzipped.headers["vary"] == "Accept-Encoding"
+    plain_etag, gzip_etag = plain.headers["etag"], gzipped.headers["etag"]
+    assert plain_etag != gzip_etag
+
+    def revalidate(etag, encoding):
+        return client.get("/static/app.js", headers={"If-None-Match": etag, "Accept-Encoding": encoding})
+
+    not_modified = revalidate(gzip_etag, "gzip")
+    assert not_modified.status_code == 304 and not_modified.content == b""
+    assert not_modified.headers["etag"] == gzip_etag
+    assert revalidate(plain_etag, "identity").status_code == 304
+    assert revalidate("W/" + plain_etag, "identity").status_code == 304  # weak comparison
+    assert revalidate(plain_etag, "gzip").status_code == 200  # other representation: full body
+    assert revalidate('"stale", ' + gzip_etag, "gzip").status_code == 304
+    assert revalidate("*", "identity").status_code == 304
+
+
+def test_hot_reload_refingerprints_changed_assets():
+    client, directory = _client(hot_reload=True)
+    before = client.get("/").content
+    with open(os.path.join(directory, "app.js"), "wb") as f:
+        f.write(b"console.log('changed');\n")
+    os.utime(os.path.join(directory, "app.js"), (1, 1))
+    after = client.get("/").content
+    assert before != after
+    assert hashlib.sha256(b"console.log('changed');\n").hexdigest()[:20].encode() in after
+
+
+if __name__ == "__main__":
+    test_index_references_fingerprinted_assets()
+    test_each_encoding_has_its_own_etag_and_304()
+    test_hot_reload_refingerprints_changed_assets()
+    print("✓ All static asset tests passed")
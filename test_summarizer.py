@@ -0,0 +1,82 @@
+"""
+Tests for rolling conversation summaries (summarizer.py)
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from admission import FairAdmission
+from summarizer import ConversationSummarizer
+
+
+def _message(role, text, image=False):
+    content = [{"type": "image"}] if image else []
+    return {"role": role, "content": content + [{"type": "text", "text": text}]}
+
+
+def _history(turns):
+    history = []
+    for i in range(turns):
+        history.append(_message("user", f"question {i}", image=(i == 0)))
+        history.append(_message("assistant", f"answer {i}"))
+    return history
+
+
+def test_compaction_folds_old_turns_and_keeps_recent():
+    histories = {"s": _history(8)}  # 16 messages
+    calls = []
+
+    def summarize(previous, messages):
+        calls.append((previous, [m["content"][-1]["text"] for m in messages]))
+        return f"summary of {len(messages)}"
+
+    summarizer = ConversationSummarizer(histories, summarize, FairAdmission(name="test"), after=12, keep_recent=6)
+    summarizer.note_turn("s")
+    assert asyncio.run(summarizer.compact("s")) is True
+
+    previous, folded = calls[0]
+    assert previous is None and folded[0] == "question 0" and len(folded) == 10
+    assert [m.get("summarized", False) for m in histories["s"]] == [True] * 10 + [False] * 6
+    assert len(histories["s"]) == 16  # originals stay retrievable
+    assert summarizer.system_message("s")["content"][0]["text"].endswith("summary of 10")
+    assert asyncio.run(summarizer.compact("s")) is False  # nothing new past the threshold
+
+    # Later turns fold into the previous summary
+    histories["s"].extend(_history(4))
+    assert asyncio.run(summarizer.compact("s")) is True
+    assert calls[1][0] == "summary of 10" and len(calls[1][1]) == 8
+
+
+def test_background_loop_waits_for_idle_and_skips_cleared_sessions():
+    histories = {"busy": _history(7), "gone": _history(7)}
+    admission = FairAdmission(name="test")
+
+    async def scenario():
+        summarizer = ConversationSummarizer(
+            histories, lambda previous, messages: "short", admission,
+            after=12, keep_recent=4, idle_seconds=0.05, poll_interval=0.01,
+        )
+        summarizer.note_turn("busy")
+        summarizer.note_turn("gone")
+        summarizer.start()
+        async with admission.slot("other", "client"):
+            await asyncio.sleep(0.1)
+            assert "busy" not in summarizer.summaries  # chat traffic goes first
+        del histories["gone"]
+        summarizer.forget("gone")
+        await asyncio.sleep(0.2)
+        await summarizer.stop()
+        return summarizer
+
+    summarizer = asyncio.run(scenario())
+    assert summarizer.summaries == {"busy": "short"}
+    assert sum(bool(m.get("summarized")) for m in histories["busy"]) == 10
+
+
+if __name__ == "__main__":
+    test_compaction_folds_old_turns_and_keeps_recent()
+    test_background_loop_waits_for_idle_and_skips_cleared_sessions()
+    print("✓ All summarizer tests passed")
@@ -0,0 +1,46 @@
+"""
+Tests for the client-side downscaling hints served by /upload_preferences (server.py)
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("torchvision")
+
+from fastapi.testclient import TestClient
+
+from benchmarks import load_server_with_stubs
+from chat_images import TIERS, get_tier
+
+
+def test_advertises_the_sizes_script_js_reads(monkeypatch):
+    monkeypatch.delenv("CHAT_UPLOAD_LONGEST_SIDE", raising=False)
+    server = load_server_with_stubs()
+    response = TestClient(server.app).get("/upload_preferences")
+    assert response.status_code == 200
+    prefs = response.json()
+    assert prefs["predict"]["shortest_side"] == 256 and prefs["predict"]["type"] == "image/jpeg"
+    assert prefs["chat"]["longest_side"] == get_tier().longest_edge
+    assert prefs["chat"]["default_tier"] == get_tier().name
+    assert prefs["chat"]["tiers"] == {name: tier.longest_edge for name, tier in TIERS.items()}
+    assert prefs["max_upload_bytes"] == server.MAX_UPLOAD_BYTES
+    assert prefs["accepted_types"] == ["image/jpeg", "image/png"]
+
+
+def test_chat_longest_side_can_be_overridden(monkeypatch):
+    server = load_server_with_stubs()
+    monkeypatch.setenv("CHAT_UPLOAD_LONGEST_SIDE", "1024")
+    assert server.chat_image_longest_side() == 1024
+    prefs = TestClient(server.app).get("/upload_preferences").json()
+    assert prefs["chat"]["longest_side"] == 1024
+    assert prefs["chat"]["tiers"]["detailed"] == TIERS["detailed"].longest_edge  # tiers are unaffected
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
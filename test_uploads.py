@@ -0,0 +1,91 @@
+"""
+Tests for streaming upload validation (uploads.py)
+"""
+
+import asyncio
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import HTTPException
+from PIL import Image
+
+from uploads import parse_npy, sniff_image_header, spool_image_upload
+
+
+class FakeUpload:
+    """Minimal async stand-in for UploadFile.read()."""
+
+    def __init__(self, data: bytes):
+        self.data = io.BytesIO(data)
+
+    async def read(self, size: int = -1) -> bytes:
+        return self.data.read(size)
+
+
+def _encode(fmt, size=(320, 200)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, color="blue").save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def test_sniff_png_and_jpeg_dimensions():
+    for fmt in ("PNG", "JPEG"):
+        header = sniff_image_header(_encode(fmt))
+        assert header is not None
+        assert (header.format, header.width, header.height) == (fmt, 320, 200)
+
+
+def test_sniff_needs_more_bytes_or_rejects():
+    assert sniff_image_header(_encode("PNG")[:12]) is None
+    try:
+        sniff_image_header(b"GIF89a" + b"\x00" * 32)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("GIF should be rejected")
+
+
+def _status(coro):
+    try:
+        asyncio.run(coro)
+    except HTTPException as e:
+        return e.status_code
+    return 200
+
+
+def test_spool_rejects_before_decoding():
+    big = _encode("PNG", size=(2000, 2000))
+    assert _status(spool_image_upload(FakeUpload(big), max_pixels=1_000_000)) == 413
+    assert _status(spool_image_upload(FakeUpload(big), max_bytes=1024)) == 413
+    assert _status(spool_image_upload(FakeUpload(b"not an image at all"))) == 415
+    assert _status(spool_image_upload(FakeUpload(_encode("JPEG")))) == 200
+
+
+def _npy(shape, descr="|u1", payload=b""):
+    header = repr({"descr": descr, "fortran_order": False, "shape": shape}).encode("latin1")
+    header += b" " * (-(10 + len(header) + 1) % 64) + b"\n"
+    return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header + payload
+
+
+def test_parse_npy_uint8_image():
+    payload = bytes(range(256)) * 588  # 224 * 224 * 3 bytes
+    descr, shape, data = parse_npy(_npy((224, 224, 3), payload=payload))
+    assert descr == "|u1" and shape == (224, 224, 3)
+    assert bytes(data) == payload
+    try:
+        parse_npy(b"PK\x03\x04 not npy")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("non-npy data should be rejected")
+
+
+if __name__ == "__main__":
+    test_parse_npy_uint8_image()
+    test_sniff_png_and_jpeg_dimensions()
+    test_sniff_needs_more_bytes_or_rejects()
+    test_spool_rejects_before_decoding()
+    print("✓ All upload tests passed")
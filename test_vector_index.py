@@ -0,0 +1,98 @@
+"""
+Tests for the vector index (vector_index.py)
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from vector_index import VectorIndex
+
+
+def _vectors(n=600, dim=32, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def _recall(index, vectors, queries=50):
+    rng = np.random.default_rng(1)
+    hits = 0
+    for i in range(queries):
+        score, payload = index.nearest(vectors[i] + 0.01 * rng.normal(size=vectors.shape[1]))
+        hits += payload == i
+    return hits / queries
+
+
+def test_flat_search_is_exact_and_ordered():
+    vectors = _vectors()
+    index = VectorIndex(32)
+    for i, vector in enumerate(vectors):
+        index.add(vector, i)
+    results = index.search(vectors[5], k=3)
+    assert results[0][1] == 5 and abs(results[0][0] - 1.0) < 1e-5
+    assert [score for score, _ in results] == sorted((score for score, _ in results), reverse=True)
+    assert _recall(index, vectors) == 1.0
+
+
+def test_ivf_and_pq_train_and_find_neighbours():
+    vectors = _vectors()
+    for mode in ("ivf", "ivfpq"):
+        index = VectorIndex(32, mode=mode, nlist=8, nprobe=4, pq_m=4, train_size=400)
+        for i, vector in enumerate(vectors):
+            index.add(vector, i)
+        index.build()
+        assert index.trained
+        assert _recall(index, vectors) >= 0.9, mode
+
+
+def test_training_runs_in_the_background():
+    vectors = _vectors()
+    index = VectorIndex(32, mode="ivf", nlist=8, nprobe=4, train_size=400)
+    for i, vector in enumerate(vectors[:400]):
+        index.add(vector, i)
+    trainer = index._trainer
+    assert trainer is not None and trainer is not threading.current_thread()
+    for i, vector in enumerate(vectors[400:], start=400):
+        index.add(vector, i)  # not held up by k-means, and indexed once it finishes
+    assert index.nearest(vectors[450])[1] == 450
+    trainer.join()
+    assert index.trained and sum(len(rows) for rows in index._lists) == len(vectors)
+    assert _recall(index, vectors) >= 0.9
+
+
+def test_save_and_memory_mapped_load():
+    vectors = _vectors()
+    index = VectorIndex(32, mode="ivfpq", nlist=8, nprobe=4, pq_m=4, train_size=400)
+    for i, vector in enumerate(vectors):
+        index.add(vector, {"i": i})
+    index.build()
+    path = tempfile.mkdtemp()
+    index.save(path)
+
+    loaded = VectorIndex.load(path)
+    assert isinstance(loaded._vectors, np.memmap)
+    assert len(loaded) == len(vectors)
+    assert loaded.search(vectors[9], k=1)[0][1] == {"i": 9}
+    loaded.add(vectors[0], {"i": "again"})  # copies out of the read-only mapping
+    assert len(loaded) == len(vectors) + 1
+
+
+def test_max_size_keeps_newest():
+    index = VectorIndex(4, max_size=10)
+    for i, vector in enumerate(_vectors(25, 4)):
+        index.add(vector, i)
+    assert len(index) <= 10
+    assert index._payloads[-1] == 24
+
+
+if __name__ == "__main__":
+    test_flat_search_is_exact_and_ordered()
+    test_ivf_and_pq_train_and_find_neighbours()
+    test_training_runs_in_the_background()
+    test_save_and_memory_mapped_load()
+    test_max_size_keeps_newest()
+    print("✓ All vector index tests passed")
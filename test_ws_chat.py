@@ -0,0 +1,126 @@
+"""
+Tests for streamed chat over the /ws/chat WebSocket (server.py)
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("torchvision")
+
+from fastapi import WebSocketDisconnect
+from fastapi.testclient import TestClient
+
+from benchmarks import load_server_with_stubs
+from metrics import metrics
+
+WORDS = ["Hello", "there", "friend", "how", "are", "you", "today", "?"]
+
+
+class WordTokenizer:
+    """Decodes token id i to WORDS[i], space separated."""
+
+    def decode(self, ids, **kwargs):
+        return " ".join(WORDS[int(i)] for i in ids)
+
+
+class StreamingChatBot:
+    """Feeds tokens to the streamer like generate() does, honouring stopping criteria."""
+
+    def __init__(self, delay=0.0):
+        self.tokenizer = WordTokenizer()
+        self.delay = delay
+        self.generated = 0
+        self.finished = threading.Event()
+
+    def __call__(self, **kwargs):
+        import torch
+
+        generate_kwargs = kwargs.get("generate_kwargs", {})
+        streamer, stopping = generate_kwargs["streamer"], generate_kwargs["stopping_criteria"]
+        streamer.put(torch.tensor([[0]]))  # the prompt, skipped
+        ids = torch.tensor([[0]])
+        try:
+            for token in range(len(WORDS)):
+                time.sleep(self.delay)
+                ids = torch.cat([ids, torch.tensor([[token]])], dim=1)
+                streamer.put(torch.tensor([token]))
+                self.generated += 1
+                if stopping(ids, None).all():
+                    break
+            streamer.end()
+            return [{"generated_text": " ".join(WORDS[: self.generated])}]
+        finally:
+            self.finished.set()
+
+
+def _turn(websocket, message="hi"):
+    websocket.send_json({"type": "message", "id": 1, "message": message})
+    frames = [websocket.receive_json()]
+    while frames[-1]["type"] not in ("done", "error"):
+        frames.append(websocket.receive_json())
+    return frames
+
+
+def test_replies_are_streamed_as_deltas(monkeypatch):
+    server = load_server_with_stubs()
+    monkeypatch.setattr(server, "chat_bot", StreamingChatBot())
+    with TestClient(server.app).websocket_connect("/ws/chat") as websocket:
+        assert websocket.receive_json()["type"] == "session"
+        frames = _turn(websocket)
+    assert frames[0] == {"type": "start", "id": 1}
+    deltas = [frame["text"] for frame in frames if frame["type"] == "delta"]
+    assert len(deltas) > 1 and "".join(deltas).split() == WORDS
+    assert frames[-1]["type"] == "done" and frames[-1]["response"] == " ".join(WORDS)
+
+
+def test_pipeline_without_tokenizer_sends_one_delta():
+    server = load_server_with_stubs()  # StubPipeline has no tokenizer to stream with
+    with TestClient(server.app).websocket_connect("/ws/chat") as websocket:
+        session_id = websocket.receive_json()["session_id"]
+        frames = _turn(websocket)
+    assert [frame["type"] for frame in frames] == ["start", "delta", "done"]
+    assert frames[1]["text"] == frames[2]["response"] == "This is a stubbed assistant reply."
+    assert server.conversation_histories[session_id]
+
+
+def test_disconnect_stops_generation_before_the_slot_is_freed(monkeypatch):
+    server = load_server_with_stubs()
+    bot = StreamingChatBot(delay=0.2)
+    monkeypatch.setattr(server, "chat_bot", bot)
+    cancelled = metrics.get("chat.generation.cancelled")
+    with TestClient(server.app).websocket_connect("/ws/chat") as websocket:
+        websocket.receive_json()
+        websocket.send_json({"type": "message", "id": 1, "message": "hi"})
+        assert websocket.receive_json()["type"] == "start"
+        assert websocket.receive_json()["type"] == "delta"
+    # Leaving the block waits for the handler, which waits for the generation thread
+    assert bot.finished.is_set() and bot.generated < len(WORDS)
+    assert metrics.get("chat.generation.cancelled") == cancelled + 1
+    assert server.chat_admission.active == 0
+
+
+def test_failed_turn_closes_the_socket(monkeypatch):
+    server = load_server_with_stubs()
+
+    async def broken_turn(websocket, session_id, request):
+        raise RuntimeError("send failed")
+
+    monkeypatch.setattr(server, "_ws_chat_turn", broken_turn)
+    with TestClient(server.app).websocket_connect("/ws/chat") as websocket:
+        websocket.receive_json()
+        websocket.send_json({"type": "message", "id": 1, "message": "hi"})
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+    assert closed.value.code == 1011
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
@@ -0,0 +1,271 @@
+"""
+Bounded, streaming image upload handling for /predict and /chat.
+• UploadLimitMiddleware rejects request bodies larger than MAX_UPLOAD_BYTES with 413,
+  from the Content-Length header when present and by counting bytes otherwise, before
+  the multipart form is parsed.
+• read_image_upload copies an upload in chunks into a SpooledTemporaryFile (memory up
+  to SPOOL_MAX_MEMORY, disk beyond), sniffs the real format and dimensions from the
+  first bytes, and rejects non-JPEG/PNG data or images over MAX_IMAGE_PIXELS before
+  any pixel is decoded. read_image_stream does the same for a raw request body.
+• read_body / parse_npy support the pre-decoded uint8 tensor inputs of /predict.
+"""
+
+import ast
+import os
+import tempfile
+from typing import AsyncIterator, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+from PIL import Image, UnidentifiedImageError
+
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.environ.get("MAX_IMAGE_PIXELS", str(40_000_000)))
+SPOOL_MAX_MEMORY = int(os.environ.get("SPOOL_MAX_MEMORY", str(1024 * 1024)))
+CHUNK_SIZE = 64 * 1024
+SNIFF_LIMIT = 512 * 1024  # give up on header sniffing after this many bytes
+FORM_OVERHEAD = 64 * 1024  # multipart boundaries and text fields around the file
+
+# Let PIL refuse anything our own checks missed, instead of only warning
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+JPEG_STANDALONE_MARKERS = {0x01, 0xD8} | set(range(0xD0, 0xD8))
+
+
+class ImageHeader(NamedTuple):
+    format: str
+    width: int
+    height: int
+
+
+def sniff_image_header(head: bytes) -> Optional[ImageHeader]:
+    """Read format and dimensions from the leading bytes of a JPEG or PNG file.
+
+    Returns None if more bytes are needed, raises ValueError if the data is not a
+    JPEG or PNG image.
+    """
+    if len(head) < 8:
+        if PNG_SIGNATURE.startswith(head[:8]) or b"\xff\xd8".startswith(head[:2]):
+            return None
+        raise ValueError("Unsupported image format")
+
+    if head.startswith(PNG_SIGNATURE):
+        if len(head) < 24:
+            return None
+        if head[12:16] != b"IHDR":
+            raise ValueError("Malformed PNG header")
+        return ImageHeader("PNG", int.from_bytes(head[16:20], "big"), int.from_bytes(head[20:24], "big"))
+
+    if head.startswith(b"\xff\xd8"):
+        pos = 2
+        while True:
+            while pos < len(head) and head[pos] != 0xFF:
+                pos += 1  # tolerate garbage between segments, like libjpeg
+            while pos + 1 < len(head) and head[pos + 1] == 0xFF:
+                pos += 1  # fill bytes
+            if pos + 4 > len(head):
+                return None
+            marker = head[pos + 1]
+            if marker in JPEG_STANDALONE_MARKERS:
+                pos += 2
+                continue
+            if marker in JPEG_SOF_MARKERS:
+                if pos + 9 > len(head):
+                    return None
+                height = int.from_bytes(head[pos + 5:pos + 7], "big")
+                width = int.from_bytes(head[pos + 7:pos + 9], "big")
+                return ImageHeader("JPEG", width, height)
+            if marker == 0xD9:
+                raise ValueError("JPEG has no frame header")
+            pos += 2 + int.from_bytes(head[pos + 2:pos + 4], "big")
+
+    raise ValueError("Unsupported image format")
+
+
+def check_dimensions(width: int, height: int, max_pixels: int = MAX_IMAGE_PIXELS) -> None:
+    if width <= 0 or height <= 0:
+        raise HTTPException(status_code=400, detail="Image has invalid dimensions.")
+    if width * height > max_pixels:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image is {width}x{height}; at most {max_pixels} pixels are allowed.",
+        )
+
+
+async def _upload_chunks(upload: UploadFile) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await upload.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def spool_image_stream(
+    chunks: AsyncIterator[bytes], max_bytes: int = MAX_UPLOAD_BYTES, max_pixels: int = MAX_IMAGE_PIXELS, hasher=None
+) -> tempfile.SpooledTemporaryFile:
+    """Copy an image byte stream into a bounded spool, validating it as it streams in.
+
+    If `hasher` (e.g. hashlib.sha256()) is given, it is updated with every chunk.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    head = b""
+    header: Optional[ImageHeader] = None
+    total = 0
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            total += len(chunk)
+            if total > max_bytes:
+                raise HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes.")
+            if header is None and len(head) < SNIFF_LIMIT:
+                head += chunk
+                try:
+                    header = sniff_image_header(head)
+                except ValueError:
+                    raise HTTPException(status_code=415, detail="Please upload a JPEG or PNG image.")
+                if header is not None:
+                    check_dimensions(header.width, header.height, max_pixels)
+            spool.write(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    if total == 0:
+        spool.close()
+        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+    spool.seek(0)
+    return spool
+
+
+async def spool_image_upload(
+    upload: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES, max_pixels: int = MAX_IMAGE_PIXELS, hasher=None
+) -> tempfile.SpooledTemporaryFile:
+    """Copy `upload` into a bounded spool, validating it as it streams in."""
+    return await spool_image_stream(_upload_chunks(upload), max_bytes, max_pixels, hasher)
+
+
+def open_image(fp, max_pixels: int = MAX_IMAGE_PIXELS) -> Image.Image:
+    """Open and decode an image file object as RGB, checking its size before decoding."""
+    try:
+        image = Image.open(fp)  # lazy: parses the header only
+        check_dimensions(image.width, image.height, max_pixels)
+        return image.convert("RGB")
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not decode image: {e}")
+
+
+async def read_image_upload(
+    upload: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES, max_pixels: int = MAX_IMAGE_PIXELS
+) -> Image.Image:
+    """Stream, validate and decode an uploaded JPEG/PNG into an RGB PIL image."""
+    spool = await spool_image_upload(upload, max_bytes, max_pixels)
+    with spool:
+        return open_image(spool, max_pixels)
+
+
+async def read_image_stream(
+    chunks: AsyncIterator[bytes], max_bytes: int = MAX_UPLOAD_BYTES, max_pixels: int = MAX_IMAGE_PIXELS
+) -> Image.Image:
+    """Like read_image_upload, for a raw request body (e.g. `request.stream()`)."""
+    spool = await spool_image_stream(chunks, max_bytes, max_pixels)
+    with spool:
+        return open_image(spool, max_pixels)
+
+
+async def read_body(chunks: AsyncIterator[bytes], max_bytes: int) -> bytes:
+    """Collect a small request body, refusing anything over `max_bytes`."""
+    body = bytearray()
+    async for chunk in chunks:
+        body += chunk
+        if len(body) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Request body exceeds {max_bytes} bytes.")
+    return bytes(body)
+
+
+def parse_npy(data: bytes) -> Tuple[str, Tuple[int, ...], memoryview]:
+    """Parse a version 1/2/3 .npy file without numpy: returns (dtype descr, shape, payload)."""
+    if data[:6] != b"\x93NUMPY" or len(data) < 10:
+        raise ValueError("Not a .npy file")
+    major = data[6]
+    if major == 1:
+        header_len, start = int.from_bytes(data[8:10], "little"), 10
+    elif major in (2, 3):
+        header_len, start = int.from_bytes(data[8:12], "little"), 12
+    else:
+        raise ValueError(f"Unsupported .npy version {major}")
+    try:
+        header = ast.literal_eval(data[start:start + header_len].decode("latin1"))
+        descr, fortran_order, shape = header["descr"], header["fortran_order"], tuple(header["shape"])
+    except Exception as e:
+        raise ValueError("Malformed .npy header") from e
+    if fortran_order:
+        raise ValueError("Fortran-ordered arrays are not supported")
+    return descr, shape, memoryview(data)[start + header_len:]
+
+
+class _BodyTooLarge(HTTPException):
+    """Raised from receive(); FastAPI re-raises HTTPExceptions from body parsing as-is."""
+
+    def __init__(self):
+        super().__init__(status_code=413, detail="Request body too large.")
+
+
+class UploadLimitMiddleware:
+    """Pure ASGI middleware capping request body size on upload routes."""
+
+    def __init__(self, app, max_body: int = MAX_UPLOAD_BYTES + FORM_OVERHEAD, paths=("/predict", "/chat")):
+        self.app = app
+        self.max_body = max_body
+        self.paths = paths
+
+    async def _reject(self, send) -> None:
+        body = b'{"detail":"Request body too large."}'
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        for key, value in scope.get("headers", ()):
+            if key == b"content-length":
+                try:
+                    too_large = int(value) > self.max_body
+                except ValueError:
+                    too_large = False
+                if too_large:
+                    await self._reject(send)
+                    return
+                break
+
+        received = 0
+        response_started = False
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    raise _BodyTooLarge()
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, tracking_send)
+        except _BodyTooLarge:
+            if not response_started:
+                await self._reject(send)
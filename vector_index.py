@@ -0,0 +1,258 @@
+"""
+In-memory vector index for k-NN lookups by cosine similarity.
+• "flat" scores the query against every stored vector (exact).
+• "ivf" clusters vectors with k-means once `train_size` vectors have been added and
+  only scores the `nprobe` closest clusters; "ivfpq" additionally keeps product-
+  quantized codes for those clusters and re-ranks the best candidates exactly.
+• Training runs in a background thread (or on an explicit `build()`), outside the
+  index lock: adds and searches carry on with exact flat scans until it is done.
+• `save()` writes .npy files plus index.json; `load()` memory-maps the vectors, so a
+  large index starts instantly and only the rows a search touches are paged in.
+Every vector carries a small JSON-serializable payload (label, filename, ...).
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+MODES = ("flat", "ivf", "ivfpq")
+PQ_CENTROIDS = 256  # one uint8 code per sub-vector
+
+
+def normalize_vector(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
+
+
+def _kmeans(x: np.ndarray, k: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means with squared L2 distance; returns (k, dim) centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+    for _ in range(iters):
+        assign = _nearest_centroid(x, centroids)
+        for c in range(k):
+            members = x[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+    return centroids
+
+
+def _nearest_centroid(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    distances = (centroids * centroids).sum(axis=1)[None, :] - 2 * x @ centroids.T
+    return distances.argmin(axis=1)
+
+
+class VectorIndex:
+    """Cosine-similarity k-NN over L2-normalized float32 vectors with payloads."""
+
+    def __init__(
+        self,
+        dim: int,
+        mode: str = "flat",
+        nlist: int = 64,
+        nprobe: int = 8,
+        pq_m: int = 8,
+        max_size: int = 100_000,
+        train_size: Optional[int] = None,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, not {mode!r}")
+        if mode == "ivfpq" and dim % pq_m:
+            raise ValueError(f"dim {dim} is not divisible into {pq_m} PQ sub-vectors")
+        self.dim = dim
+        self.mode = mode
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.max_size = max_size
+        self.train_size = train_size or max(39 * nlist, PQ_CENTROIDS * 4 if mode == "ivfpq" else 0)
+
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._count = 0
+        self._payloads: List[Any] = []
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        self._codebooks: Optional[np.ndarray] = None  # (pq_m, 256, dim // pq_m)
+        self._codes = np.empty((0, pq_m), dtype=np.uint8)
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()  # one k-means training at a time
+        self._trainer: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    # ----- adding -----
+    def add(self, vector, payload: Any = None) -> int:
+        """Store `vector` with `payload`; returns its position."""
+        vector = normalize_vector(vector)
+        if vector.shape[0] != self.dim:
+            raise ValueError(f"Expected a {self.dim}-d vector, got {vector.shape[0]}")
+        with self._lock:
+            if self._count >= self.max_size:
+                self._compact(self.max_size // 2)
+            if self._count == len(self._vectors):
+                self._grow(max(1024, 2 * self._count))
+            position = self._count
+            self._vectors[position] = vector
+            self._payloads.append(payload)
+            self._count += 1
+            if self.trained:
+                self._index_rows(position, position + 1)
+            elif self.mode != "flat" and self._count >= self.train_size and self._trainer is None:
+                self._trainer = threading.Thread(target=self.build, name="vector-index-train", daemon=True)
+                self._trainer.start()
+            return position
+
+    def _grow(self, capacity: int) -> None:
+        # Also turns a read-only memory-mapped array from load() into a writable one
+        vectors = np.empty((capacity, self.dim), dtype=np.float32)
+        vectors[: self._count] = self._vectors[: self._count]
+        self._vectors = vectors
+        if self.mode == "ivfpq":
+            codes = np.zeros((capacity, self.pq_m), dtype=np.uint8)
+            kept = min(self._count, len(self._codes))
+            codes[:kept] = self._codes[:kept]
+            self._codes = codes
+
+    def _compact(self, keep: int) -> None:
+        """Drop all but the newest `keep` vectors."""
+        start = self._count - keep
+        self._vectors = np.array(self._vectors[start : self._count])
+        self._payloads = self._payloads[start:]
+        self._codes = np.array(self._codes[start : self._count]) if self.mode == "ivfpq" else self._codes
+        self._count = keep
+        if self.trained:
+            self._lists = [[] for _ in range(len(self._centroids))]
+            self._index_rows(0, keep)
+
+    def build(self) -> None:
+        """Train the clusters (and PQ codebooks) on the vectors added so far (blocking)."""
+        with self._build_lock:
+            with self._lock:
+                if self.trained or self.mode == "flat" or self._count == 0:
+                    return
+                sample = np.array(self._vectors[: self._count])
+            # k-means runs without the index lock, so adds and searches are not held up
+            centroids = _kmeans(sample, min(self.nlist, len(sample)))
+            codebooks = None
+            if self.mode == "ivfpq":
+                sub = self.dim // self.pq_m
+                codebooks = np.stack([
+                    _kmeans(np.ascontiguousarray(sample[:, j * sub : (j + 1) * sub]), min(PQ_CENTROIDS, len(sample)))
+                    for j in range(self.pq_m)
+                ])
+            with self._lock:
+                self._centroids, self._codebooks = centroids, codebooks
+                self._lists = [[] for _ in range(len(centroids))]
+                self._index_rows(0, self._count)  # including vectors added while training
+
+    def _index_rows(self, start: int, stop: int) -> None:
+        rows = np.asarray(self._vectors[start:stop])
+        for offset, c in enumerate(_nearest_centroid(rows, self._centroids)):
+            self._lists[c].append(start + offset)
+        if self.mode == "ivfpq":
+            self._codes[start:stop] = self._encode(rows)
+
+    def _encode(self, rows: np.ndarray) -> np.ndarray:
+        sub = self.dim // self.pq_m
+        return np.stack(
+            [_nearest_centroid(rows[:, j * sub : (j + 1) * sub], self._codebooks[j]) for j in range(self.pq_m)],
+            axis=1,
+        ).astype(np.uint8)
+
+    # ----- searching -----
+    def search(self, vector, k: int = 5) -> List[Tuple[float, Any]]:
+        """The `k` most similar stored vectors as (cosine similarity, payload), best first."""
+        query = normalize_vector(vector)
+        with self._lock:
+            if self._count == 0:
+                return []
+            if not self.trained:
+                candidates = None
+                scores = np.asarray(self._vectors[: self._count]) @ query
+            else:
+                probes = np.argsort(self._centroids @ -query)[: self.nprobe]
+                candidates = np.fromiter(
+                    (i for c in probes for i in self._lists[c]), dtype=np.int64
+                )
+                if self.mode == "ivfpq" and len(candidates) > 4 * k:
+                    candidates = candidates[self._pq_shortlist(query, candidates, 4 * k)]
+                candidates = np.sort(candidates)  # sequential reads from a memory-mapped file
+                scores = np.asarray(self._vectors[candidates]) @ query
+            top = np.argsort(-scores)[:k]
+            return [
+                (float(scores[i]), self._payloads[int(i if candidates is None else candidates[i])])
+                for i in top
+            ]
+
+    def _pq_shortlist(self, query: np.ndarray, candidates: np.ndarray, n: int) -> np.ndarray:
+        """Positions (into `candidates`) of the `n` best approximate scores from PQ codes."""
+        sub = self.dim // self.pq_m
+        tables = np.einsum("jcs,js->jc", self._codebooks, query.reshape(self.pq_m, sub))
+        approx = tables[np.arange(self.pq_m), self._codes[candidates]].sum(axis=1)
+        return np.argpartition(-approx, n - 1)[:n]
+
+    def nearest(self, vector) -> Optional[Tuple[float, Any]]:
+        found = self.search(vector, k=1)
+        return found[0] if found else None
+
+    # ----- persistence -----
+    def save(self, path: str) -> None:
+        """Write the index to directory `path` (index.json is replaced last)."""
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            arrays = {"vectors": np.asarray(self._vectors[: self._count])}
+            if self.trained:
+                arrays["centroids"] = self._centroids
+                arrays["lists"] = np.array(
+                    [c for c, rows in enumerate(self._lists) for _ in rows], dtype=np.int32
+                )
+                arrays["list_rows"] = np.array([i for rows in self._lists for i in rows], dtype=np.int64)
+            if self._codebooks is not None:
+                arrays["codebooks"] = self._codebooks
+                arrays["codes"] = np.asarray(self._codes[: self._count])
+            meta = {
+                "dim": self.dim, "mode": self.mode, "nlist": self.nlist, "nprobe": self.nprobe,
+                "pq_m": self.pq_m, "max_size": self.max_size, "train_size": self.train_size,
+                "count": self._count, "arrays": sorted(arrays), "payloads": self._payloads,
+            }
+            for name, array in arrays.items():
+                tmp = os.path.join(path, f"{name}.npy.tmp")
+                with open(tmp, "wb") as f:
+                    np.save(f, array)
+                os.replace(tmp, os.path.join(path, f"{name}.npy"))
+            tmp = os.path.join(path, "index.json.tmp")
+            with open(tmp, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp, os.path.join(path, "index.json"))
+
+    @classmethod
+    def load(cls, path: str) -> "VectorIndex":
+        """Open an index written by save(); the vectors stay memory-mapped until the next add()."""
+        with open(os.path.join(path, "index.json")) as f:
+            meta: Dict[str, Any] = json.load(f)
+        index = cls(
+            meta["dim"], mode=meta["mode"], nlist=meta["nlist"], nprobe=meta["nprobe"],
+            pq_m=meta["pq_m"], max_size=meta["max_size"], train_size=meta["train_size"],
+        )
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in meta["arrays"]}
+        index._vectors = arrays["vectors"]
+        index._count = meta["count"]
+        index._payloads = meta["payloads"]
+        if "centroids" in arrays:
+            index._centroids = np.array(arrays["centroids"])
+            index._lists = [[] for _ in range(len(index._centroids))]
+            for c, row in zip(arrays["lists"], arrays["list_rows"]):
+                index._lists[int(c)].append(int(row))
+        if "codebooks" in arrays:
+            index._codebooks = np.array(arrays["codebooks"])
+            index._codes = arrays["codes"]
+        return index